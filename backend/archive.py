@@ -0,0 +1,241 @@
+import asyncio
+import logging
+import time
+import weakref
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import DeleteOne, UpdateOne
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# One document per user and month: {user_id, month, start, end, expenses: [...]}
+ARCHIVE_COLLECTION = "expense_archive"
+
+# settings document recording how far archival has reached
+ARCHIVE_STATE_ID = "expense_archive"
+
+# (horizon, fetched_at) per database handle, so the main and analytics
+# databases don't evict each other
+_horizon_cache: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+def month_start(day: datetime) -> datetime:
+    return day.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+async def get_archive_horizon(db) -> Optional[datetime]:
+    """Every archived expense is dated before this; None when nothing was ever archived
+
+    Cached per process for ARCHIVE_HORIZON_CACHE_SECONDS, which is why the
+    migrator waits that long after moving the horizon.
+    """
+    now = time.monotonic()
+    cached = _horizon_cache.get(db)
+    if cached is not None and now - cached[1] < settings.ARCHIVE_HORIZON_CACHE_SECONDS:
+        return cached[0]
+    state = await db.settings.find_one({"_id": ARCHIVE_STATE_ID})
+    horizon = state["horizon"] if state else None
+    _horizon_cache[db] = (horizon, now)
+    return horizon
+
+def _date_bounds(query: dict) -> Tuple[Optional[datetime], Optional[datetime]]:
+    condition = query.get("date")
+    if not isinstance(condition, dict):
+        return None, None
+    return condition.get("$gte", condition.get("$gt")), condition.get("$lte", condition.get("$lt"))
+
+async def find_archived_expenses(db, query: dict, limit: int = 0) -> List[dict]:
+    """Archived expenses matching an expenses filter (which must include user_id), newest first"""
+    bucket_filter = {"user_id": query["user_id"]}
+    lower, upper = _date_bounds(query)
+    months = {}
+    if lower:
+        months["$gte"] = month_start(lower)
+    if upper:
+        months["$lte"] = upper
+    if months:
+        bucket_filter["month"] = months
+
+    pipeline = [
+        {"$match": bucket_filter},
+        {"$unwind": "$expenses"},
+        {"$replaceRoot": {"newRoot": {"$mergeObjects": ["$expenses", {"user_id": "$user_id"}]}}},
+    ]
+    expense_filter = {key: value for key, value in query.items() if key != "user_id"}
+    if expense_filter:
+        pipeline.append({"$match": expense_filter})
+    pipeline.append({"$sort": {"date": -1}})
+    if limit:
+        pipeline.append({"$limit": limit})
+    return await db[ARCHIVE_COLLECTION].aggregate(pipeline).to_list(length=None)
+
+async def find_expenses(db, query: dict, skip: int = 0, limit: int = 0, projection: Optional[dict] = None) -> List[dict]:
+    """Expenses matching query, newest first, from the expenses collection and the archive
+
+    query is an expenses filter including user_id; limit 0 means no limit.
+    The archive is only read when the date range, or the page, reaches back
+    past the archive horizon, so recent pages cost what they always did.
+    """
+    horizon = await get_archive_horizon(db)
+    lower, _ = _date_bounds(query)
+    if horizon is None or (lower is not None and lower >= horizon):
+        cursor = db.expenses.find(query, projection).sort("date", -1).skip(skip)
+        if limit:
+            cursor = cursor.limit(limit)
+        return await cursor.to_list(length=limit or None)
+
+    wanted = skip + limit if limit else 0
+    cursor = db.expenses.find(query, projection).sort("date", -1)
+    if wanted:
+        cursor = cursor.limit(wanted)
+    recent = await cursor.to_list(length=wanted or None)
+    if wanted and len(recent) == wanted and recent[-1]["date"] >= horizon:
+        return recent[skip:]
+
+    # An expense caught mid-move can briefly be in both tiers; the live copy wins
+    archived = await find_archived_expenses(db, query, limit=wanted)
+    seen = {expense["_id"] for expense in recent}
+    merged = recent + [expense for expense in archived if expense["_id"] not in seen]
+    merged.sort(key=lambda expense: expense["date"], reverse=True)
+    return merged[skip:skip + limit] if limit else merged[skip:]
+
+async def find_archived_expense(db, user_id: str, expense_id: ObjectId) -> Optional[dict]:
+    """One archived expense by id"""
+    bucket = await db[ARCHIVE_COLLECTION].find_one(
+        {"user_id": user_id, "expenses._id": expense_id}, {"user_id": 1, "expenses.$": 1}
+    )
+    if not bucket:
+        return None
+    expense = next(expense for expense in bucket["expenses"] if expense["_id"] == expense_id)
+    return {**expense, "user_id": user_id}
+
+async def restore_archived_expense(db, user_id: str, expense_id: ObjectId) -> Optional[dict]:
+    """Move an archived expense back into the expenses collection so it can be edited"""
+    expense = await find_archived_expense(db, user_id, expense_id)
+    if not expense:
+        return None
+    # Insert before removing from the bucket; readers prefer the live copy meanwhile
+    await db.expenses.replace_one({"_id": expense_id}, expense, upsert=True)
+    await db[ARCHIVE_COLLECTION].update_one(
+        {"user_id": user_id, "expenses._id": expense_id},
+        {"$pull": {"expenses": {"_id": expense_id}}, "$set": {"updated_at": datetime.utcnow()}}
+    )
+    return expense
+
+async def count_archived_expenses(db, user_id: str, category: str) -> int:
+    """Archived expenses of a user in one category"""
+    pipeline = [
+        {"$match": {"user_id": user_id, "expenses.category": category}},
+        {"$unwind": "$expenses"},
+        {"$match": {"expenses.category": category}},
+        {"$group": {"_id": None, "count": {"$sum": 1}}},
+    ]
+    groups = await db[ARCHIVE_COLLECTION].aggregate(pipeline).to_list(length=None)
+    return groups[0]["count"] if groups else 0
+
+async def rename_archived_category(db, user_id: str, old_name: str, new_name: str):
+    await db[ARCHIVE_COLLECTION].update_many(
+        {"user_id": user_id, "expenses.category": old_name},
+        {"$set": {"expenses.$[expense].category": new_name, "updated_at": datetime.utcnow()}},
+        array_filters=[{"expense.category": old_name}]
+    )
+
+async def archived_totals(db, user_ids: Optional[List[str]] = None) -> List[dict]:
+    """Archived expense count and amount per user and currency, for the given users or everyone
+
+    Groups look like {"_id": {"user_id": ..., "currency": ...}, "count": n, "total": x};
+    currency is missing for expenses from before currencies were tracked.
+    """
+    if await get_archive_horizon(db) is None:
+        return []
+    pipeline = [
+        {"$match": {"user_id": {"$in": user_ids}} if user_ids is not None else {}},
+        {"$unwind": "$expenses"},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "currency": "$expenses.currency"},
+            "count": {"$sum": 1},
+            "total": {"$sum": "$expenses.amount"},
+        }},
+    ]
+    return await db[ARCHIVE_COLLECTION].aggregate(pipeline).to_list(length=None)
+
+async def _raise_horizon(db, horizon: datetime) -> bool:
+    """Record that expenses before horizon may be archived; True if it moved"""
+    state = await db.settings.find_one({"_id": ARCHIVE_STATE_ID})
+    if state and state["horizon"] >= horizon:
+        return False
+    await db.settings.update_one(
+        {"_id": ARCHIVE_STATE_ID},
+        {"$max": {"horizon": horizon}, "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True
+    )
+    return True
+
+async def archive_expenses(
+    db,
+    older_than_days: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    user_id: Optional[str] = None,
+    pause_seconds: float = 0.0
+) -> int:
+    """Move expenses older than the cutoff into monthly buckets, a batch at a time
+
+    Safe to run while the app is serving and to interrupt: each batch is
+    written to its buckets (replacing any earlier copy of the same
+    expenses) before it is deleted from the expenses collection, and an
+    expense edited in between is left in place for the next run. Returns
+    the number of expenses moved.
+    """
+    older_than_days = older_than_days or settings.ARCHIVE_AFTER_DAYS
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    # Whole months only, so a month's bucket is normally written by a single run
+    cutoff = month_start(datetime.utcnow() - timedelta(days=older_than_days))
+
+    if await _raise_horizon(db, cutoff):
+        # Workers cache the horizon; until they all see the new one they
+        # would skip the archive for dates we are about to move into it
+        logger.info(f"Archive horizon moved to {cutoff:%Y-%m-%d}, waiting for workers to pick it up")
+        await asyncio.sleep(settings.ARCHIVE_HORIZON_CACHE_SECONDS)
+
+    query = {"date": {"$lt": cutoff}}
+    if user_id:
+        query["user_id"] = user_id
+
+    moved = 0
+    while True:
+        batch = await db.expenses.find(query).limit(batch_size).to_list(length=batch_size)
+        if not batch:
+            break
+
+        buckets = {}
+        for expense in batch:
+            buckets.setdefault((expense["user_id"], month_start(expense["date"])), []).append(expense)
+
+        now = datetime.utcnow()
+        operations = []
+        for (owner_id, month), expenses in buckets.items():
+            bucket = {"user_id": owner_id, "month": month}
+            operations.append(UpdateOne(bucket, {"$pull": {"expenses": {"_id": {"$in": [e["_id"] for e in expenses]}}}}))
+            operations.append(UpdateOne(bucket, {
+                "$push": {"expenses": {"$each": [
+                    {key: value for key, value in expense.items() if key != "user_id"} for expense in expenses
+                ]}},
+                "$min": {"start": min(expense["date"] for expense in expenses)},
+                "$max": {"end": max(expense["date"] for expense in expenses)},
+                "$set": {"updated_at": now},
+            }, upsert=True))
+        await db[ARCHIVE_COLLECTION].bulk_write(operations, ordered=True)
+
+        # Only delete what is unchanged since we read it
+        result = await db.expenses.bulk_write([
+            DeleteOne({"_id": expense["_id"], "updated_at": expense.get("updated_at")}) for expense in batch
+        ], ordered=False)
+        moved += result.deleted_count
+        logger.info(f"Archived {moved} expenses so far")
+        if not result.deleted_count:
+            logger.warning("Archive batch deleted nothing, stopping")
+            break
+        if pause_seconds:
+            await asyncio.sleep(pause_seconds)
+
+    return moved
@@ -0,0 +1,56 @@
+"""
+Script to move old expenses into the monthly archive buckets
+Run this script from the backend directory:
+
+    python archive_expenses.py [--older-than-days N] [--batch-size N] [--user USER_ID] [--pause-ms N]
+
+Safe to run while the API is serving traffic, and to stop and re-run.
+"""
+
+import argparse
+import asyncio
+import logging
+from database import create_mongo_client
+from config import settings
+from archive import archive_expenses
+
+async def main():
+    """Main function"""
+    arg_parser = argparse.ArgumentParser(description="Archive old expenses into monthly buckets")
+    arg_parser.add_argument("--older-than-days", type=int, default=settings.ARCHIVE_AFTER_DAYS,
+                            help="archive expenses from whole months before this many days ago")
+    arg_parser.add_argument("--batch-size", type=int, default=settings.ARCHIVE_BATCH_SIZE,
+                            help="expenses moved per batch")
+    arg_parser.add_argument("--user", help="only archive this user's expenses")
+    arg_parser.add_argument("--pause-ms", type=int, default=0,
+                            help="pause between batches to limit load on a busy server")
+    args = arg_parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
+    print("=" * 50)
+    print("Money Management System - Archive Expenses")
+    print("=" * 50)
+    
+    try:
+        # Connect to MongoDB
+        print("\nConnecting to MongoDB...")
+        client = create_mongo_client()
+        db = client[settings.DATABASE_NAME]
+        
+        # Test connection
+        await client.admin.command('ping')
+        print(f"Connected to MongoDB: {settings.DATABASE_NAME}")
+        
+        print(f"\nArchiving expenses older than {args.older_than_days} days...")
+        moved = await archive_expenses(
+            db, args.older_than_days, args.batch_size, args.user, pause_seconds=args.pause_ms / 1000
+        )
+        print(f"✓ Archived {moved} expense(s)")
+        
+        client.close()
+        
+    except Exception as e:
+        print(f"\nError: {str(e)}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
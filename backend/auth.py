@@ -55,14 +55,29 @@ async def get_current_user(
     if user is None:
         raise credentials_exception
     
-    # Update last active
-    await db.users.update_one(
-        {"_id": ObjectId(user_id)},
-        {"$set": {"last_active": datetime.utcnow()}}
-    )
+    # Update last active, at most once per interval to spare a write per request
+    now = datetime.utcnow()
+    last_active = user.get("last_active")
+    if not last_active or now - last_active >= timedelta(seconds=settings.LAST_ACTIVE_UPDATE_INTERVAL_SECONDS):
+        await db.users.update_one(
+            {"_id": ObjectId(user_id)},
+            {"$set": {"last_active": now}}
+        )
+        user["last_active"] = now
     
     return user
 
+async def is_admin_token(token: Optional[str]) -> bool:
+    """Check whether a bearer token belongs to an active admin, without raising"""
+    if not token:
+        return False
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        user = await get_database().users.find_one({"_id": ObjectId(payload.get("sub"))}, {"role": 1, "status": 1})
+    except Exception:
+        return False
+    return bool(user) and user.get("role") == "admin" and user.get("status", "active") != "suspended"
+
 async def get_current_active_user(current_user: dict = Depends(get_current_user)):
     """Get current active user"""
     user_status = current_user.get("status", "active")
@@ -0,0 +1,310 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import shutil
+from datetime import datetime, timedelta
+from itertools import islice
+from pathlib import Path
+from typing import List, Optional
+import bson
+from bson import ObjectId
+from pymongo import DeleteMany, ReplaceOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from archive import ARCHIVE_COLLECTION
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Small collections written in full every time
+SNAPSHOT_COLLECTIONS = ["users", "categories", "settings"]
+# Large collections written as changes since the previous backup
+INCREMENTAL_COLLECTIONS = ["expenses", ARCHIVE_COLLECTION]
+
+# settings document holding the schedule, the lease and the chain position;
+# it describes the backups rather than the data, so it is never backed up
+BACKUP_STATE_ID = "database_backup"
+
+# Longer than any backup should take; a crashed worker's lease expires after this
+LEASE_SECONDS = 6 * 3600
+
+# Incremental backups re-read this much before the previous one started, so
+# writes that raced with it (or carry a slightly skewed clock) are not missed
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+MANIFEST = "manifest.json"
+
+class BackupState:
+    """This worker's scheduler task"""
+
+    def __init__(self):
+        self.task: asyncio.Task = None
+
+backup_state = BackupState()
+
+def _file_digest(path: Path) -> dict:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return {"sha256": digest.hexdigest(), "bytes": path.stat().st_size}
+
+def _write_batch(f, batch: List[dict]):
+    f.write(b"".join(bson.encode(doc) for doc in batch))
+
+async def _dump(cursor, path: Path) -> dict:
+    """Stream a cursor into a gzip file of concatenated BSON documents
+
+    Encoding, compression and disk writes run off the event loop, and the
+    optional pause between batches caps how hard a backup reads.
+    """
+    count = 0
+    batch = []
+    f = await asyncio.to_thread(gzip.open, path, "wb")
+    try:
+        async for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= settings.BACKUP_BATCH_SIZE:
+                await asyncio.to_thread(_write_batch, f, batch)
+                count += len(batch)
+                batch = []
+                if settings.BACKUP_PAUSE_MS:
+                    await asyncio.sleep(settings.BACKUP_PAUSE_MS / 1000)
+        if batch:
+            await asyncio.to_thread(_write_batch, f, batch)
+            count += len(batch)
+    finally:
+        await asyncio.to_thread(f.close)
+    return {"file": path.name, "documents": count, **await asyncio.to_thread(_file_digest, path)}
+
+async def _read_batches(path: Path):
+    """Documents of a backup file, a batch at a time"""
+    f = await asyncio.to_thread(gzip.open, path, "rb")
+    try:
+        documents = bson.decode_file_iter(f)
+        while True:
+            batch = await asyncio.to_thread(lambda: list(islice(documents, settings.BACKUP_BATCH_SIZE)))
+            if not batch:
+                break
+            yield batch
+    finally:
+        await asyncio.to_thread(f.close)
+
+def read_manifest(directory: Path) -> dict:
+    with open(directory / MANIFEST, encoding="utf-8") as f:
+        return json.load(f)
+
+def list_backups(root: Optional[str] = None) -> List[dict]:
+    """Manifests of every finished backup, oldest first"""
+    root = Path(root or settings.BACKUP_DIR)
+    if not root.is_dir():
+        return []
+    return [read_manifest(path) for path in sorted(root.iterdir()) if (path / MANIFEST).is_file()]
+
+async def create_backup(read_db, parent: Optional[dict] = None, root: Optional[str] = None) -> dict:
+    """Write a backup to its own directory and return its manifest
+
+    Without a parent this is a full backup. With one, expenses and archive
+    buckets created or updated since the parent started are written, plus
+    the ids of every document still present so restores can drop deletions.
+    The manifest is written last; a directory without one is incomplete.
+    """
+    started = datetime.utcnow()
+    kind = "incremental" if parent else "full"
+    name = f"{started:%Y%m%dT%H%M%S.%f}Z-{kind}"
+    directory = Path(root or settings.BACKUP_DIR) / name
+    directory.mkdir(parents=True)
+
+    since = datetime.fromisoformat(parent["started_at"]) - WATERMARK_OVERLAP if parent else None
+    collections = {}
+    for collection in SNAPSHOT_COLLECTIONS:
+        query = {"_id": {"$ne": BACKUP_STATE_ID}} if collection == "settings" else {}
+        cursor = read_db[collection].find(query).batch_size(settings.BACKUP_BATCH_SIZE)
+        collections[collection] = {"mode": "snapshot", **await _dump(cursor, directory / f"{collection}.bson.gz")}
+
+    for collection in INCREMENTAL_COLLECTIONS:
+        query = {}
+        if since:
+            query = {"$or": [{"_id": {"$gte": ObjectId.from_datetime(since)}}, {"updated_at": {"$gte": since}}]}
+        cursor = read_db[collection].find(query).batch_size(settings.BACKUP_BATCH_SIZE)
+        info = {"mode": "changes", **await _dump(cursor, directory / f"{collection}.bson.gz")}
+        if since:
+            # Covered by the _id index: no documents are fetched
+            ids = read_db[collection].find({}, {"_id": 1}).hint([("_id", 1)]).batch_size(settings.BACKUP_BATCH_SIZE)
+            info["ids"] = await _dump(ids, directory / f"{collection}.ids.bson.gz")
+        collections[collection] = info
+
+    manifest = {
+        "name": name,
+        "kind": kind,
+        "parent": parent["name"] if parent else None,
+        "chain_length": parent["chain_length"] + 1 if parent else 0,
+        "database": settings.DATABASE_NAME,
+        "started_at": started.isoformat(),
+        "finished_at": datetime.utcnow().isoformat(),
+        "collections": collections,
+    }
+    with open(directory / MANIFEST, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(
+        f"Backup {name} written: "
+        + ", ".join(f"{collection} {info['documents']}" for collection, info in collections.items())
+    )
+    return manifest
+
+def verify_backup(name: str, root: Optional[str] = None) -> List[str]:
+    """Check every file of one backup against its manifest; returns the problems found"""
+    directory = Path(root or settings.BACKUP_DIR) / name
+    problems = []
+    for collection, info in read_manifest(directory)["collections"].items():
+        for entry in (info, info.get("ids")):
+            if not entry:
+                continue
+            path = directory / entry["file"]
+            if not path.is_file():
+                problems.append(f"{name}/{entry['file']} is missing")
+            elif _file_digest(path)["sha256"] != entry["sha256"]:
+                problems.append(f"{name}/{entry['file']} does not match its checksum")
+    return problems
+
+def backup_chain(name: str, root: Optional[str] = None) -> List[dict]:
+    """Manifests needed to restore a backup: its full backup, then each incremental in order"""
+    root = Path(root or settings.BACKUP_DIR)
+    chain = [read_manifest(root / name)]
+    while chain[0]["parent"]:
+        chain.insert(0, read_manifest(root / chain[0]["parent"]))
+    return chain
+
+async def _restore_collection(db, collection: str, chain: List[dict], root: Path) -> int:
+    await db[collection].delete_many({})
+    for index, manifest in enumerate(chain):
+        path = root / manifest["name"] / manifest["collections"][collection]["file"]
+        async for batch in _read_batches(path):
+            if index == 0:
+                await db[collection].insert_many(batch, ordered=False)
+            else:
+                await db[collection].bulk_write(
+                    [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in batch], ordered=False
+                )
+
+    ids_entry = chain[-1]["collections"][collection].get("ids")
+    if ids_entry:
+        # Drop what was deleted after the full backup
+        live = set()
+        async for batch in _read_batches(root / chain[-1]["name"] / ids_entry["file"]):
+            live.update(doc["_id"] for doc in batch)
+        restored = await db[collection].find({}, {"_id": 1}).to_list(length=None)
+        deleted = [doc["_id"] for doc in restored if doc["_id"] not in live]
+        for start in range(0, len(deleted), settings.BACKUP_BATCH_SIZE):
+            await db[collection].bulk_write([DeleteMany({"_id": {"$in": deleted[start:start + settings.BACKUP_BATCH_SIZE]}})])
+    return await db[collection].count_documents({})
+
+async def restore_backup(db, name: str, root: Optional[str] = None) -> dict:
+    """Replace the backed-up collections with their contents as of one backup
+
+    Every file in the chain is verified before anything is written. Returns
+    the number of documents restored per collection.
+    """
+    root = Path(root or settings.BACKUP_DIR)
+    chain = backup_chain(name, root)
+    problems = [problem for manifest in chain for problem in verify_backup(manifest["name"], root)]
+    if problems:
+        raise ValueError("Backup failed verification: " + "; ".join(problems))
+
+    restored = {}
+    for collection in chain[-1]["collections"]:
+        if collection == "settings":
+            # Keep this database's own backup schedule and lease
+            await db.settings.delete_many({"_id": {"$ne": BACKUP_STATE_ID}})
+            async for batch in _read_batches(root / chain[-1]["name"] / chain[-1]["collections"]["settings"]["file"]):
+                await db.settings.insert_many(batch, ordered=False)
+            restored[collection] = chain[-1]["collections"]["settings"]["documents"]
+        elif chain[-1]["collections"][collection]["mode"] == "snapshot":
+            restored[collection] = await _restore_collection(db, collection, chain[-1:], root)
+        else:
+            restored[collection] = await _restore_collection(db, collection, chain, root)
+    return restored
+
+def prune_backups(root: Optional[str] = None) -> List[str]:
+    """Delete chains older than the newest BACKUP_KEEP_FULL full backups"""
+    root = Path(root or settings.BACKUP_DIR)
+    backups = list_backups(root)
+    fulls = [index for index, manifest in enumerate(backups) if manifest["kind"] == "full"]
+    if len(fulls) <= settings.BACKUP_KEEP_FULL:
+        return []
+    removed = [manifest["name"] for manifest in backups[:fulls[-settings.BACKUP_KEEP_FULL]]]
+    for name in removed:
+        shutil.rmtree(root / name)
+    return removed
+
+async def _claim(db, interval: Optional[timedelta]) -> Optional[dict]:
+    """Take the backup lease if no other worker holds it (and a backup is due); returns the state"""
+    now = datetime.utcnow()
+    conditions = [{"$or": [{"lease_until": {"$lt": now}}, {"lease_until": None}]}]
+    if interval is not None:
+        conditions.append({"$or": [{"last_started": {"$lt": now - interval}}, {"last_started": None}]})
+    try:
+        return await db.settings.find_one_and_update(
+            {"_id": BACKUP_STATE_ID, "$and": conditions},
+            {"$set": {"lease_until": now + timedelta(seconds=LEASE_SECONDS)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # The state document exists but didn't match: leased, or not due yet
+        return None
+
+async def run_backup(db, read_db=None, full: bool = False, interval: Optional[timedelta] = None) -> Optional[dict]:
+    """Back up now (or only if due, given an interval) unless another worker is already at it
+
+    Chains an incremental onto the previous backup unless a full one is
+    asked for, BACKUP_FULL_EVERY incrementals have been taken, or the
+    previous backup isn't on this machine's disk. Returns the manifest, or
+    None when nothing ran.
+    """
+    state = await _claim(db, interval)
+    if state is None:
+        return None
+    try:
+        parent = None
+        root = Path(settings.BACKUP_DIR)
+        if not full and state.get("last_backup") and (root / state["last_backup"] / MANIFEST).is_file():
+            parent = read_manifest(root / state["last_backup"])
+            if parent["chain_length"] >= settings.BACKUP_FULL_EVERY:
+                parent = None
+        manifest = await create_backup(read_db if read_db is not None else db, parent)
+        await db.settings.update_one(
+            {"_id": BACKUP_STATE_ID},
+            {"$set": {"last_backup": manifest["name"], "last_started": datetime.fromisoformat(manifest["started_at"])}}
+        )
+        for name in prune_backups():
+            logger.info(f"Removed old backup {name}")
+        return manifest
+    finally:
+        await db.settings.update_one({"_id": BACKUP_STATE_ID}, {"$set": {"lease_until": None}})
+
+async def _backup_loop(db, read_db):
+    while True:
+        try:
+            admin_settings = await db.settings.find_one({"_id": "admin_settings"}, {"databaseBackupInterval": 1})
+            hours = (admin_settings or {}).get("databaseBackupInterval", 24)
+            if hours and hours > 0:
+                await run_backup(db, read_db, interval=timedelta(hours=hours))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Scheduled backup failed: {e}", exc_info=True)
+        await asyncio.sleep(settings.BACKUP_CHECK_INTERVAL_SECONDS)
+
+def start_backup_scheduler(db, read_db):
+    """Run backups every databaseBackupInterval hours (admin setting); 0 disables them
+
+    Every worker checks, but the lease in the settings collection lets only
+    one of them back up at a time.
+    """
+    backup_state.task = asyncio.create_task(_backup_loop(db, read_db))
+
+def stop_backup_scheduler():
+    if backup_state.task and not backup_state.task.done():
+        backup_state.task.cancel()
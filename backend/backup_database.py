@@ -0,0 +1,87 @@
+"""
+Script to take, list, verify and restore database backups
+Run this script from the backend directory:
+
+    python backup_database.py backup [--full]     # incremental unless --full (or the chain is long enough)
+    python backup_database.py list                # backups in BACKUP_DIR
+    python backup_database.py verify [NAME]       # check files against their checksums (default: latest)
+    python backup_database.py restore NAME --yes  # replace the backed-up collections
+"""
+
+import argparse
+import asyncio
+from database import create_mongo_client, analytics_read_preference
+from config import settings
+from backup import backup_chain, list_backups, restore_backup, run_backup, verify_backup
+
+async def main():
+    """Main function"""
+    arg_parser = argparse.ArgumentParser(description="Database backups")
+    subcommands = arg_parser.add_subparsers(dest="command", required=True)
+    backup_parser = subcommands.add_parser("backup", help="take a backup now")
+    backup_parser.add_argument("--full", action="store_true", help="full backup instead of incremental")
+    subcommands.add_parser("list", help="list backups")
+    verify_parser = subcommands.add_parser("verify", help="verify a backup and the backups it builds on")
+    verify_parser.add_argument("name", nargs="?", help="backup name (default: latest)")
+    restore_parser = subcommands.add_parser("restore", help="restore a backup")
+    restore_parser.add_argument("name", help="backup name")
+    restore_parser.add_argument("--yes", action="store_true", help="actually restore, replacing current data")
+    args = arg_parser.parse_args()
+
+    print("=" * 50)
+    print("Money Management System - Database Backups")
+    print("=" * 50)
+
+    if args.command == "list":
+        for manifest in list_backups():
+            counts = ", ".join(f"{name} {info['documents']}" for name, info in manifest["collections"].items())
+            print(f"  {manifest['name']:<34} {counts}")
+        return
+
+    if args.command == "verify":
+        backups = list_backups()
+        name = args.name or (backups[-1]["name"] if backups else None)
+        if not name:
+            print(f"\nNo backups in {settings.BACKUP_DIR}")
+            return
+        problems = [problem for manifest in backup_chain(name) for problem in verify_backup(manifest["name"])]
+        for problem in problems:
+            print(f"  ✗ {problem}")
+        if not problems:
+            print(f"✓ {name} and the backups it builds on match their checksums")
+        return
+
+    try:
+        # Connect to MongoDB
+        print("\nConnecting to MongoDB...")
+        client = create_mongo_client()
+        db = client[settings.DATABASE_NAME]
+
+        # Test connection
+        await client.admin.command('ping')
+        print(f"Connected to MongoDB: {settings.DATABASE_NAME}\n")
+
+        if args.command == "backup":
+            read_db = client.get_database(settings.DATABASE_NAME, read_preference=analytics_read_preference())
+            manifest = await run_backup(db, read_db, full=args.full)
+            if manifest is None:
+                print("Another backup is running; try again later")
+            else:
+                print(f"✓ Wrote {manifest['kind']} backup {manifest['name']}")
+        elif args.command == "restore":
+            if not args.yes:
+                print(f"Restoring {args.name} replaces users, categories, settings and expenses "
+                      f"in {settings.DATABASE_NAME}.\nRe-run with --yes to restore")
+            else:
+                restored = await restore_backup(db, args.name)
+                for collection, count in restored.items():
+                    print(f"  {collection}: {count} document(s)")
+                print(f"✓ Restored {args.name}")
+
+        client.close()
+
+    except Exception as e:
+        print(f"\nError: {str(e)}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
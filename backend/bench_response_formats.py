@@ -0,0 +1,103 @@
+"""
+Benchmark for the expense list encodings (JSON rows, columnar JSON, MessagePack)
+Runs offline on synthetic expenses (no database needed). Run from the backend directory:
+
+    python bench_response_formats.py [--rows N] [--iterations N] [--json results.json]
+
+Reports bytes per row before and after gzip (as GZipMiddleware would send
+them) and encode time per row for each format.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import time
+from datetime import datetime
+
+# The encoders only need the models, but config is imported transitively
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from models import ExpenseResponse
+from response_formats import encode, msgpack
+from routers.expense_router import EXPENSE_FIELDS
+from seed_data import generate_user
+
+# Same level as starlette's GZipMiddleware
+GZIP_LEVEL = 9
+
+def make_rows(count: int):
+    """Expenses shaped like the list endpoint's documents, from the seed generator"""
+    rows = []
+    index = 0
+    while len(rows) < count:
+        _, _, expenses = generate_user(42, index, datetime(2025, 1, 1), 2, 30, "")
+        for expense in expenses:
+            expense["_id"] = str(ObjectId())
+            expense.pop("fingerprint")
+        rows += expenses
+        index += 1
+    return rows[:count]
+
+def encode_response_model(rows):
+    """What GET /api/expenses does today: validate every row, then JSON-encode it"""
+    content = jsonable_encoder([ExpenseResponse(**row) for row in rows])
+    return json.dumps(content, separators=(",", ":")).encode()
+
+def encoders():
+    formats = {
+        "json (response_model)": encode_response_model,
+        "json": lambda rows: encode(rows, EXPENSE_FIELDS, "json")[0],
+        "columnar": lambda rows: encode(rows, EXPENSE_FIELDS, "columnar")[0],
+    }
+    if msgpack is not None:
+        formats["msgpack"] = lambda rows: encode(rows, EXPENSE_FIELDS, "msgpack")[0]
+    return formats
+
+def measure(rows, encoder, iterations: int) -> dict:
+    body = encoder(rows)  # warm up
+    started = time.perf_counter()
+    for _ in range(iterations):
+        encoder(rows)
+    encode_seconds = (time.perf_counter() - started) / iterations
+
+    started = time.perf_counter()
+    compressed = gzip.compress(body, compresslevel=GZIP_LEVEL)
+    gzip_seconds = time.perf_counter() - started
+    return {
+        "bytes_per_row": len(body) / len(rows),
+        "gzip_bytes_per_row": len(compressed) / len(rows),
+        "encode_us_per_row": encode_seconds / len(rows) * 1_000_000,
+        "gzip_us_per_row": gzip_seconds / len(rows) * 1_000_000,
+    }
+
+def main():
+    """Main function"""
+    arg_parser = argparse.ArgumentParser(description="Benchmark expense list encodings")
+    arg_parser.add_argument("--rows", type=int, default=1000, help="expenses per response")
+    arg_parser.add_argument("--iterations", type=int, default=20, help="encodes per format for timing")
+    arg_parser.add_argument("--json", dest="json_path", help="also write results to this file")
+    args = arg_parser.parse_args()
+
+    rows = make_rows(args.rows)
+    results = {name: measure(rows, encoder, args.iterations) for name, encoder in encoders().items()}
+
+    print("=" * 78)
+    print(f"Expense List Encodings ({args.rows} rows)")
+    print("=" * 78)
+    print(f"{'Format':<24}{'bytes/row':>12}{'gzip bytes/row':>16}{'encode us/row':>14}{'gzip us/row':>12}")
+    for name, result in results.items():
+        print(f"{name:<24}{result['bytes_per_row']:>12.1f}{result['gzip_bytes_per_row']:>16.1f}"
+              f"{result['encode_us_per_row']:>14.2f}{result['gzip_us_per_row']:>12.2f}")
+    if msgpack is None:
+        print("(msgpack is not installed; pip install -r requirements.txt to include it)")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"rows": args.rows, "formats": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
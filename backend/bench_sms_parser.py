@@ -0,0 +1,181 @@
+"""
+Benchmark for the SMS expense parser against the labeled corpus in data/sms_corpus.json
+Runs offline (no database needed). Run from the backend directory:
+
+    python bench_sms_parser.py [--iterations N] [--json results.json]
+
+Exits with status 1 when throughput, p99 latency or per-field accuracy
+regresses past the thresholds below.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date
+
+# The parser only needs the models, but config is imported transitively
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from sms_parser import parse_sms_fields, match_keyword_category
+from merchant_index import normalize_merchant
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sms_corpus.json")
+
+# Categories every new account is created with (see auth_router.register)
+DEFAULT_CATEGORY_NAMES = [
+    "Food & Dining", "Transportation", "Shopping", "Entertainment",
+    "Bills & Utilities", "Healthcare", "Education", "Travel",
+]
+
+FIELDS = ["amount", "merchant", "date", "category"]
+
+# Regression thresholds; raise them as the parser improves
+MIN_MESSAGES_PER_SEC = 5000
+MAX_P99_LATENCY_US = 1000
+MIN_PRECISION = {"amount": 0.95, "merchant": 0.85, "date": 0.90, "category": 0.90}
+MIN_RECALL = {"amount": 0.95, "merchant": 0.90, "date": 0.80, "category": 0.90}
+
+def load_corpus(path=CORPUS_PATH):
+    """Load the labeled SMS corpus"""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def predict(text):
+    """Run the parser and return its prediction for each labeled field"""
+    parsed = parse_sms_fields(text)
+    category = match_keyword_category(parsed.merchant, DEFAULT_CATEGORY_NAMES) if parsed.merchant else None
+    return {
+        "amount": parsed.amount,
+        "merchant": parsed.merchant,
+        "date": parsed.date.date() if parsed.date else None,
+        "category": category,
+    }
+
+def field_matches(field, predicted, expected):
+    """Compare one predicted field with its label"""
+    if field == "amount":
+        return abs(predicted - expected) < 0.005
+    if field == "merchant":
+        return normalize_merchant(predicted) == normalize_merchant(expected)
+    if field == "date":
+        return predicted == date.fromisoformat(expected)
+    return predicted == expected
+
+def score(corpus):
+    """Per-field precision and recall over the corpus"""
+    counts = {field: {"tp": 0, "predicted": 0, "labeled": 0} for field in FIELDS}
+    misses = []
+
+    for entry in corpus:
+        prediction = predict(entry["text"])
+        for field in FIELDS:
+            predicted = prediction[field]
+            expected = entry["expected"][field]
+            if predicted is not None:
+                counts[field]["predicted"] += 1
+            if expected is not None:
+                counts[field]["labeled"] += 1
+            if predicted is not None and expected is not None and field_matches(field, predicted, expected):
+                counts[field]["tp"] += 1
+            elif predicted is not None or expected is not None:
+                misses.append((field, entry["text"], predicted, expected))
+
+    metrics = {}
+    for field, c in counts.items():
+        metrics[field] = {
+            "precision": c["tp"] / c["predicted"] if c["predicted"] else 1.0,
+            "recall": c["tp"] / c["labeled"] if c["labeled"] else 1.0,
+        }
+    return metrics, misses
+
+def measure_speed(corpus, iterations):
+    """Throughput and per-message latency percentiles"""
+    texts = [entry["text"] for entry in corpus]
+
+    # Warm up regex caches and the pydantic model
+    for text in texts:
+        parse_sms_fields(text)
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for text in texts:
+            t0 = time.perf_counter_ns()
+            parse_sms_fields(text)
+            latencies.append(time.perf_counter_ns() - t0)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] / 1000
+
+    return {
+        "messages": len(latencies),
+        "messages_per_sec": len(latencies) / elapsed,
+        "p50_us": percentile(0.50),
+        "p95_us": percentile(0.95),
+        "p99_us": percentile(0.99),
+    }
+
+def check_thresholds(metrics, speed):
+    """List every threshold the run failed"""
+    failures = []
+    if speed["messages_per_sec"] < MIN_MESSAGES_PER_SEC:
+        failures.append(f"throughput {speed['messages_per_sec']:.0f} msg/s < {MIN_MESSAGES_PER_SEC}")
+    if speed["p99_us"] > MAX_P99_LATENCY_US:
+        failures.append(f"p99 latency {speed['p99_us']:.1f}us > {MAX_P99_LATENCY_US}us")
+    for field in FIELDS:
+        if metrics[field]["precision"] < MIN_PRECISION[field]:
+            failures.append(f"{field} precision {metrics[field]['precision']:.3f} < {MIN_PRECISION[field]}")
+        if metrics[field]["recall"] < MIN_RECALL[field]:
+            failures.append(f"{field} recall {metrics[field]['recall']:.3f} < {MIN_RECALL[field]}")
+    return failures
+
+def main():
+    """Main function"""
+    arg_parser = argparse.ArgumentParser(description="Benchmark the SMS expense parser")
+    arg_parser.add_argument("--iterations", type=int, default=200, help="passes over the corpus for timing")
+    arg_parser.add_argument("--corpus", default=CORPUS_PATH, help="path to a labeled corpus")
+    arg_parser.add_argument("--json", dest="json_path", help="also write results to this file")
+    arg_parser.add_argument("--show-misses", action="store_true", help="print every mismatched field")
+    args = arg_parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    metrics, misses = score(corpus)
+    speed = measure_speed(corpus, args.iterations)
+
+    print("=" * 50)
+    print(f"SMS Parser Benchmark ({len(corpus)} labeled messages)")
+    print("=" * 50)
+    print(f"Throughput: {speed['messages_per_sec']:,.0f} messages/sec")
+    print(f"Latency:    p50 {speed['p50_us']:.1f}us  p95 {speed['p95_us']:.1f}us  p99 {speed['p99_us']:.1f}us")
+    print("-" * 50)
+    print(f"{'Field':<10}{'Precision':>12}{'Recall':>12}")
+    for field in FIELDS:
+        print(f"{field:<10}{metrics[field]['precision']:>12.3f}{metrics[field]['recall']:>12.3f}")
+
+    if args.show_misses:
+        print("-" * 50)
+        for field, text, predicted, expected in misses:
+            print(f"[{field}] {text!r}: got {predicted!r}, expected {expected!r}")
+
+    failures = check_thresholds(metrics, speed)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"speed": speed, "accuracy": metrics, "failures": failures}, f, indent=2)
+
+    print("=" * 50)
+    if failures:
+        print("❌ Regression detected:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print("✓ All thresholds met")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from bson import ObjectId
+from pymongo import UpdateOne
+from archive import ARCHIVE_COLLECTION
+from config import settings
+from currency import conversion_factors, expense_currency, user_currency
+
+logger = logging.getLogger(__name__)
+
+# Spend per month is kept on the category document next to its count, in
+# the user's currency: {"count": 42, "monthly_spend": {"2024-05": 310.5, "2024-06": 122.0}}
+SPEND_FIELD = "monthly_spend"
+
+# Categories updated per bulk_write during a rebuild
+REBUILD_BATCH_SIZE = 1000
+
+def month_key(day: datetime) -> str:
+    return f"{day:%Y-%m}"
+
+def spend_factors(currency: str) -> Dict[str, float]:
+    """Multipliers into currency; empty (amounts counted as they are) without a rate for it"""
+    try:
+        return conversion_factors(currency)
+    except ValueError as e:
+        logger.warning(f"Category spend left unconverted: {e}")
+        return {}
+
+def _spend(expense: dict, factors: Dict[str, float]) -> float:
+    return expense["amount"] * factors.get(expense_currency(expense), 1.0)
+
+def category_increments(currency: str, added: Iterable[dict] = (), removed: Iterable[dict] = ()) -> Dict[str, dict]:
+    """$inc documents per category for expenses added to and removed from it
+
+    Amounts are converted into currency, the user's, so a budget compares
+    against one sum. An edit is the old expense removed plus the new one
+    added, so moving an expense between categories or months, or changing
+    its amount, nets out to one small update per affected category.
+    """
+    factors = spend_factors(currency)
+    increments = defaultdict(lambda: defaultdict(int))
+    for expenses, sign in ((added, 1), (removed, -1)):
+        for expense in expenses:
+            increment = increments[expense["category"]]
+            increment["count"] += sign
+            increment[f"{SPEND_FIELD}.{month_key(expense['date'])}"] += sign * _spend(expense, factors)
+    return {
+        category: {path: value for path, value in increment.items() if value}
+        for category, increment in increments.items() if any(increment.values())
+    }
+
+def category_updates(user_id: str, currency: str, added: Iterable[dict] = (), removed: Iterable[dict] = ()) -> List[UpdateOne]:
+    return [
+        UpdateOne({"user_id": user_id, "name": category}, {"$inc": increment})
+        for category, increment in category_increments(currency, added, removed).items()
+    ]
+
+def _empty_totals() -> dict:
+    return {"count": 0, SPEND_FIELD: defaultdict(float)}
+
+def _add_expense(totals: dict, expense: dict, factors: Dict[str, float]):
+    total = totals[expense["category"]]
+    total["count"] += 1
+    total[SPEND_FIELD][month_key(expense["date"])] += _spend(expense, factors)
+
+def _finish(total: dict) -> dict:
+    return {"count": total["count"], SPEND_FIELD: {month: round(spent, 2) for month, spent in total[SPEND_FIELD].items()}}
+
+def category_totals(expenses: Iterable[dict], currency: Optional[str] = None) -> Dict[str, dict]:
+    """Count and spend per month (in currency, by default the base one) for each category, from scratch"""
+    factors = spend_factors(currency or settings.BASE_CURRENCY)
+    totals = defaultdict(_empty_totals)
+    for expense in expenses:
+        _add_expense(totals, expense, factors)
+    return {category: _finish(total) for category, total in totals.items()}
+
+def budget_status(category: dict, month: str) -> Optional[dict]:
+    """How a category with a budget stands in one month; None without a budget"""
+    budget = category.get("budget")
+    if not budget:
+        return None
+    spent = round(category.get(SPEND_FIELD, {}).get(month, 0.0), 2)
+    if spent > budget:
+        state = "over"
+    elif spent >= budget * settings.BUDGET_WARNING_RATIO:
+        state = "warning"
+    else:
+        state = "ok"
+    return {
+        "category": category["name"],
+        "color": category.get("color", "#6b7280"),
+        "icon": category.get("icon", "📦"),
+        "month": month,
+        "budget": budget,
+        "spent": spent,
+        "remaining": round(budget - spent, 2),
+        "percent": round(spent / budget * 100, 1),
+        "status": state,
+    }
+
+async def rebuild_category_totals(db, user_id: Optional[str] = None) -> int:
+    """Recompute category counts and monthly spend from the expenses and the archive
+
+    For data written before spend was tracked, after fixing expenses by
+    hand, or after a user changes currency. Writes racing with the rebuild
+    can be lost, so run it while the user (or, without user_id, the whole
+    app) is quiet. Returns the number of categories written.
+    """
+    scope = {"user_id": user_id} if user_id else {}
+    currencies = {}
+    async for user in db.users.find({"_id": ObjectId(user_id)} if user_id else {}, {"currency": 1}):
+        currencies[str(user["_id"])] = user_currency(user)
+
+    def factors_for(owner: str) -> Dict[str, float]:
+        return spend_factors(currencies.get(owner, settings.BASE_CURRENCY))
+
+    totals = defaultdict(lambda: defaultdict(_empty_totals))
+    async for expense in db.expenses.find(scope, {"user_id": 1, "category": 1, "amount": 1, "currency": 1, "date": 1}):
+        _add_expense(totals[expense["user_id"]], expense, factors_for(expense["user_id"]))
+    cursor = db[ARCHIVE_COLLECTION].find(scope, {
+        "user_id": 1, "expenses.category": 1, "expenses.amount": 1, "expenses.currency": 1, "expenses.date": 1
+    })
+    async for bucket in cursor:
+        factors = factors_for(bucket["user_id"])
+        for expense in bucket.get("expenses", []):
+            _add_expense(totals[bucket["user_id"]], expense, factors)
+
+    operations = []
+    written = 0
+    async for category in db.categories.find(scope, {"user_id": 1, "name": 1}):
+        total = totals[category["user_id"]][category["name"]]
+        operations.append(UpdateOne({"_id": category["_id"]}, {"$set": _finish(total)}))
+        if len(operations) >= REBUILD_BATCH_SIZE:
+            await db.categories.bulk_write(operations, ordered=False)
+            written += len(operations)
+            operations = []
+
+    if operations:
+        await db.categories.bulk_write(operations, ordered=False)
+        written += len(operations)
+
+    logger.info(f"Rebuilt totals for {written} categories")
+    return written
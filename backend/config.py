@@ -5,11 +5,25 @@ class Settings(BaseSettings):
     # MongoDB
     MONGODB_URL: str
     DATABASE_NAME: str = "moneymanagement"
+    MONGODB_MAX_POOL_SIZE: int = 100
+    MONGODB_MIN_POOL_SIZE: int = 5
+    MONGODB_MAX_IDLE_TIME_MS: int = 300000
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS: int = 5000
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS: int = 5000
+    MONGODB_COMPRESSORS: str = "zlib"  # comma separated: zstd, snappy, zlib
+    
+    # Read preference for heavy analytics reads (dashboard stats, admin pages)
+    MONGODB_ANALYTICS_READ_PREFERENCE: str = "primary"  # e.g. secondaryPreferred on a replica set
+    MONGODB_ANALYTICS_MAX_STALENESS_SECONDS: int = -1  # -1 = no limit, otherwise >= 90
+    # Build missing indexes from indexes.py in the background at startup
+    MONGODB_AUTO_CREATE_INDEXES: bool = True
     
     # JWT
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 43200  # 30 days
+    # Write a user's last_active at most this often instead of on every request
+    LAST_ACTIVE_UPDATE_INTERVAL_SECONDS: int = 300
     
     # CORS
     FRONTEND_URL: str = "http://localhost:5173"
@@ -18,11 +32,101 @@ class Settings(BaseSettings):
     GROQ_API_KEY: Optional[str] = None
     OPENAI_API_KEY: Optional[str] = None
     
+    # Parse result cache
+    PARSE_CACHE_TTL_SECONDS: int = 604800  # 7 days
+    PARSE_CACHE_MEMORY_SIZE: int = 1024
+    # Invalidation only reaches the current worker's memory, keep this short
+    PARSE_CACHE_MEMORY_TTL_SECONDS: int = 30
+    
+    # Readiness checks (/health/ready)
+    HEALTH_PING_TIMEOUT_MS: int = 500
+    HEALTH_MAX_POOL_UTILIZATION: float = 0.95
+    HEALTH_MAX_LOOP_LAG_MS: int = 500
+    HEALTH_CACHE_MS: int = 250  # reuse a result this long between polls
+    
+    # Prometheus metrics (/metrics)
+    METRICS_ENABLED: bool = True
+    METRICS_TOKEN: Optional[str] = None  # require "Authorization: Bearer <token>" when set
+    
+    # Slow query log (capped slow_queries collection)
+    SLOW_QUERY_LOG_ENABLED: bool = True
+    SLOW_QUERY_THRESHOLD_MS: int = 100
+    SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS: int = 60  # explain each filter shape at most this often
+    SLOW_QUERY_LOG_SIZE_MB: int = 16
+    
+    # Per-request profiling for admins (X-Profile: 1 or ?profile=1)
+    PROFILING_ENABLED: bool = True
+    PROFILE_DIR: str = "profiles"
+    
+    # X-DB-Queries / X-DB-Time-Ms / X-DB-Operations headers on every response
+    DB_STATS_HEADERS: bool = False
+    
+    # Responses at least this large are gzip-compressed for clients that accept it
+    RESPONSE_GZIP_MIN_BYTES: int = 1024
+    
+    # Archival tier (archive_expenses.py moves old expenses into monthly buckets)
+    ARCHIVE_AFTER_DAYS: int = 365
+    ARCHIVE_BATCH_SIZE: int = 1000
+    # Workers re-read how far archival has reached this often
+    ARCHIVE_HORIZON_CACHE_SECONDS: int = 60
+    
+    # Currencies: totals are converted with the rates in FX_RATES_FILE (no network)
+    BASE_CURRENCY: str = "USD"  # for users without one, expenses from before currencies, admin totals
+    FX_RATES_FILE: str = "fx_rates.json"
+    
+    # Category budgets: "warning" from this share of the budget on
+    BUDGET_WARNING_RATIO: float = 0.8
+    
+    # Live dashboard events (/api/live/events), shared between workers through a capped collection
+    LIVE_EVENTS_ENABLED: bool = True
+    LIVE_EVENTS_LOG_SIZE_MB: int = 16
+    LIVE_EVENTS_QUEUE_SIZE: int = 100  # per connection; a client that falls behind is told to resync
+    LIVE_EVENTS_OUTBOX_SIZE: int = 10000  # events waiting to be written for the other workers
+    LIVE_EVENTS_HEARTBEAT_SECONDS: int = 15
+    
+    # Recurring expenses
+    RECURRING_ENABLED: bool = True
+    RECURRING_BATCH_SIZE: int = 100  # rules materialized per pass
+    RECURRING_MAX_CATCH_UP: int = 400  # missed occurrences written per rule per pass
+    RECURRING_MAX_SLEEP_SECONDS: int = 60
+
+    # Idempotency-Key header on expense creation
+    IDEMPOTENCY_TTL_SECONDS: int = 86400  # how long a key's first response is kept
+    IDEMPOTENCY_MEMORY_SIZE: int = 10000  # responses also kept in each worker's memory
+    IDEMPOTENCY_WAIT_SECONDS: int = 10  # a duplicate of a request running in another worker waits this long, then gets 409
+    IDEMPOTENCY_PENDING_SECONDS: int = 60  # a key held longer than this by a request that never finished is taken over
+
+    # Background jobs
+    JOBS_ENABLED: bool = True
+    JOBS_MAX_CONCURRENT: int = 4  # per worker process; each job type also has its own limit
+    JOBS_POLL_SECONDS: int = 5
+    JOBS_LEASE_SECONDS: int = 60  # renewed while a job runs; a dead worker's jobs are requeued after it
+    JOBS_MAX_ATTEMPTS: int = 5
+    JOBS_RETRY_BASE_SECONDS: int = 10  # doubled after every failed attempt
+    JOBS_RETRY_MAX_SECONDS: int = 3600
+    JOBS_KEEP_FINISHED_DAYS: int = 7
+
+    # Scheduled backups, every databaseBackupInterval hours (admin setting)
+    BACKUP_ENABLED: bool = True
+    BACKUP_DIR: str = "backups"
+    BACKUP_FULL_EVERY: int = 7  # incremental backups between full ones
+    BACKUP_KEEP_FULL: int = 2  # full backups kept, with their incrementals
+    BACKUP_BATCH_SIZE: int = 1000
+    BACKUP_PAUSE_MS: int = 10  # between batches, to limit the read load
+    BACKUP_CHECK_INTERVAL_SECONDS: int = 300
+    
     # Application
     DEBUG: bool = True
     PORT: int = 8000
     HOST: str = "0.0.0.0"
     
+    # Multi-process server (server.py)
+    WORKERS: int = 0  # 0 = one per CPU
+    WORKER_MAX_REQUESTS: int = 10000  # recycle a worker after this many requests, 0 = never
+    WORKER_MAX_REQUESTS_JITTER: int = 1000
+    WORKER_READY_TIMEOUT: int = 60  # seconds
+    WORKER_GRACEFUL_TIMEOUT: int = 30  # seconds
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
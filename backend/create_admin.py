@@ -5,7 +5,7 @@ Run this script from the backend directory: python create_admin.py
 
 import asyncio
 from datetime import datetime
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import create_mongo_client
 from auth import get_password_hash
 from config import settings
 
@@ -41,12 +41,7 @@ async def create_admin_user():
     try:
         # Connect to MongoDB
         print("\nConnecting to MongoDB...")
-        client = AsyncIOMotorClient(
-            settings.MONGODB_URL,
-            maxPoolSize=10,
-            minPoolSize=1,
-            serverSelectionTimeoutMS=5000
-        )
+        client = create_mongo_client()
         db = client[settings.DATABASE_NAME]
         
         # Test connection
@@ -111,12 +106,7 @@ async def list_admins():
     try:
         # Connect to MongoDB
         print("\nConnecting to MongoDB...")
-        client = AsyncIOMotorClient(
-            settings.MONGODB_URL,
-            maxPoolSize=10,
-            minPoolSize=1,
-            serverSelectionTimeoutMS=5000
-        )
+        client = create_mongo_client()
         db = client[settings.DATABASE_NAME]
         
         # Test connection
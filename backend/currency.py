@@ -0,0 +1,88 @@
+import json
+import logging
+import os
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+from fastapi import HTTPException, status
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# fx_rates.json: {"base": "USD", "as_of": "2024-06-01", "rates": {"USD": 1.0, "EUR": 0.921, ...}}
+# where each rate is units of that currency per one unit of the base
+
+@lru_cache(maxsize=4)
+def _read_rates(path: str, mtime: float) -> Dict[str, float]:
+    with open(path, encoding="utf-8") as f:
+        table = json.load(f)
+    rates = {code.upper(): float(rate) for code, rate in table["rates"].items()}
+    if any(rate <= 0 for rate in rates.values()):
+        raise ValueError(f"{path}: rates must be positive")
+    logger.info(f"Loaded {len(rates)} exchange rates from {path} (as of {table.get('as_of', 'unknown')})")
+    return rates
+
+def _rates_file() -> tuple:
+    path = settings.FX_RATES_FILE
+    return path, os.stat(path).st_mtime
+
+def exchange_rates() -> Dict[str, float]:
+    """The rate table, re-read only when the file changes"""
+    return _read_rates(*_rates_file())
+
+@lru_cache(maxsize=64)
+def _factors(target: str, path: str, mtime: float) -> Dict[str, float]:
+    rates = _read_rates(path, mtime)
+    if target not in rates:
+        raise ValueError(f"No exchange rate for {target}")
+    return {code: rates[target] / rate for code, rate in rates.items()}
+
+def conversion_factors(target: str) -> Dict[str, float]:
+    """Multiplier from every known currency into target (don't modify the result)"""
+    return _factors(target, *_rates_file())
+
+def supported_currencies() -> List[str]:
+    return sorted(exchange_rates())
+
+def validate_currency(code: str) -> str:
+    code = code.upper()
+    if code not in exchange_rates():
+        raise ValueError(f"Unsupported currency {code}, expected one of {', '.join(supported_currencies())}")
+    return code
+
+def resolve_currency(code: Optional[str], user: dict) -> str:
+    """A submitted currency, or the user's when not given; 400 without an exchange rate for it"""
+    try:
+        return validate_currency(code or user_currency(user))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+def user_currency(user: dict) -> str:
+    """The currency a user's totals are reported in"""
+    return user.get("currency") or settings.BASE_CURRENCY
+
+def expense_currency(expense: dict) -> str:
+    # Expenses from before currencies were tracked are in the base currency
+    return expense.get("currency") or settings.BASE_CURRENCY
+
+def sum_by_currency(expenses: Iterable[dict]) -> Dict[str, float]:
+    totals = defaultdict(float)
+    for expense in expenses:
+        totals[expense_currency(expense)] += expense["amount"]
+    return totals
+
+def convert_totals(totals: Dict[Optional[str], float], target: str) -> float:
+    """One amount in target from amounts summed per currency
+
+    Totals are summed per currency first (in the database or in one pass)
+    and converted here, so conversion costs one multiplication per currency
+    rather than one per expense.
+    """
+    factors = conversion_factors(target)
+    converted = 0.0
+    for code, amount in totals.items():
+        code = code or settings.BASE_CURRENCY
+        if code not in factors:
+            logger.warning(f"No exchange rate for {code}, counting it as {target}")
+        converted += amount * factors.get(code, 1.0)
+    return converted
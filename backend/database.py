@@ -1,68 +1,114 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.read_preferences import read_pref_mode_from_name, make_read_preference
 from config import settings
+from pool_metrics import pool_metrics
+from metrics import command_metrics
+from slow_queries import slow_query_log
+from db_stats import request_db_listener
+from indexes import ensure_indexes
+import asyncio
 import logging
+from urllib.parse import urlparse
 
 logger = logging.getLogger(__name__)
 
 class Database:
     client: AsyncIOMotorClient = None
     db = None
+    analytics_db = None
+    index_task: asyncio.Task = None
 
 db_instance = Database()
 
+def create_mongo_client(**overrides) -> AsyncIOMotorClient:
+    """Create a Motor client using the pool settings from config"""
+    options = {
+        "maxPoolSize": settings.MONGODB_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGODB_MIN_POOL_SIZE,
+        "maxIdleTimeMS": settings.MONGODB_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        "event_listeners": [pool_metrics, request_db_listener],
+    }
+    if settings.METRICS_ENABLED:
+        options["event_listeners"].append(command_metrics)
+    if settings.SLOW_QUERY_LOG_ENABLED:
+        options["event_listeners"].append(slow_query_log)
+    if settings.MONGODB_COMPRESSORS:
+        options["compressors"] = settings.MONGODB_COMPRESSORS
+    options.update(overrides)
+    return AsyncIOMotorClient(settings.MONGODB_URL, **options)
+
+# Hosts the seeding and load-test scripts may write to without --allow-remote
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1", "mongo", "mongodb"}
+
+def is_local_mongodb(url: str) -> bool:
+    """Whether MONGODB_URL points at a local server"""
+    hosts = urlparse(url).netloc.rpartition("@")[2].split(",")
+    return all(host.rsplit(":", 1)[0].strip("[]") in LOCAL_HOSTS for host in hosts)
+
+def analytics_read_preference():
+    """Read preference used for heavy, staleness-tolerant reads"""
+    mode = read_pref_mode_from_name(settings.MONGODB_ANALYTICS_READ_PREFERENCE)
+    return make_read_preference(mode, None, settings.MONGODB_ANALYTICS_MAX_STALENESS_SECONDS)
+
 async def connect_to_mongo():
     """Connect to MongoDB Atlas"""
     try:
         logger.info("Connecting to MongoDB Atlas...")
-        db_instance.client = AsyncIOMotorClient(
-            settings.MONGODB_URL,
-            maxPoolSize=10,
-            minPoolSize=1,
-            serverSelectionTimeoutMS=5000
-        )
+        db_instance.client = create_mongo_client()
         db_instance.db = db_instance.client[settings.DATABASE_NAME]
         
+        # Same connection pool; reads go to secondaries only if configured
+        db_instance.analytics_db = db_instance.client.get_database(
+            settings.DATABASE_NAME,
+            read_preference=analytics_read_preference()
+        )
+        
         # Test the connection
         await db_instance.client.admin.command('ping')
         logger.info(f"Successfully connected to MongoDB: {settings.DATABASE_NAME}")
         
-        # Create indexes
-        await create_indexes()
+        if settings.SLOW_QUERY_LOG_ENABLED:
+            slow_query_log.start(db_instance.client)
+        
+        # Build missing indexes without holding up startup or requests
+        if settings.MONGODB_AUTO_CREATE_INDEXES:
+            db_instance.index_task = asyncio.create_task(ensure_indexes(db_instance.db))
         
     except Exception as e:
         logger.error(f"Could not connect to MongoDB: {e}")
         raise
 
+async def warm_up():
+    """Open the minimum pool connections and touch hot collections before serving
+
+    Failures propagate so the lifespan startup fails and the worker never
+    reports itself ready.
+    """
+    await asyncio.gather(*[
+        db_instance.client.admin.command('ping')
+        for _ in range(max(1, settings.MONGODB_MIN_POOL_SIZE))
+    ])
+    await db_instance.db.settings.find_one({"_id": "admin_settings"})
+    logger.info("Database warm-up complete")
+
 async def close_mongo_connection():
     """Close MongoDB connection"""
     try:
+        if db_instance.index_task and not db_instance.index_task.done():
+            db_instance.index_task.cancel()
+        slow_query_log.stop()
         if db_instance.client:
             db_instance.client.close()
             logger.info("MongoDB connection closed")
     except Exception as e:
         logger.error(f"Error closing MongoDB connection: {e}")
 
-async def create_indexes():
-    """Create database indexes for better performance"""
-    try:
-        # Users collection indexes
-        await db_instance.db.users.create_index("email", unique=True)
-        await db_instance.db.users.create_index("role")
-        
-        # Expenses collection indexes
-        await db_instance.db.expenses.create_index("user_id")
-        await db_instance.db.expenses.create_index("date")
-        await db_instance.db.expenses.create_index("category")
-        await db_instance.db.expenses.create_index([("user_id", 1), ("date", -1)])
-        
-        # Categories collection indexes
-        await db_instance.db.categories.create_index("user_id")
-        await db_instance.db.categories.create_index([("user_id", 1), ("name", 1)], unique=True)
-        
-        logger.info("Database indexes created successfully")
-    except Exception as e:
-        logger.warning(f"Error creating indexes: {e}")
-
 def get_database():
     """Get database instance"""
     return db_instance.db
+
+def get_analytics_database():
+    """Get database instance for heavy reads that may go to secondaries"""
+    return db_instance.analytics_db
@@ -0,0 +1,109 @@
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from pymongo import monitoring
+
+class RequestDBStats:
+    """MongoDB commands issued on behalf of one request"""
+
+    def __init__(self):
+        self.commands = 0
+        self.duration_ms = 0.0
+        self.by_operation = Counter()
+
+    def record(self, command_name: str, collection: str, duration_ms: float):
+        self.commands += 1
+        self.duration_ms += duration_ms
+        self.by_operation[f"{command_name} {collection}".strip()] += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "commands": self.commands,
+            "durationMs": round(self.duration_ms, 3),
+            "operations": dict(self.by_operation.most_common()),
+        }
+
+    def describe(self) -> str:
+        """One-line breakdown of the commands, most frequent first"""
+        return ", ".join(f"{operation} x{count}" for operation, count in self.by_operation.most_common())
+
+# Set while a request is being tracked. Motor runs driver calls with a copy of
+# the caller's context, so the listener below sees the request's stats object.
+current_db_stats: ContextVar[Optional[RequestDBStats]] = ContextVar("current_db_stats", default=None)
+
+class RequestDBListener(monitoring.CommandListener):
+    """Attribute MongoDB commands to the request that issued them, when tracked"""
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        if current_db_stats.get() is None:
+            return
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        self._collections[(event.connection_id, event.request_id)] = target if isinstance(target, str) else ""
+
+    def _record(self, event):
+        stats = current_db_stats.get()
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        if stats is not None:
+            stats.record(event.command_name, collection, event.duration_micros / 1000)
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        self._record(event)
+
+request_db_listener = RequestDBListener()
+
+@contextmanager
+def track_db_stats():
+    """Count the MongoDB commands issued inside the block
+
+    Reuses the stats of an enclosing tracked request, so nested tracking
+    (e.g. profiling inside DBStatsMiddleware) adds to the same totals.
+    """
+    stats = current_db_stats.get()
+    if stats is not None:
+        yield stats
+        return
+    stats = RequestDBStats()
+    token = current_db_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_db_stats.reset(token)
+
+class DBStatsMiddleware:
+    """Report each request's MongoDB round trips in response headers
+
+    Meant for development and tests: X-DB-Queries and X-DB-Time-Ms carry the
+    totals, X-DB-Operations the per-command breakdown. Commands issued after
+    the response has started (background tasks) are not included.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track_db_stats() as stats:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    headers += [
+                        (b"x-db-queries", str(stats.commands).encode()),
+                        (b"x-db-time-ms", f"{stats.duration_ms:.3f}".encode()),
+                        (b"x-db-operations", stats.describe().encode()),
+                    ]
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
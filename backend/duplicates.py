@@ -0,0 +1,135 @@
+import re
+from datetime import datetime, timedelta
+from typing import List, Optional, Union
+from pymongo import UpdateOne
+from merchant_index import normalize_merchant
+from models import ExpenseSource
+
+# The same purchase can land on neighbouring days depending on which channel
+# (SMS, receipt, manual entry) and timezone it was recorded through. Within a
+# single channel only same-day entries count as duplicates.
+DATE_BUCKET_TOLERANCE_DAYS = 1
+
+# Bumped whenever the fingerprint format changes so stored ones get recomputed
+FINGERPRINT_VERSION = "v2"
+
+def _fingerprint(amount: float, day, merchant_key: Optional[str]) -> str:
+    return f"{FINGERPRINT_VERSION}|{round(amount * 100):d}|{day.isoformat()}|{merchant_key or ''}"
+
+def expense_fingerprint(amount: float, date: datetime, merchant: Optional[str]) -> str:
+    """Fingerprint an expense by amount in cents, day and normalized merchant"""
+    return _fingerprint(amount, date.date(), normalize_merchant(merchant))
+
+def candidate_fingerprints(amount: float, date: datetime, merchant: Optional[str]) -> List[str]:
+    """Fingerprints an existing duplicate of this expense could have been stored with
+
+    The expense's own fingerprint comes first, then the neighbouring days.
+    """
+    merchant_key = normalize_merchant(merchant)
+    day = date.date()
+    offsets = [0]
+    for distance in range(1, DATE_BUCKET_TOLERANCE_DAYS + 1):
+        offsets += [-distance, distance]
+    return [_fingerprint(amount, day + timedelta(days=offset), merchant_key) for offset in offsets]
+
+def _source(expense: dict) -> str:
+    return expense.get("source") or ExpenseSource.MANUAL.value
+
+def _pick_match(fingerprint: str, source: str, candidates: List[str], seen: dict):
+    """First candidate on the same day, or on a neighbouring day from another source"""
+    for candidate in candidates:
+        for match, match_source in seen.get(candidate, ()):
+            if candidate == fingerprint or match_source != source:
+                return match
+    return None
+
+async def find_duplicate(
+    db,
+    user_id: str,
+    amount: float,
+    date: datetime,
+    merchant: Optional[str],
+    source: str = ExpenseSource.MANUAL.value
+) -> Optional[dict]:
+    """Find a stored expense that looks like the same purchase"""
+    candidates = candidate_fingerprints(amount, date, merchant)
+    seen = {}
+    cursor = db.expenses.find({"user_id": user_id, "fingerprint": {"$in": candidates}})
+    async for existing in cursor:
+        seen.setdefault(existing["fingerprint"], []).append((existing, _source(existing)))
+    return _pick_match(candidates[0], source, candidates, seen)
+
+async def find_duplicates_bulk(db, user_id: str, expenses: List[dict]) -> List[Union[dict, int, None]]:
+    """Match a batch of new expenses against stored ones and against each other
+
+    Uses a single indexed query for the whole batch. Returns, for each input
+    expense, the stored expense it duplicates, the index of an earlier
+    expense in the same batch it duplicates, or None.
+    """
+    candidates_per_expense = [
+        candidate_fingerprints(expense["amount"], expense["date"], expense["merchant"])
+        for expense in expenses
+    ]
+    all_candidates = {fingerprint for candidates in candidates_per_expense for fingerprint in candidates}
+
+    seen = {}
+    if all_candidates:
+        cursor = db.expenses.find({"user_id": user_id, "fingerprint": {"$in": list(all_candidates)}})
+        async for existing in cursor:
+            seen.setdefault(existing["fingerprint"], []).append((existing, _source(existing)))
+
+    matches = []
+    for index, (expense, candidates) in enumerate(zip(expenses, candidates_per_expense)):
+        match = _pick_match(candidates[0], _source(expense), candidates, seen)
+        matches.append(match)
+        if match is None:
+            # Later rows in the same batch should be flagged against this one
+            seen.setdefault(candidates[0], []).append((index, _source(expense)))
+    return matches
+
+async def backfill_fingerprints(db, batch_size: int = 1000) -> int:
+    """Fingerprint expenses stored without one or with an outdated format"""
+    updated = 0
+    operations = []
+    cursor = db.expenses.find(
+        {"fingerprint": {"$not": re.compile(f"^{FINGERPRINT_VERSION}\\|")}},
+        {"amount": 1, "date": 1, "merchant": 1}
+    )
+    async for expense in cursor:
+        operations.append(UpdateOne(
+            {"_id": expense["_id"]},
+            {"$set": {"fingerprint": expense_fingerprint(expense["amount"], expense["date"], expense.get("merchant"))}}
+        ))
+        if len(operations) >= batch_size:
+            await db.expenses.bulk_write(operations, ordered=False)
+            updated += len(operations)
+            operations = []
+
+    if operations:
+        await db.expenses.bulk_write(operations, ordered=False)
+        updated += len(operations)
+    return updated
+
+async def scan_duplicates(db, user_id: Optional[str] = None) -> List[dict]:
+    """Group stored expenses that share a fingerprint
+
+    Only exact fingerprint matches (same day) are grouped, so the scan is a
+    single indexed aggregation even over large histories.
+    """
+    match = {"fingerprint": {"$exists": True}}
+    if user_id:
+        match["user_id"] = user_id
+
+    pipeline = [
+        {"$match": match},
+        {"$sort": {"user_id": 1, "fingerprint": 1}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "fingerprint": "$fingerprint"},
+            "expense_ids": {"$push": "$_id"},
+            "sources": {"$addToSet": "$source"},
+            "count": {"$sum": 1},
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$sort": {"count": -1}},
+    ]
+    return await db.expenses.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
@@ -0,0 +1,57 @@
+"""
+Script to find likely duplicate expenses in existing data
+Run this script from the backend directory: python find_duplicate_expenses.py [user_id]
+"""
+
+import asyncio
+import sys
+from database import create_mongo_client
+from config import settings
+from duplicates import backfill_fingerprints, scan_duplicates
+
+async def main():
+    """Main function"""
+    user_id = sys.argv[1] if len(sys.argv) > 1 else None
+    
+    print("=" * 50)
+    print("Money Management System - Find Duplicate Expenses")
+    print("=" * 50)
+    
+    try:
+        # Connect to MongoDB
+        print("\nConnecting to MongoDB...")
+        client = create_mongo_client()
+        db = client[settings.DATABASE_NAME]
+        
+        # Test connection
+        await client.admin.command('ping')
+        print(f"Connected to MongoDB: {settings.DATABASE_NAME}")
+        
+        # Older expenses were stored without a fingerprint, or in an older format
+        print("\nBackfilling fingerprints...")
+        backfilled = await backfill_fingerprints(db)
+        print(f"✓ Fingerprinted {backfilled} expense(s)")
+        
+        print("\nScanning for duplicates...")
+        groups = await scan_duplicates(db, user_id)
+        
+        if not groups:
+            print("\nNo duplicate expenses found.")
+        else:
+            print("\n" + "=" * 50)
+            print(f"Found {len(groups)} group(s) of likely duplicates:")
+            print("=" * 50)
+            for group in groups:
+                print(f"\nUser: {group['_id']['user_id']}")
+                print(f"Fingerprint: {group['_id']['fingerprint']}")
+                print(f"Sources: {', '.join(str(source) for source in group['sources'])}")
+                print(f"Expenses: {', '.join(str(expense_id) for expense_id in group['expense_ids'])}")
+                print("-" * 50)
+        
+        client.close()
+        
+    except Exception as e:
+        print(f"\nError: {str(e)}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
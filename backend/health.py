@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import time
+from config import settings
+from database import db_instance
+from parse_cache import memory_cache
+from pool_metrics import pool_metrics
+
+logger = logging.getLogger(__name__)
+
+# How often the event loop lag probe runs
+LOOP_LAG_INTERVAL_SECONDS = 0.5
+
+class HealthState:
+    """Readiness inputs that are cheaper to track continuously than to measure per request"""
+
+    def __init__(self):
+        self.warmed_up = False
+        self.loop_lag_ms = 0.0
+        self.lag_task: asyncio.Task = None
+        self.last_checkout_timeouts = 0
+        self.last_report = None
+        self.last_report_at = 0.0
+        self.pending: asyncio.Task = None
+
+health_state = HealthState()
+
+async def _measure_loop_lag():
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + LOOP_LAG_INTERVAL_SECONDS
+        await asyncio.sleep(LOOP_LAG_INTERVAL_SECONDS)
+        health_state.loop_lag_ms = max(0.0, (loop.time() - expected) * 1000)
+
+def start_health_monitor():
+    """Start the event loop lag probe; call once the app has warmed up"""
+    health_state.warmed_up = True
+    health_state.lag_task = asyncio.create_task(_measure_loop_lag())
+
+def stop_health_monitor():
+    health_state.warmed_up = False
+    if health_state.lag_task and not health_state.lag_task.done():
+        health_state.lag_task.cancel()
+
+async def _ping_database() -> dict:
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(
+            db_instance.client.admin.command("ping"),
+            timeout=settings.HEALTH_PING_TIMEOUT_MS / 1000
+        )
+        return {"status": "up", "latencyMs": round((time.perf_counter() - started) * 1000, 2)}
+    except asyncio.TimeoutError:
+        return {"status": "timeout", "latencyMs": settings.HEALTH_PING_TIMEOUT_MS}
+    except Exception as e:
+        logger.warning(f"Readiness ping failed: {e}")
+        return {"status": "down", "error": str(e)}
+
+async def _build_report() -> dict:
+    database = await _ping_database() if db_instance.client else {"status": "down", "error": "not connected"}
+
+    pool = pool_metrics.snapshot()
+    utilization = pool["connectionsInUse"] / max(1, settings.MONGODB_MAX_POOL_SIZE)
+    # Checkout timeouts since the previous check mean requests are queueing for the pool
+    new_timeouts = pool["checkoutTimeouts"] - health_state.last_checkout_timeouts
+    health_state.last_checkout_timeouts = pool["checkoutTimeouts"]
+
+    problems = []
+    if database["status"] != "up":
+        problems.append(f"database {database['status']}")
+    if utilization >= settings.HEALTH_MAX_POOL_UTILIZATION:
+        problems.append(f"connection pool {utilization:.0%} in use")
+    if new_timeouts > 0:
+        problems.append(f"{new_timeouts} connection checkout timeout(s)")
+    if health_state.loop_lag_ms > settings.HEALTH_MAX_LOOP_LAG_MS:
+        problems.append(f"event loop lag {health_state.loop_lag_ms:.0f}ms")
+    if not health_state.warmed_up:
+        problems.append("warm-up not finished")
+
+    return {
+        "status": "ready" if not problems else "unavailable",
+        "problems": problems,
+        "database": database,
+        "pool": {
+            "inUse": pool["connectionsInUse"],
+            "open": pool["connectionsOpen"],
+            "maxSize": settings.MONGODB_MAX_POOL_SIZE,
+            "utilization": round(utilization, 3),
+            "waitAvgMs": pool["waitAvgMs"],
+            "checkoutTimeouts": new_timeouts,
+        },
+        "eventLoopLagMs": round(health_state.loop_lag_ms, 2),
+        "cache": {"warmedUp": health_state.warmed_up, "parseCacheEntries": len(memory_cache)},
+    }
+
+async def readiness_report() -> dict:
+    """Current readiness, shared between concurrent and rapid-fire callers
+
+    Results are reused for HEALTH_CACHE_MS and concurrent callers await the
+    same check, so frequent polling costs at most one ping per interval.
+    """
+    if health_state.last_report and (time.monotonic() - health_state.last_report_at) * 1000 < settings.HEALTH_CACHE_MS:
+        return health_state.last_report
+    if health_state.pending is None or health_state.pending.done():
+        health_state.pending = asyncio.ensure_future(_build_report())
+    report = await asyncio.shield(health_state.pending)
+    health_state.last_report = report
+    health_state.last_report_at = time.monotonic()
+    return report
@@ -0,0 +1,137 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from fastapi import HTTPException, Response, status
+from fastapi.encoders import jsonable_encoder
+from pymongo.errors import DuplicateKeyError
+from config import settings
+from parse_cache import ParseResultLRU
+
+logger = logging.getLogger(__name__)
+
+# First responses to requests sent with an Idempotency-Key, expiring after IDEMPOTENCY_TTL_SECONDS
+IDEMPOTENCY_COLLECTION = "idempotency_keys"
+
+# How often a duplicate polls for the response of a request running in another worker
+POLL_SECONDS = 0.1
+
+class IdempotencyState:
+    """This worker's finished responses, and the requests it is running, per (user, route, key)"""
+
+    def __init__(self):
+        self.responses = ParseResultLRU(settings.IDEMPOTENCY_MEMORY_SIZE, settings.IDEMPOTENCY_TTL_SECONDS)
+        self.in_flight: Dict[tuple, asyncio.Future] = {}
+
+idempotency_state = IdempotencyState()
+
+def request_fingerprint(request_data: Any) -> str:
+    return hashlib.sha256(json.dumps(jsonable_encoder(request_data), sort_keys=True).encode("utf-8")).hexdigest()
+
+def _replay(entry: dict, fingerprint: str, response: Response) -> Any:
+    if entry["fingerprint"] != fingerprint:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used with a different request"
+        )
+    response.headers["Idempotent-Replayed"] = "true"
+    return entry["response"]
+
+async def _claim(db, record_id: str, user_id: str, fingerprint: str) -> Optional[dict]:
+    """Take the key for this request (None), or wait for the request that holds it and return its record
+
+    A request that fails lets go of its key, so a waiting duplicate takes
+    it over and runs. So does one that finds the key held past
+    IDEMPOTENCY_PENDING_SECONDS, since the worker holding it has died.
+    """
+    keys = db[IDEMPOTENCY_COLLECTION]
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        now = datetime.utcnow()
+        try:
+            await keys.insert_one({
+                "_id": record_id, "user_id": user_id, "fingerprint": fingerprint,
+                "status": "pending", "response": None, "created_at": now
+            })
+            return None
+        except DuplicateKeyError:
+            pass
+        record = await keys.find_one({"_id": record_id})
+        if record is not None:
+            if record["status"] == "done":
+                return record
+            if record["created_at"] < now - timedelta(seconds=settings.IDEMPOTENCY_PENDING_SECONDS):
+                taken = await keys.find_one_and_update(
+                    {"_id": record_id, "status": "pending", "created_at": record["created_at"]},
+                    {"$set": {"fingerprint": fingerprint, "created_at": now}}
+                )
+                if taken is not None:
+                    logger.warning(f"Took over Idempotency-Key {record_id} from a request that never finished")
+                    return None
+        if time.monotonic() > deadline:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is still in progress"
+            )
+        await asyncio.sleep(POLL_SECONDS)
+
+async def _run_once(db, user_id: str, cache_key: tuple, fingerprint: str,
+                    handler: Callable[[], Awaitable[Any]]) -> Tuple[dict, bool]:
+    """The key's entry, and whether it is another request's"""
+    record_id = ":".join(cache_key)
+    record = await _claim(db, record_id, user_id, fingerprint)
+    if record is not None:
+        return {"fingerprint": record["fingerprint"], "response": record["response"]}, True
+    try:
+        result = jsonable_encoder(await handler())
+    except BaseException:
+        # Errors aren't stored: the client may fix the request and retry with the same key
+        await db[IDEMPOTENCY_COLLECTION].delete_one({"_id": record_id, "status": "pending"})
+        raise
+    await db[IDEMPOTENCY_COLLECTION].update_one(
+        {"_id": record_id}, {"$set": {"status": "done", "response": result}}
+    )
+    return {"fingerprint": fingerprint, "response": result}, False
+
+async def idempotent(
+    db, user_id: str, route: str, key: Optional[str], request_data: Any, response: Response,
+    handler: Callable[[], Awaitable[Any]]
+) -> Any:
+    """Run a write once per Idempotency-Key and hand every retry the first response
+
+    Duplicates arriving while the first request runs in this worker wait
+    for it in memory; in another worker they wait on the key's record, whose
+    unique _id lets only one of them claim it. Without a key the handler
+    simply runs.
+    """
+    if key is None:
+        return await handler()
+    fingerprint = request_fingerprint(request_data)
+    cache_key = (user_id, route, key)
+
+    entry = idempotency_state.responses.get(cache_key)
+    if entry is not None:
+        return _replay(entry, fingerprint, response)
+    if cache_key in idempotency_state.in_flight:
+        return _replay(await asyncio.shield(idempotency_state.in_flight[cache_key]), fingerprint, response)
+
+    future = asyncio.get_running_loop().create_future()
+    idempotency_state.in_flight[cache_key] = future
+    try:
+        entry, replayed = await _run_once(db, user_id, cache_key, fingerprint, handler)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        # Duplicates waiting on this request fail the same way
+        future.set_exception(e)
+        future.exception()  # retrieved, even when none was waiting
+        raise
+    finally:
+        del idempotency_state.in_flight[cache_key]
+    idempotency_state.responses.set(cache_key, entry)
+    future.set_result(entry)
+    return _replay(entry, fingerprint, response) if replayed else entry["response"]
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Options that make two indexes with the same keys behave differently
+COMPARED_OPTIONS = ["unique", "sparse", "expireAfterSeconds", "partialFilterExpression"]
+
+def index_spec() -> Dict[str, List[IndexModel]]:
+    """Every index the application's queries rely on, per collection
+
+    This is the single source of truth: manage_indexes.py diffs it against
+    the live database, and anything not listed here counts as unused.
+    """
+    return {
+        "users": [
+            IndexModel([("email", ASCENDING)], unique=True),
+            IndexModel([("role", ASCENDING)]),
+            IndexModel([("status", ASCENDING), ("created_at", DESCENDING)]),
+            IndexModel([("created_at", DESCENDING)]),
+            IndexModel([("last_active", DESCENDING)]),
+        ],
+        "expenses": [
+            IndexModel([("date", ASCENDING)]),
+            IndexModel([("user_id", ASCENDING), ("date", DESCENDING)]),
+            IndexModel([("user_id", ASCENDING), ("category", ASCENDING), ("date", DESCENDING)]),
+            IndexModel([("user_id", ASCENDING), ("source", ASCENDING), ("date", DESCENDING)]),
+            IndexModel([("user_id", ASCENDING), ("fingerprint", ASCENDING)]),
+            # Edited expenses only, for incremental backups
+            IndexModel([("updated_at", ASCENDING)], partialFilterExpression={"updated_at": {"$gt": datetime(1970, 1, 1)}}),
+            # One expense per recurring rule and occurrence, however many workers materialize it
+            IndexModel([("recurring_id", ASCENDING), ("date", ASCENDING)], unique=True, partialFilterExpression={"recurring_id": {"$exists": True}}),
+        ],
+        "categories": [
+            IndexModel([("user_id", ASCENDING), ("name", ASCENDING)], unique=True),
+        ],
+        # Monthly buckets of archived expenses
+        "expense_archive": [
+            IndexModel([("user_id", ASCENDING), ("month", DESCENDING)], unique=True),
+            IndexModel([("updated_at", ASCENDING)]),
+        ],
+        # Recurring expense rules; next_run orders the scheduler's queue
+        "recurring_expenses": [
+            IndexModel([("user_id", ASCENDING), ("next_run", ASCENDING)]),
+            IndexModel([("next_run", ASCENDING)], partialFilterExpression={"active": True}),
+        ],
+        # Background jobs; claims take the highest priority, then the oldest due, of the types a worker has room for
+        "jobs": [
+            IndexModel([("status", ASCENDING), ("type", ASCENDING), ("priority", DESCENDING), ("run_at", ASCENDING)]),
+            IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)]),
+            IndexModel([("created_at", DESCENDING)]),
+            IndexModel([("finished_at", ASCENDING)], expireAfterSeconds=settings.JOBS_KEEP_FINISHED_DAYS * 86400),
+            # One running job per concurrency slot of a type, across workers
+            IndexModel([("type", ASCENDING), ("slot", ASCENDING)], unique=True, partialFilterExpression={"slot": {"$exists": True}}),
+        ],
+        # First responses per Idempotency-Key (looked up by _id)
+        "idempotency_keys": [
+            IndexModel([("user_id", ASCENDING)]),
+            IndexModel([("created_at", ASCENDING)], expireAfterSeconds=settings.IDEMPOTENCY_TTL_SECONDS),
+        ],
+        # Learned merchant -> category mappings
+        "merchant_categories": [
+            IndexModel([("user_id", ASCENDING), ("merchant_key", ASCENDING), ("category", ASCENDING)], unique=True),
+        ],
+        # Parse cache entries expire after the configured TTL
+        "parse_cache": [
+            IndexModel([("user_id", ASCENDING)]),
+            IndexModel([("created_at", ASCENDING)], expireAfterSeconds=settings.PARSE_CACHE_TTL_SECONDS),
+        ],
+    }
+
+def _options(info: dict) -> dict:
+    return {option: info[option] for option in COMPARED_OPTIONS if option in info}
+
+async def diff_collection(db, collection: str, wanted: List[IndexModel]) -> dict:
+    """Compare one collection's live indexes with the spec"""
+    live = await db[collection].index_information()
+    live.pop("_id_", None)
+
+    missing, changed = [], []
+    for model in wanted:
+        document = model.document
+        info = live.pop(document["name"], None)
+        if info is None:
+            missing.append(model)
+        elif list(info["key"]) != list(document["key"].items()) or _options(info) != _options(document):
+            changed.append({"name": document["name"], "live": _options(info), "wanted": _options(document)})
+
+    return {"missing": missing, "changed": changed, "extra": sorted(live)}
+
+async def diff_indexes(db) -> Dict[str, dict]:
+    """Compare every collection in the spec with the live database"""
+    spec = index_spec()
+    results = await asyncio.gather(*[diff_collection(db, name, models) for name, models in spec.items()])
+    return dict(zip(spec, results))
+
+async def build_missing_indexes(db) -> List[str]:
+    """Build indexes that are in the spec but not in the database
+
+    A changed TTL is applied in place with collMod; other changed options
+    need the index dropped by hand first, so they are only logged. Returns
+    the names of the indexes built or modified.
+    """
+    built = []
+    for collection, diff in (await diff_indexes(db)).items():
+        if diff["missing"]:
+            built += await db[collection].create_indexes(diff["missing"])
+        for change in diff["changed"]:
+            wanted_ttl = change["wanted"].get("expireAfterSeconds")
+            if wanted_ttl is not None and change["live"].get("expireAfterSeconds") != wanted_ttl:
+                await db.command("collMod", collection, index={"name": change["name"], "expireAfterSeconds": wanted_ttl})
+                built.append(change["name"])
+            else:
+                logger.warning(f"Index {collection}.{change['name']} differs from the spec: {change}")
+    return built
+
+async def index_usage(db, collection: str) -> List[dict]:
+    """Per-index access counts from $indexStats since the last server restart"""
+    stats = await db[collection].aggregate([{"$indexStats": {}}]).to_list(length=None)
+    usage = [
+        {
+            "name": stat["name"],
+            "ops": stat["accesses"]["ops"],
+            "since": stat["accesses"]["since"],
+            "host": stat.get("host"),
+        }
+        for stat in stats
+    ]
+    return sorted(usage, key=lambda entry: entry["ops"])
+
+async def drop_unused_indexes(db, max_ops: int = 0, dry_run: bool = True) -> List[str]:
+    """Drop indexes that are not in the spec and have at most max_ops accesses
+
+    Indexes in the spec are never dropped, however rarely they are used.
+    Returns the qualified names of the indexes dropped (or that would be).
+    """
+    dropped = []
+    for collection, diff in (await diff_indexes(db)).items():
+        if not diff["extra"]:
+            continue
+        ops = {entry["name"]: entry["ops"] for entry in await index_usage(db, collection)}
+        for name in diff["extra"]:
+            if ops.get(name, 0) > max_ops:
+                continue
+            if not dry_run:
+                await db[collection].drop_index(name)
+            dropped.append(f"{collection}.{name}")
+    return dropped
+
+async def ensure_indexes(db):
+    """Build missing indexes without failing the caller"""
+    try:
+        built = await build_missing_indexes(db)
+        if built:
+            logger.info(f"Built indexes: {', '.join(built)}")
+        else:
+            logger.info("Database indexes are up to date")
+    except Exception as e:
+        logger.warning(f"Error creating indexes: {e}")
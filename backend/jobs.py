@@ -0,0 +1,349 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from archive import ARCHIVE_COLLECTION
+from budgets import rebuild_category_totals
+from config import settings
+from duplicates import backfill_fingerprints
+from merchant_index import rebuild_merchant_index
+from idempotency import IDEMPOTENCY_COLLECTION
+from parse_cache import invalidate_user_cache
+from recurring import RECURRING_COLLECTION
+
+logger = logging.getLogger(__name__)
+
+JOBS_COLLECTION = "jobs"
+
+# Job types admins may queue by hand
+MAINTENANCE_JOB_TYPES = ("merchant_index.rebuild", "category_totals.rebuild", "fingerprints.backfill")
+
+class JobType:
+    """How a kind of job runs: its handler, how many run at once across all workers, and how often it is tried"""
+
+    def __init__(self, name: str, handler: Callable[[Any, dict], Awaitable[Any]], concurrency: int,
+                 max_attempts: Optional[int], lease_seconds: Optional[int]):
+        self.name = name
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+
+    @property
+    def lease(self) -> timedelta:
+        return timedelta(seconds=self.lease_seconds or settings.JOBS_LEASE_SECONDS)
+
+job_types: Dict[str, JobType] = {}
+
+def job_handler(name: str, concurrency: int = 1, max_attempts: Optional[int] = None, lease_seconds: Optional[int] = None):
+    """Register an async handler(db, job) for a job type; what it returns is stored as the job's result
+
+    Handlers may run more than once for the same job (after a failure, or
+    when a worker dies mid-job), so they must be safe to repeat. At most
+    concurrency jobs of the type run at once, whichever workers hold them.
+    """
+    def register(handler):
+        job_types[name] = JobType(name, handler, concurrency, max_attempts, lease_seconds)
+        return handler
+    return register
+
+class JobsState:
+    """This worker's dispatcher task, the jobs it is running, and the event that wakes it early"""
+
+    def __init__(self):
+        self.worker_id: str = None
+        self.task: asyncio.Task = None
+        self.wake: asyncio.Event = None
+        self.running: Dict[ObjectId, asyncio.Task] = {}
+
+jobs_state = JobsState()
+
+def retry_delay(attempts: int) -> timedelta:
+    """Exponential backoff after a job's nth failed attempt"""
+    seconds = settings.JOBS_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+    return timedelta(seconds=min(seconds, settings.JOBS_RETRY_MAX_SECONDS))
+
+async def enqueue_job(db, job_type: str, payload: Optional[dict] = None, user_id: Optional[str] = None,
+                      priority: int = 0, run_at: Optional[datetime] = None) -> dict:
+    """Queue a job; higher priorities are claimed first, then the longest waiting"""
+    if job_type not in job_types:
+        raise ValueError(f"Unknown job type {job_type}, expected one of {', '.join(sorted(job_types))}")
+    now = datetime.utcnow()
+    job = {
+        "type": job_type,
+        "payload": payload or {},
+        "user_id": user_id,
+        "status": "queued",
+        "priority": priority,
+        "attempts": 0,
+        "max_attempts": job_types[job_type].max_attempts or settings.JOBS_MAX_ATTEMPTS,
+        "run_at": run_at or now,
+        "worker": None,
+        "lease_until": None,
+        "cancel_requested": False,
+        "error": None,
+        "result": None,
+        "created_at": now,
+        "started_at": None,
+        "finished_at": None,
+    }
+    result = await db[JOBS_COLLECTION].insert_one(job)
+    job["_id"] = result.inserted_id
+    wake_job_workers()
+    return job
+
+async def _free_slots(db, types: List[str]) -> Dict[str, List[int]]:
+    """Slots not held by a running job, for each of the given types that has one"""
+    taken = defaultdict(set)
+    cursor = db[JOBS_COLLECTION].find(
+        {"status": "running", "type": {"$in": types}, "slot": {"$exists": True}}, {"type": 1, "slot": 1}
+    )
+    async for job in cursor:
+        taken[job["type"]].add(job["slot"])
+    free = {}
+    for name in types:
+        if name in job_types:
+            slots = [slot for slot in range(job_types[name].concurrency) if slot not in taken[name]]
+            if slots:
+                free[name] = slots
+    return free
+
+async def claim_job(db, worker_id: str, types: List[str]) -> Optional[dict]:
+    """Atomically take the next due job of one of the given types, leasing it to this worker
+
+    A claimed job then takes one of its type's numbered slots. The unique
+    (type, slot) index lets only one running job hold each, so a type's
+    concurrency holds across workers; a job that finds every slot taken by
+    a worker claiming at the same moment goes back in the queue.
+    """
+    free = await _free_slots(db, types)
+    if not free:
+        return None
+    jobs = db[JOBS_COLLECTION]
+    now = datetime.utcnow()
+    # run_job renews the lease with the job type's own length straight away
+    job = await jobs.find_one_and_update(
+        {"status": "queued", "type": {"$in": list(free)}, "run_at": {"$lte": now}},
+        {
+            "$set": {"status": "running", "worker": worker_id, "started_at": now,
+                     "lease_until": now + timedelta(seconds=settings.JOBS_LEASE_SECONDS)},
+            "$inc": {"attempts": 1},
+        },
+        sort=[("priority", -1), ("run_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+    if job is None:
+        return None
+    held = {"_id": job["_id"], "worker": worker_id, "status": "running"}
+    for slot in free[job["type"]]:
+        try:
+            await jobs.update_one(held, {"$set": {"slot": slot}})
+        except DuplicateKeyError:
+            continue
+        job["slot"] = slot
+        return job
+    await jobs.update_one(
+        held, {"$set": {"status": "queued", "worker": None, "lease_until": None}, "$inc": {"attempts": -1}}
+    )
+    return None
+
+async def requeue_expired(db) -> int:
+    """Put back jobs whose worker stopped renewing their lease (it crashed or stalled)
+
+    The lost run counts as an attempt, so a job that keeps killing its
+    worker ends up failed rather than being retried forever.
+    """
+    result = await db[JOBS_COLLECTION].update_many(
+        {"status": "running", "lease_until": {"$lt": datetime.utcnow()}},
+        {"$set": {"status": "queued", "worker": None, "lease_until": None, "error": "Lease expired"},
+         "$unset": {"slot": ""}}
+    )
+    if result.modified_count:
+        logger.warning(f"Requeued {result.modified_count} job(s) with an expired lease")
+    return result.modified_count
+
+async def _finish(db, job: dict, fields: dict):
+    # Only while this worker still holds the job; after losing the lease it belongs to someone else
+    await db[JOBS_COLLECTION].update_one(
+        {"_id": job["_id"], "worker": job["worker"], "status": "running"},
+        {"$set": {"worker": None, "lease_until": None, **fields}, "$unset": {"slot": ""}}
+    )
+
+async def _fail(db, job: dict, error: str):
+    now = datetime.utcnow()
+    if job["attempts"] < job["max_attempts"]:
+        delay = retry_delay(job["attempts"])
+        logger.warning(f"Job {job['_id']} ({job['type']}) failed, retrying in {delay}: {error}")
+        await _finish(db, job, {"status": "queued", "run_at": now + delay, "error": error})
+    else:
+        logger.error(f"Job {job['_id']} ({job['type']}) failed after {job['attempts']} attempt(s): {error}")
+        await _finish(db, job, {"status": "failed", "error": error, "finished_at": now})
+
+async def _renew_lease(db, job: dict, job_type: JobType) -> Optional[str]:
+    """Extend this worker's lease; "lost" when it no longer holds the job, "cancel" when asked to stop"""
+    renewed = await db[JOBS_COLLECTION].find_one_and_update(
+        {"_id": job["_id"], "worker": job["worker"], "status": "running"},
+        {"$set": {"lease_until": datetime.utcnow() + job_type.lease}},
+        projection={"cancel_requested": 1}
+    )
+    if renewed is None:
+        return "lost"
+    return "cancel" if renewed.get("cancel_requested") else None
+
+async def run_job(db, job: dict):
+    """Run a claimed job, renewing its lease until the handler returns, and record the outcome"""
+    job_type = job_types.get(job["type"])
+    if job_type is None:
+        await _finish(db, job, {"status": "failed", "error": f"Unknown job type {job['type']}", "finished_at": datetime.utcnow()})
+        return
+    if job["attempts"] > job["max_attempts"]:
+        # Its last attempt died with the worker running it
+        await _finish(db, job, {"status": "failed", "finished_at": datetime.utcnow()})
+        return
+
+    work = asyncio.create_task(job_type.handler(db, job))
+    interrupted = None
+    try:
+        await _renew_lease(db, job, job_type)
+        while not work.done():
+            await asyncio.wait({work}, timeout=job_type.lease.total_seconds() / 3)
+            if not work.done():
+                interrupted = await _renew_lease(db, job, job_type)
+                if interrupted:
+                    work.cancel()
+                    await asyncio.wait({work})
+    except asyncio.CancelledError:
+        # Shutting down: hand the job back without counting this attempt
+        work.cancel()
+        await db[JOBS_COLLECTION].update_one(
+            {"_id": job["_id"], "worker": job["worker"], "status": "running"},
+            {"$set": {"status": "queued", "worker": None, "lease_until": None}, "$unset": {"slot": ""},
+             "$inc": {"attempts": -1}}
+        )
+        raise
+
+    if interrupted == "lost":
+        logger.warning(f"Job {job['_id']} ({job['type']}) lost its lease and was abandoned")
+    elif interrupted == "cancel":
+        await _finish(db, job, {"status": "cancelled", "finished_at": datetime.utcnow()})
+    elif work.exception() is not None:
+        await _fail(db, job, f"{type(work.exception()).__name__}: {work.exception()}")
+    else:
+        await _finish(db, job, {"status": "succeeded", "result": work.result(), "error": None, "finished_at": datetime.utcnow()})
+
+async def cancel_job(db, job_id: ObjectId) -> Optional[dict]:
+    """Cancel a queued job now, or ask the worker running it to stop; returns the job"""
+    jobs = db[JOBS_COLLECTION]
+    job = await jobs.find_one_and_update(
+        {"_id": job_id, "status": "queued"},
+        {"$set": {"status": "cancelled", "finished_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
+    if job is None:
+        job = await jobs.find_one_and_update(
+            {"_id": job_id, "status": "running"},
+            {"$set": {"cancel_requested": True}},
+            return_document=ReturnDocument.AFTER
+        )
+    return job or await jobs.find_one({"_id": job_id})
+
+async def retry_job(db, job_id: ObjectId) -> Optional[dict]:
+    """Queue a failed or cancelled job again with a fresh set of attempts"""
+    job = await db[JOBS_COLLECTION].find_one_and_update(
+        {"_id": job_id, "status": {"$in": ["failed", "cancelled"]}},
+        {"$set": {"status": "queued", "attempts": 0, "run_at": datetime.utcnow(), "cancel_requested": False,
+                  "error": None, "finished_at": None}},
+        return_document=ReturnDocument.AFTER
+    )
+    if job is not None:
+        wake_job_workers()
+    return job
+
+def _on_job_done(job: dict, task: asyncio.Task):
+    jobs_state.running.pop(job["_id"], None)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Job {job['_id']} ({job['type']}) could not be recorded: {task.exception()}")
+    wake_job_workers()
+
+async def dispatch_jobs(db) -> int:
+    """Claim due jobs while this worker has room for them; returns how many were started"""
+    started = 0
+    while len(jobs_state.running) < settings.JOBS_MAX_CONCURRENT:
+        job = await claim_job(db, jobs_state.worker_id, list(job_types))
+        if job is None:
+            break
+        task = asyncio.create_task(run_job(db, job))
+        jobs_state.running[job["_id"]] = task
+        task.add_done_callback(lambda task, job=job: _on_job_done(job, task))
+        started += 1
+    return started
+
+async def _jobs_loop(db):
+    while True:
+        try:
+            await requeue_expired(db)
+            await dispatch_jobs(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Job dispatch failed: {e}", exc_info=True)
+        try:
+            await asyncio.wait_for(jobs_state.wake.wait(), timeout=settings.JOBS_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        jobs_state.wake.clear()
+
+def start_job_workers(db):
+    """Run queued jobs in this worker, up to JOBS_MAX_CONCURRENT at once
+
+    Every worker claims from the same collection; the claim is a single
+    findAndModify, so each job goes to exactly one of them. Jobs queued by
+    this worker, and its finished jobs, wake the loop early; others are
+    picked up within JOBS_POLL_SECONDS.
+    """
+    jobs_state.worker_id = str(ObjectId())
+    jobs_state.wake = asyncio.Event()
+    jobs_state.task = asyncio.create_task(_jobs_loop(db))
+
+async def stop_job_workers():
+    """Stop claiming, and hand the jobs still running back to the queue"""
+    tasks = [jobs_state.task, *jobs_state.running.values()]
+    for task in tasks:
+        if task and not task.done():
+            task.cancel()
+    await asyncio.gather(*(task for task in tasks if task), return_exceptions=True)
+
+def wake_job_workers():
+    if jobs_state.wake is not None:
+        jobs_state.wake.set()
+
+# Job types
+
+@job_handler("account.delete", concurrency=2)
+async def delete_account_data(db, job: dict) -> dict:
+    """Remove everything a deleted user owned"""
+    user_id = job["payload"]["user_id"]
+    deleted = {}
+    collections = ("expenses", ARCHIVE_COLLECTION, RECURRING_COLLECTION, "categories", "merchant_categories", IDEMPOTENCY_COLLECTION)
+    for collection in collections:
+        result = await db[collection].delete_many({"user_id": user_id})
+        deleted[collection] = result.deleted_count
+    await invalidate_user_cache(db, user_id)
+    await db.users.delete_one({"_id": ObjectId(user_id)})
+    return {"deleted": deleted}
+
+@job_handler("merchant_index.rebuild")
+async def rebuild_merchant_index_job(db, job: dict) -> dict:
+    return {"mappings": await rebuild_merchant_index(db, job["payload"].get("user_id"))}
+
+@job_handler("category_totals.rebuild")
+async def rebuild_category_totals_job(db, job: dict) -> dict:
+    return {"categories": await rebuild_category_totals(db, job["payload"].get("user_id"))}
+
+@job_handler("fingerprints.backfill")
+async def backfill_fingerprints_job(db, job: dict) -> dict:
+    return {"expenses": await backfill_fingerprints(db)}
@@ -0,0 +1,211 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, Set
+from bson import ObjectId
+from pymongo import CursorType
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware
+from config import settings
+from currency import conversion_factors, expense_currency
+
+logger = logging.getLogger(__name__)
+
+# Capped collection every worker appends its events to and tails for the others'
+LIVE_EVENTS_COLLECTION = "live_events"
+
+# Events written per insert_many by the flusher
+FLUSH_BATCH_SIZE = 100
+
+# Seconds before a dead tailable cursor (e.g. on an empty collection) is reopened
+TAIL_RETRY_SECONDS = 1.0
+
+# Expenses listed in a bulk event; its totals cover all of them
+BULK_EVENT_EXPENSES = 20
+
+class LiveEvents:
+    """This worker's subscribers per user, and the tasks that share events with other workers"""
+
+    def __init__(self):
+        self.subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self.worker_id: str = None
+        self.outbox: asyncio.Queue = None
+        self.tasks: list = []
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=settings.LIVE_EVENTS_QUEUE_SIZE)
+        self.subscribers[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        queues = self.subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[user_id]
+
+    def deliver(self, user_id: str, event: dict):
+        """Hand an event to this worker's connections for the user"""
+        for queue in self.subscribers.get(user_id, ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # The client fell behind; its deltas can't be trusted, so it refetches
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
+
+    def publish(self, user_id: str, event: dict):
+        """Deliver an event here at once and queue it for the other workers
+
+        Never blocks or touches the database: the flusher writes queued
+        events in batches, so a write request pays nothing for it.
+        """
+        self.deliver(user_id, event)
+        if self.outbox is None:
+            return
+        try:
+            self.outbox.put_nowait({
+                "user_id": user_id, "event": event, "worker": self.worker_id, "created_at": datetime.utcnow()
+            })
+        except asyncio.QueueFull:
+            logger.warning("Live event outbox full, other workers miss an event")
+
+live_events = LiveEvents()
+
+def publish(user_id: str, event_type: str, **data):
+    live_events.publish(user_id, {"type": event_type, **data})
+
+def expense_summary(expense: dict) -> dict:
+    """The fields of an expense the dashboard shows, JSON-ready"""
+    return {
+        "id": str(expense["_id"]),
+        "merchant": expense["merchant"],
+        "amount": expense["amount"],
+        "currency": expense_currency(expense),
+        "category": expense["category"],
+        "date": expense["date"].isoformat(),
+        "source": expense["source"],
+    }
+
+def totals_delta(currency: str, added: Iterable[dict] = (), removed: Iterable[dict] = ()) -> dict:
+    """Change to the dashboard totals, in the user's currency, from expenses added and removed"""
+    try:
+        factors = conversion_factors(currency)
+    except ValueError as e:
+        logger.warning(f"Live totals left unconverted: {e}")
+        factors = {}
+    delta = {"currency": currency, "count": 0, "amount": 0.0, "categories": {}, "days": {}}
+    for expenses, sign in ((added, 1), (removed, -1)):
+        for expense in expenses:
+            amount = sign * expense["amount"] * factors.get(expense_currency(expense), 1.0)
+            category = delta["categories"].setdefault(expense["category"], {"count": 0, "amount": 0.0})
+            category["count"] += sign
+            category["amount"] += amount
+            day = expense["date"].date().isoformat()
+            delta["days"][day] = delta["days"].get(day, 0.0) + amount
+            delta["count"] += sign
+            delta["amount"] += amount
+    delta["amount"] = round(delta["amount"], 2)
+    delta["categories"] = {
+        name: {"count": change["count"], "amount": round(change["amount"], 2)}
+        for name, change in delta["categories"].items() if change["count"] or round(change["amount"], 2)
+    }
+    delta["days"] = {day: round(amount, 2) for day, amount in delta["days"].items() if round(amount, 2)}
+    return delta
+
+def format_event(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+async def event_stream(
+    user_id: str, queue: asyncio.Queue, is_disconnected: Callable[[], Awaitable[bool]]
+) -> AsyncIterator[str]:
+    """Server-sent events from a subscription, with keep-alive comments while it's quiet"""
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=settings.LIVE_EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await is_disconnected():
+                    break
+                yield ": keep-alive\n\n"
+                continue
+            yield format_event(event)
+    finally:
+        live_events.unsubscribe(user_id, queue)
+
+async def _ensure_collection(db):
+    if LIVE_EVENTS_COLLECTION not in await db.list_collection_names(filter={"name": LIVE_EVENTS_COLLECTION}):
+        await db.create_collection(
+            LIVE_EVENTS_COLLECTION, capped=True, size=settings.LIVE_EVENTS_LOG_SIZE_MB * 1024 * 1024
+        )
+
+async def _flush_loop(db):
+    while True:
+        batch = [await live_events.outbox.get()]
+        while len(batch) < FLUSH_BATCH_SIZE and not live_events.outbox.empty():
+            batch.append(live_events.outbox.get_nowait())
+        try:
+            await db[LIVE_EVENTS_COLLECTION].insert_many(batch, ordered=False)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Could not share {len(batch)} live event(s) with other workers: {e}")
+
+async def _tail_loop(db):
+    """Deliver events written by other workers, in the order they were written
+
+    A tailable cursor on a capped collection works on a standalone mongod,
+    unlike change streams. It dies when the collection is empty or when
+    the writers lap it; it is then reopened after the last event seen.
+    """
+    try:
+        await _ensure_collection(db)
+    except Exception as e:
+        logger.warning(f"Could not create live events collection: {e}")
+    since = datetime.utcnow()
+    seen_at_since: Set[ObjectId] = set()
+    while True:
+        try:
+            cursor = db[LIVE_EVENTS_COLLECTION].find(
+                {"created_at": {"$gte": since}, "worker": {"$ne": live_events.worker_id}},
+                cursor_type=CursorType.TAILABLE_AWAIT
+            )
+            while cursor.alive:
+                async for record in cursor:
+                    if record["_id"] in seen_at_since:
+                        continue
+                    if record["created_at"] > since:
+                        since, seen_at_since = record["created_at"], set()
+                    seen_at_since.add(record["_id"])
+                    live_events.deliver(record["user_id"], record["event"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Live events tail failed: {e}")
+        await asyncio.sleep(TAIL_RETRY_SECONDS)
+
+def start_live_events(db):
+    """Share live events with the other workers through the capped collection"""
+    live_events.worker_id = str(ObjectId())
+    live_events.outbox = asyncio.Queue(maxsize=settings.LIVE_EVENTS_OUTBOX_SIZE)
+    live_events.tasks = [asyncio.create_task(_flush_loop(db)), asyncio.create_task(_tail_loop(db))]
+
+def stop_live_events():
+    for task in live_events.tasks:
+        if not task.done():
+            task.cancel()
+    live_events.tasks = []
+    live_events.outbox = None
+
+class EventStreamGZipMiddleware(GZipMiddleware):
+    """GZip that leaves event streams alone, since it would hold events back until its buffer fills"""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and "text/event-stream" in Headers(scope=scope).get("accept", ""):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
@@ -0,0 +1,316 @@
+"""
+End-to-end load test for the Money Management System API
+Seeds load-test users and expenses directly into MongoDB, then replays a
+realistic request mix against a running server. Run from the backend directory:
+
+    python loadtest.py --users 50 --expenses 2000 --concurrency 32 --duration 60 --json run.json
+    python loadtest.py --skip-seed --duration 30 --compare run.json
+
+Point MONGODB_URL/DATABASE_NAME at a local mongod, never at production: the
+seeded users are marked with "loadtest": true and replaced on every seed run.
+Requires httpx (pip install -r requirements-dev.txt).
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+import httpx
+from database import create_mongo_client, is_local_mongodb
+from config import settings
+from auth import get_password_hash
+
+PASSWORD = "loadtest-password"
+ADMIN_EMAIL = "loadtest-admin@loadtest.local"
+
+CATEGORIES = [
+    "Food & Dining", "Transportation", "Shopping", "Entertainment",
+    "Bills & Utilities", "Healthcare", "Education", "Travel",
+]
+MERCHANTS = [
+    ("Starbucks", "Food & Dining"), ("Swiggy", "Food & Dining"), ("Uber", "Transportation"),
+    ("Shell", "Transportation"), ("Amazon", "Shopping"), ("Flipkart", "Shopping"),
+    ("Netflix", "Entertainment"), ("Spotify", "Entertainment"), ("Airtel", "Bills & Utilities"),
+    ("Apollo Pharmacy", "Healthcare"), ("Coursera", "Education"), ("Indigo", "Travel"),
+]
+SOURCES = ["manual", "sms", "receipt", "voice"]
+SMS_TEMPLATES = [
+    "Spent Rs.{amount} at {merchant} on {date}",
+    "Rs {amount} debited from your account for {merchant} on {date}",
+    "Transaction of ${amount} at {merchant}",
+]
+
+# Relative frequency of each scenario in the replayed mix
+DEFAULT_MIX = {
+    "login": 2,
+    "dashboard_stats": 15,
+    "list_expenses": 25,
+    "list_filtered": 20,
+    "create_expense": 10,
+    "update_expense": 8,
+    "parse_sms": 15,
+    "admin_users": 5,
+}
+
+def user_email(index: int) -> str:
+    return f"loadtest-user-{index}@loadtest.local"
+
+async def seed(db, num_users: int, expenses_per_user: int, rng: random.Random):
+    """Replace earlier load-test data with fresh users, categories and expenses"""
+    old_ids = [str(user["_id"]) for user in await db.users.find({"loadtest": True}, {"_id": 1}).to_list(length=None)]
+    if old_ids:
+        for collection in ("expenses", "categories", "merchant_categories", "parse_cache"):
+            await db[collection].delete_many({"user_id": {"$in": old_ids}})
+        await db.users.delete_many({"loadtest": True})
+
+    password_hash = get_password_hash(PASSWORD)
+    now = datetime.utcnow()
+    users = [
+        {
+            "name": f"Load Test {index}", "email": user_email(index), "phone": None, "role": "user",
+            "password": password_hash, "status": "active", "created_at": now - timedelta(days=rng.randint(0, 720)),
+            "last_active": now, "avatar": None, "loadtest": True,
+        }
+        for index in range(num_users)
+    ]
+    users.append({
+        "name": "Load Test Admin", "email": ADMIN_EMAIL, "phone": None, "role": "admin",
+        "password": password_hash, "status": "active", "created_at": now, "last_active": now,
+        "avatar": None, "loadtest": True,
+    })
+    result = await db.users.insert_many(users)
+    user_ids = [str(user_id) for user_id in result.inserted_ids]
+
+    await db.categories.insert_many([
+        {"name": name, "color": "#0ea5e9", "icon": "📌", "user_id": user_id, "created_at": now, "count": 0}
+        for user_id in user_ids for name in CATEGORIES
+    ])
+
+    batch = []
+    for user_id in user_ids[:-1]:
+        for _ in range(expenses_per_user):
+            merchant, category = rng.choice(MERCHANTS)
+            batch.append({
+                "user_id": user_id, "merchant": merchant, "category": category,
+                "amount": round(rng.lognormvariate(5, 1), 2), "source": rng.choice(SOURCES),
+                "date": now - timedelta(days=rng.randint(0, 365), minutes=rng.randint(0, 1440)),
+                "description": None, "created_at": now, "updated_at": None,
+            })
+            if len(batch) >= 10000:
+                await db.expenses.insert_many(batch, ordered=False)
+                batch = []
+    if batch:
+        await db.expenses.insert_many(batch, ordered=False)
+
+class VirtualUser:
+    """One simulated client with its own token and recently created expenses"""
+
+    def __init__(self, client: httpx.AsyncClient, email: str, rng: random.Random):
+        self.client = client
+        self.email = email
+        self.rng = rng
+        self.token = None
+        self.expense_ids = []
+
+    @property
+    def headers(self):
+        return {"Authorization": f"Bearer {self.token}"}
+
+    async def login(self):
+        response = await self.client.post("/api/auth/login", json={"email": self.email, "password": PASSWORD})
+        if response.status_code == 200:
+            self.token = response.json()["access_token"]
+        return response
+
+    async def dashboard_stats(self):
+        return await self.client.get("/api/expenses/stats", headers=self.headers)
+
+    async def list_expenses(self):
+        return await self.client.get("/api/expenses", params={"limit": 50}, headers=self.headers)
+
+    async def list_filtered(self):
+        params = {"limit": 50, "skip": self.rng.choice([0, 0, 50, 100])}
+        choice = self.rng.random()
+        if choice < 0.4:
+            params["category"] = self.rng.choice(CATEGORIES)
+        elif choice < 0.7:
+            params["source"] = self.rng.choice(SOURCES)
+            params["start_date"] = (datetime.utcnow() - timedelta(days=90)).isoformat()
+        else:
+            params["search"] = self.rng.choice(MERCHANTS)[0][:4]
+        return await self.client.get("/api/expenses", params=params, headers=self.headers)
+
+    async def create_expense(self):
+        merchant, category = self.rng.choice(MERCHANTS)
+        response = await self.client.post("/api/expenses", headers=self.headers, json={
+            "merchant": merchant, "category": category, "amount": round(self.rng.uniform(1, 500), 2),
+            "date": datetime.utcnow().isoformat(), "source": "manual",
+        })
+        if response.status_code == 201:
+            self.expense_ids.append(response.json()["_id"])
+        return response
+
+    async def update_expense(self):
+        if not self.expense_ids:
+            return await self.create_expense()
+        expense_id = self.rng.choice(self.expense_ids)
+        return await self.client.put(f"/api/expenses/{expense_id}", headers=self.headers, json={
+            "amount": round(self.rng.uniform(1, 500), 2), "category": self.rng.choice(CATEGORIES),
+        })
+
+    async def parse_sms(self):
+        merchant, _ = self.rng.choice(MERCHANTS)
+        text = self.rng.choice(SMS_TEMPLATES).format(
+            amount=self.rng.choice([99, 250, 499.5, 1200]), merchant=merchant,
+            date=(datetime.utcnow() - timedelta(days=self.rng.randint(0, 5))).strftime("%d/%m/%Y"),
+        )
+        return await self.client.post("/api/parse/sms", headers=self.headers, json={"text": text})
+
+class AdminUser(VirtualUser):
+    async def admin_users(self):
+        return await self.client.get("/api/admin/users", params={"limit": 50}, headers=self.headers)
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+def summarize(samples: dict, elapsed: float) -> dict:
+    """Throughput and latency percentiles (ms) per scenario"""
+    report = {}
+    for scenario, entries in sorted(samples.items()):
+        latencies = sorted(latency for latency, _ in entries)
+        errors = sum(1 for _, status in entries if status >= 400)
+        report[scenario] = {
+            "requests": len(entries),
+            "errors": errors,
+            "rps": round(len(entries) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 0.50), 2),
+            "p95_ms": round(percentile(latencies, 0.95), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2),
+            "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+        }
+    return report
+
+async def run_load(base_url: str, num_users: int, concurrency: int, duration: float, mix: dict, rng: random.Random):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    samples = {scenario: [] for scenario in mix}
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        admin = AdminUser(client, ADMIN_EMAIL, random.Random(rng.random()))
+        users = [VirtualUser(client, user_email(i % num_users), random.Random(rng.random())) for i in range(concurrency)]
+        for user in [admin] + users:
+            response = await user.login()
+            if response.status_code != 200:
+                raise RuntimeError(f"Login failed for {user.email}: {response.status_code} {response.text}")
+
+        scenarios = list(mix)
+        weights = [mix[scenario] for scenario in scenarios]
+        deadline = time.monotonic() + duration
+
+        async def drive(user: VirtualUser):
+            while time.monotonic() < deadline:
+                scenario = user.rng.choices(scenarios, weights)[0]
+                actor = admin if scenario == "admin_users" else user
+                started = time.perf_counter()
+                try:
+                    response = await getattr(actor, scenario)()
+                    status_code = response.status_code
+                except httpx.HTTPError:
+                    status_code = 599
+                samples[scenario].append(((time.perf_counter() - started) * 1000, status_code))
+
+        started = time.monotonic()
+        await asyncio.gather(*[drive(user) for user in users])
+        elapsed = time.monotonic() - started
+    return samples, elapsed
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+def print_report(report: dict, previous: dict = None):
+    print(f"{'Scenario':<18}{'Requests':>10}{'Errors':>8}{'RPS':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for scenario, stats in report.items():
+        line = (f"{scenario:<18}{stats['requests']:>10}{stats['errors']:>8}{stats['rps']:>9.1f}"
+                f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}")
+        if previous and scenario in previous and previous[scenario]["p95_ms"]:
+            change = (stats["p95_ms"] / previous[scenario]["p95_ms"] - 1) * 100
+            line += f"   p95 {change:+.0f}%"
+        print(line)
+
+async def main():
+    """Main function"""
+    arg_parser = argparse.ArgumentParser(description="Load test the API against a local mongod")
+    arg_parser.add_argument("--base-url", default=f"http://localhost:{settings.PORT}")
+    arg_parser.add_argument("--users", type=int, default=20, help="load-test users to seed")
+    arg_parser.add_argument("--expenses", type=int, default=1000, help="expenses per seeded user")
+    arg_parser.add_argument("--concurrency", type=int, default=16, help="concurrent virtual users")
+    arg_parser.add_argument("--duration", type=float, default=30, help="seconds to replay the mix")
+    arg_parser.add_argument("--mix", help='JSON scenario weights, e.g. \'{"list_expenses": 5, "parse_sms": 1}\'')
+    arg_parser.add_argument("--seed", type=int, default=42, help="random seed")
+    arg_parser.add_argument("--skip-seed", action="store_true", help="reuse the data from an earlier run")
+    arg_parser.add_argument("--allow-remote", action="store_true", help="seed even if MONGODB_URL is not local")
+    arg_parser.add_argument("--json", dest="json_path", help="write results to this file")
+    arg_parser.add_argument("--compare", help="earlier results file to compare p95 latencies with")
+    args = arg_parser.parse_args()
+
+    mix = json.loads(args.mix) if args.mix else DEFAULT_MIX
+    unknown = set(mix) - set(DEFAULT_MIX)
+    if unknown:
+        print(f"Error: unknown scenario(s): {', '.join(sorted(unknown))}")
+        sys.exit(2)
+    rng = random.Random(args.seed)
+
+    print("=" * 50)
+    print("Money Management System - Load Test")
+    print("=" * 50)
+
+    if not args.skip_seed:
+        if not is_local_mongodb(settings.MONGODB_URL) and not args.allow_remote:
+            print("\nError: MONGODB_URL is not a local server; use --allow-remote if you really mean it")
+            sys.exit(2)
+        print(f"\nSeeding {args.users} users x {args.expenses} expenses into {settings.DATABASE_NAME}...")
+        client = create_mongo_client()
+        started = time.monotonic()
+        await seed(client[settings.DATABASE_NAME], args.users, args.expenses, rng)
+        client.close()
+        print(f"✓ Seeded in {time.monotonic() - started:.1f}s")
+
+    print(f"\nReplaying mix against {args.base_url} with {args.concurrency} virtual users for {args.duration:.0f}s...")
+    samples, elapsed = await run_load(args.base_url, args.users, args.concurrency, args.duration, mix, rng)
+    report = summarize(samples, elapsed)
+    total = sum(stats["requests"] for stats in report.values())
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)["endpoints"]
+
+    print("\n" + "=" * 50)
+    print(f"Total: {total} requests, {total / elapsed:.1f} req/s")
+    print("=" * 50)
+    print_report(report, previous)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "commit": git_commit(),
+                "at": datetime.utcnow().isoformat(),
+                "params": {
+                    "users": args.users, "expenses": args.expenses, "concurrency": args.concurrency,
+                    "duration": args.duration, "mix": mix, "seed": args.seed,
+                },
+                "totalRequests": total,
+                "rps": round(total / elapsed, 2),
+                "endpoints": report,
+            }, f, indent=2)
+        print(f"\n✓ Results written to {args.json_path}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,17 +1,31 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
 import logging
+import sys
 from config import settings
-from database import connect_to_mongo, close_mongo_connection
+from database import connect_to_mongo, close_mongo_connection, warm_up, db_instance
+from health import start_health_monitor, stop_health_monitor, readiness_report
+from metrics import MetricsMiddleware, render_metrics
+from profiling import ProfilingMiddleware
+from db_stats import DBStatsMiddleware
+from backup import start_backup_scheduler, stop_backup_scheduler
+from recurring import start_recurring_scheduler, stop_recurring_scheduler
+from live_events import EventStreamGZipMiddleware, start_live_events, stop_live_events
+from jobs import start_job_workers, stop_job_workers
+from uploads import configure_multipart_spooling
 from routers import (
     auth_router,
     expense_router,
     category_router,
     parser_router,
     admin_router,
-    user_router
+    user_router,
+    budget_router,
+    recurring_router,
+    live_router,
+    job_router
 )
 
 # Configure logging
@@ -21,16 +35,34 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Process-wide: uploads are buffered in memory one chunk at a time before going to disk
+configure_multipart_spooling()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan events"""
     # Startup
     logger.info("Starting Money Management System API...")
     await connect_to_mongo()
+    await warm_up()
+    start_health_monitor()
+    if settings.BACKUP_ENABLED:
+        start_backup_scheduler(db_instance.db, db_instance.analytics_db)
+    if settings.RECURRING_ENABLED:
+        start_recurring_scheduler(db_instance.db)
+    if settings.LIVE_EVENTS_ENABLED:
+        start_live_events(db_instance.db)
+    if settings.JOBS_ENABLED:
+        start_job_workers(db_instance.db)
     logger.info("Application started successfully")
     yield
     # Shutdown
     logger.info("Shutting down application...")
+    stop_health_monitor()
+    stop_backup_scheduler()
+    stop_recurring_scheduler()
+    stop_live_events()
+    await stop_job_workers()
     await close_mongo_connection()
     logger.info("Application shut down successfully")
 
@@ -63,6 +95,21 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# Compress large responses (expense lists and exports), but not live event streams
+app.add_middleware(EventStreamGZipMiddleware, minimum_size=settings.RESPONSE_GZIP_MIN_BYTES)
+
+# Per-route latency, status and in-flight metrics
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# Opt-in profiling of single requests by admins
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
+# MongoDB round trips per request in response headers (outermost, so it counts everything)
+if settings.DB_STATS_HEADERS:
+    app.add_middleware(DBStatsMiddleware)
+
 # Exception handlers
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -84,13 +131,30 @@ async def root():
         "docs": "/docs"
     }
 
+@app.get("/health/live")
+async def liveness_check():
+    """Liveness probe - the process is up and its event loop is responsive"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness probe - 503 while this worker shouldn't take traffic"""
+    report = await readiness_report()
+    return JSONResponse(status_code=200 if report["status"] == "ready" else 503, content=report)
+
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
-    return {
-        "status": "healthy",
-        "database": "connected"
-    }
+    """Health check endpoint (same as the readiness probe)"""
+    return await readiness_check()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Prometheus metrics for this worker process"""
+    if not settings.METRICS_ENABLED:
+        return JSONResponse(status_code=404, content={"detail": "Not Found"})
+    if settings.METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {settings.METRICS_TOKEN}":
+        return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 # Include routers
 app.include_router(auth_router.router, prefix="/api")
@@ -99,12 +163,21 @@ app.include_router(category_router.router, prefix="/api")
 app.include_router(parser_router.router, prefix="/api")
 app.include_router(admin_router.router, prefix="/api")
 app.include_router(user_router.router, prefix="/api")
+app.include_router(budget_router.router, prefix="/api")
+app.include_router(recurring_router.router, prefix="/api")
+app.include_router(live_router.router, prefix="/api")
+app.include_router(job_router.router, prefix="/api")
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(
-        "main:app",
-        host=settings.HOST,
-        port=settings.PORT,
-        reload=settings.DEBUG
-    )
+    if settings.DEBUG:
+        import uvicorn
+        uvicorn.run(
+            "main:app",
+            host=settings.HOST,
+            port=settings.PORT,
+            reload=True
+        )
+    else:
+        # Production: one worker process per CPU, supervised by server.py
+        import server
+        sys.exit(server.run())
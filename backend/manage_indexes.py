@@ -0,0 +1,88 @@
+"""
+Script to compare, build and prune MongoDB indexes against the spec in indexes.py
+Run this script from the backend directory:
+
+    python manage_indexes.py diff                      # what's missing, changed or extra
+    python manage_indexes.py build                     # build missing indexes
+    python manage_indexes.py usage                     # $indexStats access counts per index
+    python manage_indexes.py drop-unused [--max-ops N] [--yes]
+"""
+
+import argparse
+import asyncio
+from database import create_mongo_client
+from config import settings
+from indexes import (
+    index_spec, diff_indexes, build_missing_indexes, index_usage, drop_unused_indexes
+)
+
+async def show_diff(db):
+    diff = await diff_indexes(db)
+    clean = True
+    for collection, result in diff.items():
+        for model in result["missing"]:
+            print(f"  + {collection}.{model.document['name']} (missing)")
+        for change in result["changed"]:
+            print(f"  ~ {collection}.{change['name']} (live {change['live']}, wanted {change['wanted']})")
+        for name in result["extra"]:
+            print(f"  - {collection}.{name} (not in spec)")
+        clean = clean and not (result["missing"] or result["changed"] or result["extra"])
+    if clean:
+        print("✓ Database indexes match the spec")
+
+async def show_usage(db):
+    for collection in index_spec():
+        print(f"\n{collection}")
+        for entry in await index_usage(db, collection):
+            print(f"  {entry['name']:<45}{entry['ops']:>12} ops since {entry['since']:%Y-%m-%d %H:%M}")
+
+async def main():
+    """Main function"""
+    arg_parser = argparse.ArgumentParser(description="Manage MongoDB indexes")
+    subcommands = arg_parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("diff", help="compare live indexes with the spec")
+    subcommands.add_parser("build", help="build indexes missing from the database")
+    subcommands.add_parser("usage", help="report $indexStats usage per index")
+    drop_parser = subcommands.add_parser("drop-unused", help="drop indexes that are not in the spec")
+    drop_parser.add_argument("--max-ops", type=int, default=0, help="only drop indexes used at most this often")
+    drop_parser.add_argument("--yes", action="store_true", help="actually drop, instead of listing")
+    args = arg_parser.parse_args()
+
+    print("=" * 50)
+    print("Money Management System - Manage Indexes")
+    print("=" * 50)
+
+    try:
+        # Connect to MongoDB
+        print("\nConnecting to MongoDB...")
+        client = create_mongo_client()
+        db = client[settings.DATABASE_NAME]
+
+        # Test connection
+        await client.admin.command('ping')
+        print(f"Connected to MongoDB: {settings.DATABASE_NAME}\n")
+
+        if args.command == "diff":
+            await show_diff(db)
+        elif args.command == "build":
+            built = await build_missing_indexes(db)
+            print(f"✓ Built {len(built)} index(es){': ' + ', '.join(built) if built else ''}")
+        elif args.command == "usage":
+            print("Access counts reset when a server restarts; check every replica set member")
+            await show_usage(db)
+        elif args.command == "drop-unused":
+            dropped = await drop_unused_indexes(db, max_ops=args.max_ops, dry_run=not args.yes)
+            if not dropped:
+                print("No unused indexes outside the spec")
+            for name in dropped:
+                print(f"  {'dropped' if args.yes else 'would drop'} {name}")
+            if dropped and not args.yes:
+                print("\nRe-run with --yes to drop them")
+
+        client.close()
+
+    except Exception as e:
+        print(f"\nError: {str(e)}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
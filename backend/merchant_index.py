@@ -0,0 +1,204 @@
+import logging
+import re
+from collections import Counter
+from functools import lru_cache
+from datetime import datetime
+from typing import Optional, Tuple
+from bson import ObjectId
+from pymongo import UpdateOne
+from archive import ARCHIVE_COLLECTION
+
+logger = logging.getLogger(__name__)
+
+# Share of the total parse confidence a category match is worth
+CATEGORY_CONFIDENCE_WEIGHT = 0.2
+
+# Upserts sent per bulk_write during a rebuild
+REBUILD_BATCH_SIZE = 1000
+
+# Trailing noise that banks and card networks append to merchant names
+MERCHANT_SUFFIXES = re.compile(
+    r"\b(?:pvt|private|ltd|limited|llc|inc|corp|co|store|stores|online|india|intl)\b"
+)
+
+@lru_cache(maxsize=4096)
+def normalize_merchant(merchant: Optional[str]) -> Optional[str]:
+    """Reduce a merchant name to a stable lookup key
+
+    "STARBUCKS #1234", "Starbucks Store" and "starbucks" all map to "starbucks".
+    """
+    if not merchant:
+        return None
+    key = merchant.lower()
+    key = re.sub(r"[^a-z0-9\s]", " ", key)
+    key = re.sub(r"\b\d+\b", " ", key)
+    key = MERCHANT_SUFFIXES.sub(" ", key)
+    key = re.sub(r"\s+", " ", key).strip()
+    return key or None
+
+async def record_merchant_category(db, user_id: str, merchant: str, category: str, delta: int = 1):
+    """Adjust the learned count for a merchant/category pair"""
+    merchant_key = normalize_merchant(merchant)
+    if not merchant_key or not category:
+        return
+    query = {"user_id": user_id, "merchant_key": merchant_key, "category": category}
+    try:
+        await db.merchant_categories.update_one(
+            query,
+            {"$inc": {"count": delta}, "$set": {"updated_at": datetime.utcnow()}},
+            upsert=delta > 0
+        )
+        if delta < 0:
+            # Pairs that no expense uses anymore must not linger in the index
+            await db.merchant_categories.delete_one({**query, "count": {"$lte": 0}})
+    except Exception as e:
+        logger.warning(f"Merchant index update failed: {e}")
+
+async def record_merchant_categories(db, user_id: str, expenses: list):
+    """Count several new expenses' merchant/category pairs in one bulk write"""
+    counts = Counter()
+    for expense in expenses:
+        merchant_key = normalize_merchant(expense.get("merchant"))
+        if merchant_key and expense.get("category"):
+            counts[(merchant_key, expense["category"])] += 1
+    if not counts:
+        return
+    now = datetime.utcnow()
+    try:
+        await db.merchant_categories.bulk_write([
+            UpdateOne(
+                {"user_id": user_id, "merchant_key": merchant_key, "category": category},
+                {"$inc": {"count": count}, "$set": {"updated_at": now}},
+                upsert=True
+            )
+            for (merchant_key, category), count in counts.items()
+        ], ordered=False)
+    except Exception as e:
+        logger.warning(f"Merchant index update failed: {e}")
+
+async def update_merchant_category(db, user_id: str, old_expense: dict, new_values: dict):
+    """Move a learned count when an expense's merchant or category changes"""
+    old_merchant = old_expense.get("merchant")
+    old_category = old_expense.get("category")
+    new_merchant = new_values.get("merchant", old_merchant)
+    new_category = new_values.get("category", old_category)
+
+    if (normalize_merchant(old_merchant), old_category) == (normalize_merchant(new_merchant), new_category):
+        return
+
+    await record_merchant_category(db, user_id, old_merchant, old_category, delta=-1)
+    await record_merchant_category(db, user_id, new_merchant, new_category, delta=1)
+
+async def rename_category(db, user_id: str, old_name: str, new_name: str):
+    """Keep learned mappings pointing at a renamed category
+
+    Counts are merged into any existing (merchant, new_name) pairs rather
+    than overwriting the category in place, which would collide with the
+    unique (user_id, merchant_key, category) index.
+    """
+    entries = await db.merchant_categories.find(
+        {"user_id": user_id, "category": old_name},
+        {"merchant_key": 1, "count": 1}
+    ).to_list(length=None)
+    if not entries:
+        return
+
+    now = datetime.utcnow()
+    operations = [
+        UpdateOne(
+            {"user_id": user_id, "merchant_key": entry["merchant_key"], "category": new_name},
+            {"$inc": {"count": entry["count"]}, "$set": {"updated_at": now}},
+            upsert=True
+        )
+        for entry in entries if entry.get("count", 0) > 0
+    ]
+    if operations:
+        await db.merchant_categories.bulk_write(operations, ordered=False)
+    await db.merchant_categories.delete_many({"user_id": user_id, "category": old_name})
+
+async def forget_category(db, user_id: str, category: str):
+    """Drop every learned mapping to a deleted category"""
+    await db.merchant_categories.delete_many({"user_id": user_id, "category": category})
+
+async def lookup_merchant_category(db, user_id: str, merchant: str) -> Tuple[Optional[str], float]:
+    """Get the category a user most often assigns to a merchant
+
+    Returns the category name and the confidence it contributes, which is
+    CATEGORY_CONFIDENCE_WEIGHT scaled by the share of this merchant's expenses
+    filed under that category.
+    """
+    merchant_key = normalize_merchant(merchant)
+    if not merchant_key:
+        return None, 0.0
+
+    entries = await db.merchant_categories.find(
+        {"user_id": user_id, "merchant_key": merchant_key, "count": {"$gt": 0}},
+        {"category": 1, "count": 1}
+    ).sort("count", -1).to_list(length=None)
+
+    if not entries:
+        return None, 0.0
+
+    total = sum(entry["count"] for entry in entries)
+    top = entries[0]
+    confidence = CATEGORY_CONFIDENCE_WEIGHT * top["count"] / total
+    return top["category"], round(confidence, 4)
+
+async def rebuild_merchant_index(db, user_id: Optional[str] = None) -> int:
+    """Rebuild learned merchant mappings from the expenses collection and the archive
+
+    Rebuilds a single user's mappings when user_id is given, otherwise every
+    user's. Returns the number of merchant/category pairs written.
+
+    Rows are overwritten in place and tagged with this rebuild's id; only
+    once every pair is written are rows from earlier builds removed, so
+    lookups never see an empty index mid-rebuild, and new rows created by
+    live expense writes after the rebuild started are kept. Counts are set
+    from the expenses read at the start, though, so an expense written in
+    between can be counted twice or lost: run it while the user (or,
+    without user_id, the whole app) is quiet.
+    """
+    scope = {"user_id": user_id} if user_id else {}
+    build_id = ObjectId()
+    started = datetime.utcnow()
+
+    counts = Counter()
+    cursor = db.expenses.find(scope, {"user_id": 1, "merchant": 1, "category": 1})
+    async for expense in cursor:
+        merchant_key = normalize_merchant(expense.get("merchant"))
+        if merchant_key and expense.get("category"):
+            counts[(expense["user_id"], merchant_key, expense["category"])] += 1
+
+    cursor = db[ARCHIVE_COLLECTION].find(scope, {"user_id": 1, "expenses.merchant": 1, "expenses.category": 1})
+    async for bucket in cursor:
+        for expense in bucket.get("expenses", []):
+            merchant_key = normalize_merchant(expense.get("merchant"))
+            if merchant_key and expense.get("category"):
+                counts[(bucket["user_id"], merchant_key, expense["category"])] += 1
+
+    now = datetime.utcnow()
+    operations = []
+    written = 0
+    for (owner_id, merchant_key, category), count in counts.items():
+        operations.append(UpdateOne(
+            {"user_id": owner_id, "merchant_key": merchant_key, "category": category},
+            {"$set": {"count": count, "updated_at": now, "build_id": build_id}},
+            upsert=True
+        ))
+        if len(operations) >= REBUILD_BATCH_SIZE:
+            await db.merchant_categories.bulk_write(operations, ordered=False)
+            written += len(operations)
+            operations = []
+
+    if operations:
+        await db.merchant_categories.bulk_write(operations, ordered=False)
+        written += len(operations)
+
+    stale = await db.merchant_categories.delete_many({
+        **scope,
+        "build_id": {"$ne": build_id},
+        "updated_at": {"$lt": started}
+    })
+
+    logger.info(f"Rebuilt merchant index: {written} merchant/category pairs, {stale.deleted_count} stale removed")
+    return written
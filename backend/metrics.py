@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+from pymongo import monitoring
+from pool_metrics import pool_metrics
+
+# Upper bounds (seconds) of the latency histogram buckets
+HTTP_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+DB_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5]
+
+# Label used for requests no route matched, so unknown paths can't blow up cardinality
+UNMATCHED_ROUTE = "unmatched"
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metric:
+    def __init__(self, name: str, help_text: str, kind: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.label_names = label_names
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(Metric):
+    def __init__(self, name, help_text, label_names=()):
+        super().__init__(name, help_text, "counter", label_names)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return self.header() + [
+            f"{self.name}{_format_labels(self.label_names, labels)} {value}"
+            for labels, value in sorted(values.items())
+        ]
+
+class Gauge(Counter):
+    def __init__(self, name, help_text, label_names=()):
+        super().__init__(name, help_text, label_names)
+        self.kind = "gauge"
+
+    def dec(self, labels: tuple = (), amount: float = 1):
+        self.inc(labels, -amount)
+
+class Histogram(Metric):
+    def __init__(self, name, help_text, label_names=(), buckets=HTTP_BUCKETS):
+        super().__init__(name, help_text, "histogram", label_names)
+        self.buckets = list(buckets)
+        # labels -> [per-bucket counts..., +Inf count], sum
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, labels: tuple, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = {labels: (list(counts), total) for labels, (counts, total) in self._values.items()}
+        lines = self.header()
+        for labels, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ["+Inf"], counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route")
+)
+http_requests_total = Counter(
+    "http_requests_total", "HTTP requests by route and status code", ("method", "route", "status")
+)
+http_requests_in_flight = Gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled", ("method",)
+)
+db_command_duration = Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency by collection and command",
+    ("collection", "command"), buckets=DB_BUCKETS
+)
+db_command_failures = Counter(
+    "mongodb_command_failures_total", "Failed MongoDB commands by collection and command",
+    ("collection", "command")
+)
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and concurrency per route template"""
+
+    def __init__(self, app, exclude_paths=("/metrics",)):
+        self.app = app
+        self.exclude_paths = set(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc((method,))
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_requests_in_flight.dec((method,))
+            # FastAPI puts the matched route in the scope; its path is the template
+            route = scope.get("route")
+            route_path = getattr(route, "path", UNMATCHED_ROUTE)
+            http_request_duration.observe((method, route_path), elapsed)
+            http_requests_total.inc((method, route_path, str(status_code)))
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Time every MongoDB command by collection and command name
+
+    The collection is only part of the started event, so it is remembered
+    per request id until the command finishes.
+    """
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        self._collections[(event.connection_id, event.request_id)] = target if isinstance(target, str) else ""
+
+    def _finish(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        return (collection, event.command_name)
+
+    def succeeded(self, event):
+        db_command_duration.observe(self._finish(event), event.duration_micros / 1_000_000)
+
+    def failed(self, event):
+        labels = self._finish(event)
+        db_command_duration.observe(labels, event.duration_micros / 1_000_000)
+        db_command_failures.inc(labels)
+
+command_metrics = CommandMetricsListener()
+
+def _pool_lines() -> List[str]:
+    snapshot = pool_metrics.snapshot()
+    lines = []
+    for name, key, kind, help_text in [
+        ("mongodb_pool_connections_open", "connectionsOpen", "gauge", "Open MongoDB connections"),
+        ("mongodb_pool_connections_in_use", "connectionsInUse", "gauge", "MongoDB connections checked out"),
+        ("mongodb_pool_checkouts_total", "checkouts", "counter", "Connection checkouts"),
+        ("mongodb_pool_checkout_timeouts_total", "checkoutTimeouts", "counter", "Connection checkouts that timed out"),
+    ]:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {snapshot[key]}"]
+    return lines
+
+def render_metrics() -> str:
+    """All metrics of this process in the Prometheus text exposition format"""
+    lines = [
+        "# HELP process_worker_info Worker process serving this scrape",
+        "# TYPE process_worker_info gauge",
+        f'process_worker_info{{pid="{os.getpid()}"}} 1',
+    ]
+    for metric in (http_request_duration, http_requests_total, http_requests_in_flight,
+                   db_command_duration, db_command_failures):
+        lines += metric.render()
+    lines += _pool_lines()
+    return "\n".join(lines) + "\n"
@@ -1,8 +1,11 @@
 from pydantic import BaseModel, Field, EmailStr, validator
-from typing import Optional, List
+from typing import Any, Optional, List
 from datetime import datetime
 from enum import Enum
 
+# ISO 4217 code; which ones are supported depends on the exchange rate table
+CURRENCY_PATTERN = "^[A-Z]{3}$"
+
 # Enums
 class UserRole(str, Enum):
     USER = "user"
@@ -18,6 +21,20 @@ class ExpenseSource(str, Enum):
     SMS = "sms"
     RECEIPT = "receipt"
     VOICE = "voice"
+    RECURRING = "recurring"
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+class RecurringUnit(str, Enum):
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+    YEAR = "year"
 
 # User Models
 class UserBase(BaseModel):
@@ -36,6 +53,7 @@ class UserLogin(BaseModel):
 class UserUpdate(BaseModel):
     name: Optional[str] = Field(None, min_length=2, max_length=100)
     phone: Optional[str] = None
+    currency: Optional[str] = Field(None, pattern=CURRENCY_PATTERN)
     
 class UserChangePassword(BaseModel):
     current_password: str
@@ -47,6 +65,7 @@ class UserResponse(UserBase):
     created_at: datetime
     last_active: Optional[datetime] = None
     avatar: Optional[str] = None
+    currency: Optional[str] = None  # totals are reported in this, BASE_CURRENCY when unset
     
     class Config:
         populate_by_name = True
@@ -62,6 +81,7 @@ class CategoryBase(BaseModel):
     name: str = Field(..., min_length=1, max_length=50)
     color: str = Field(default="#0ea5e9", pattern="^#[0-9A-Fa-f]{6}$")
     icon: str = Field(default="📦", max_length=10)
+    budget: Optional[float] = Field(None, gt=0)  # monthly
 
 class CategoryCreate(CategoryBase):
     pass
@@ -70,6 +90,7 @@ class CategoryUpdate(BaseModel):
     name: Optional[str] = Field(None, min_length=1, max_length=50)
     color: Optional[str] = Field(None, pattern="^#[0-9A-Fa-f]{6}$")
     icon: Optional[str] = Field(None, max_length=10)
+    budget: Optional[float] = Field(None, gt=0)
 
 class CategoryResponse(CategoryBase):
     id: str = Field(alias="_id")
@@ -81,6 +102,24 @@ class CategoryResponse(CategoryBase):
         populate_by_name = True
         json_encoders = {datetime: lambda v: v.isoformat()}
 
+# Budget Models
+class BudgetStatus(BaseModel):
+    category: str
+    color: str
+    icon: str
+    month: str  # YYYY-MM
+    budget: float
+    spent: float
+    remaining: float
+    percent: float
+    status: str  # ok, warning or over
+
+class BudgetSummary(BaseModel):
+    month: str
+    totalBudget: float
+    totalSpent: float
+    categories: List[BudgetStatus]
+
 # Expense Models
 class ExpenseBase(BaseModel):
     merchant: str = Field(..., min_length=1, max_length=200)
@@ -89,6 +128,7 @@ class ExpenseBase(BaseModel):
     date: datetime
     description: Optional[str] = Field(None, max_length=500)
     source: ExpenseSource = ExpenseSource.MANUAL
+    currency: Optional[str] = Field(None, pattern=CURRENCY_PATTERN)  # the user's currency when not given
 
 class ExpenseCreate(ExpenseBase):
     pass
@@ -99,17 +139,101 @@ class ExpenseUpdate(BaseModel):
     category: Optional[str] = None
     date: Optional[datetime] = None
     description: Optional[str] = Field(None, max_length=500)
+    currency: Optional[str] = Field(None, pattern=CURRENCY_PATTERN)
 
 class ExpenseResponse(ExpenseBase):
     id: str = Field(alias="_id")
     user_id: str
     created_at: datetime
     updated_at: Optional[datetime] = None
+    possible_duplicate_of: Optional[str] = None
     
     class Config:
         populate_by_name = True
         json_encoders = {datetime: lambda v: v.isoformat()}
 
+class ExpenseCreateResponse(ExpenseResponse):
+    budget_alert: Optional[BudgetStatus] = None  # the category is near or over its budget
+
+class DuplicateExpense(BaseModel):
+    index: int
+    duplicate_of: Optional[ExpenseResponse] = None
+    duplicate_of_index: Optional[int] = None
+
+class ExpenseBulkResult(BaseModel):
+    inserted: List[ExpenseResponse]
+    duplicates: List[DuplicateExpense] = []
+
+# Recurring Expense Models
+class RecurringExpenseBase(BaseModel):
+    merchant: str = Field(..., min_length=1, max_length=200)
+    amount: float = Field(..., gt=0)
+    category: str
+    description: Optional[str] = Field(None, max_length=500)
+    currency: Optional[str] = Field(None, pattern=CURRENCY_PATTERN)  # the user's currency when not given
+    start_date: datetime
+    end_date: Optional[datetime] = None
+    # Either every + unit ("every 2 weeks") or a five-field cron expression
+    every: int = Field(1, ge=1, le=366)
+    unit: RecurringUnit = RecurringUnit.MONTH
+    cron: Optional[str] = Field(None, max_length=100)
+
+class RecurringExpenseCreate(RecurringExpenseBase):
+    pass
+
+class RecurringExpenseUpdate(BaseModel):
+    merchant: Optional[str] = Field(None, min_length=1, max_length=200)
+    amount: Optional[float] = Field(None, gt=0)
+    category: Optional[str] = None
+    description: Optional[str] = Field(None, max_length=500)
+    end_date: Optional[datetime] = None
+    every: Optional[int] = Field(None, ge=1, le=366)
+    unit: Optional[RecurringUnit] = None
+    currency: Optional[str] = Field(None, pattern=CURRENCY_PATTERN)
+    cron: Optional[str] = Field(None, max_length=100)
+    active: Optional[bool] = None
+
+class RecurringExpenseResponse(RecurringExpenseBase):
+    id: str = Field(alias="_id")
+    user_id: str
+    active: bool
+    next_run: Optional[datetime] = None
+    last_run: Optional[datetime] = None
+    occurrences: int = 0
+    created_at: datetime
+
+    class Config:
+        populate_by_name = True
+        json_encoders = {datetime: lambda v: v.isoformat()}
+
+# Job Models
+class JobCreate(BaseModel):
+    type: str
+    payload: dict = {}
+    priority: int = Field(0, ge=-10, le=10)  # higher runs first
+    run_at: Optional[datetime] = None
+
+class JobResponse(BaseModel):
+    id: str = Field(alias="_id")
+    type: str
+    status: JobStatus
+    priority: int
+    attempts: int
+    max_attempts: int
+    user_id: Optional[str] = None
+    payload: dict = {}
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    cancel_requested: bool = False
+    run_at: datetime
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        populate_by_name = True
+        json_encoders = {datetime: lambda v: v.isoformat()}
+
 # Parser Models
 class SMSParseRequest(BaseModel):
     text: str
@@ -120,7 +244,9 @@ class ParsedExpenseData(BaseModel):
     category: Optional[str] = None
     date: Optional[datetime] = None
     description: Optional[str] = None
+    currency: Optional[str] = None
     confidence: float = 0.0
+    category_confidence: float = 0.0
 
 # Stats Models
 class CategoryStat(BaseModel):
@@ -145,12 +271,14 @@ class RecentTransaction(BaseModel):
     category: str
     date: datetime
     source: str
+    currency: Optional[str] = None
     
     class Config:
         json_encoders = {datetime: lambda v: v.isoformat()}
 
 class DashboardStats(BaseModel):
     totalExpenses: float
+    currency: str  # of every amount except the recent transactions
     monthlyChange: float
     transactionCount: int
     categoryBreakdown: List[CategoryStat]
@@ -168,6 +296,7 @@ class AdminUserStats(BaseModel):
     role: UserRole
     expenses: int
     totalAmount: float
+    currency: str  # the user's
     joinDate: datetime
     lastActive: Optional[datetime]
     avatar: Optional[str]
@@ -177,6 +306,7 @@ class AdminDashboardStats(BaseModel):
     activeUsers: int
     totalExpenses: int
     totalAmount: float
+    currency: str  # BASE_CURRENCY
     userGrowth: float
     expenseGrowth: float
     
@@ -0,0 +1,117 @@
+import hashlib
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+from config import settings
+from models import ParsedExpenseData
+
+logger = logging.getLogger(__name__)
+
+class ParseResultLRU:
+    """Small in-process LRU in front of the parse_cache collection"""
+
+    def __init__(self, max_size: int, ttl_seconds: int):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def discard_user(self, user_id: str):
+        for key in [k for k in self._entries if k[0] == user_id]:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+memory_cache = ParseResultLRU(settings.PARSE_CACHE_MEMORY_SIZE, settings.PARSE_CACHE_MEMORY_TTL_SECONDS)
+
+def normalize_sms_text(text: str) -> str:
+    """Normalize SMS text so cosmetic differences map to the same cache key"""
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+def sms_content_hash(text: str) -> str:
+    """Content hash for an SMS message"""
+    return hashlib.sha256(normalize_sms_text(text).encode("utf-8")).hexdigest()
+
+def _cache_id(user_id: str, kind: str, content_hash: str) -> str:
+    return f"{user_id}:{kind}:{content_hash}"
+
+def _to_parsed(entry: dict) -> ParsedExpenseData:
+    parsed = ParsedExpenseData(**entry["result"])
+    # Dates that were defaulted to "now" must not be frozen at the original parse time
+    if entry.get("date_defaulted"):
+        parsed.date = datetime.utcnow()
+    return parsed
+
+async def get_cached_parse(db, user_id: str, kind: str, content_hash: str) -> Optional[ParsedExpenseData]:
+    """Look up a previous parse result for the same content"""
+    key = (user_id, kind, content_hash)
+    entry = memory_cache.get(key)
+    if entry is None:
+        try:
+            entry = await db.parse_cache.find_one(
+                {"_id": _cache_id(user_id, kind, content_hash)},
+                {"result": 1, "date_defaulted": 1}
+            )
+        except Exception as e:
+            logger.warning(f"Parse cache lookup failed: {e}")
+            return None
+        if entry is None:
+            return None
+        memory_cache.set(key, entry)
+    return _to_parsed(entry)
+
+async def store_parse(
+    db,
+    user_id: str,
+    kind: str,
+    content_hash: str,
+    parsed: ParsedExpenseData,
+    date_defaulted: bool = False
+):
+    """Remember a parse result for the same user and content"""
+    entry = {
+        "result": parsed.dict(exclude={"date"} if date_defaulted else None),
+        "date_defaulted": date_defaulted,
+    }
+    memory_cache.set((user_id, kind, content_hash), entry)
+    try:
+        await db.parse_cache.update_one(
+            {"_id": _cache_id(user_id, kind, content_hash)},
+            {"$set": {**entry, "user_id": user_id, "kind": kind, "created_at": datetime.utcnow()}},
+            upsert=True
+        )
+    except Exception as e:
+        logger.warning(f"Parse cache store failed: {e}")
+
+async def invalidate_user_cache(db, user_id: str):
+    """Drop cached parse results for a user, e.g. after their categories change"""
+    memory_cache.discard_user(user_id)
+    try:
+        await db.parse_cache.delete_many({"user_id": user_id})
+    except Exception as e:
+        logger.warning(f"Parse cache invalidation failed: {e}")
@@ -0,0 +1,113 @@
+import threading
+import time
+from pymongo import monitoring
+
+# Upper bounds (ms) of the checkout-wait histogram buckets
+WAIT_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000]
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Track connection pool size and how long requests wait for a connection
+
+    Checkouts run synchronously on the driver thread that requested them, so
+    the start time is kept in a thread-local and paired up on completion.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.connections_open = 0
+            self.connections_in_use = 0
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.checkout_timeouts = 0
+            self.wait_total_ms = 0.0
+            self.wait_max_ms = 0.0
+            self.wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+            self.pool_clears = 0
+
+    def _wait_ms(self):
+        started = getattr(self._local, "checkout_started", None)
+        self._local.checkout_started = None
+        if started is None:
+            return None
+        return (time.perf_counter() - started) * 1000
+
+    def connection_check_out_started(self, event):
+        self._local.checkout_started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        wait_ms = self._wait_ms()
+        with self._lock:
+            self.checkouts += 1
+            self.connections_in_use += 1
+            if wait_ms is not None:
+                self.wait_total_ms += wait_ms
+                self.wait_max_ms = max(self.wait_max_ms, wait_ms)
+                for i, bound in enumerate(WAIT_BUCKETS_MS):
+                    if wait_ms <= bound:
+                        self.wait_buckets[i] += 1
+                        break
+                else:
+                    self.wait_buckets[-1] += 1
+
+    def connection_check_out_failed(self, event):
+        self._wait_ms()
+        with self._lock:
+            self.checkout_failures += 1
+            if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+                self.checkout_timeouts += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.connections_in_use = max(0, self.connections_in_use - 1)
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_open = max(0, self.connections_open - 1)
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def snapshot(self) -> dict:
+        """Point-in-time copy of the pool counters"""
+        with self._lock:
+            buckets = {}
+            cumulative = 0
+            for bound, count in zip(WAIT_BUCKETS_MS + ["+Inf"], self.wait_buckets):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            return {
+                "connectionsOpen": self.connections_open,
+                "connectionsInUse": self.connections_in_use,
+                "checkouts": self.checkouts,
+                "checkoutFailures": self.checkout_failures,
+                "checkoutTimeouts": self.checkout_timeouts,
+                "waitAvgMs": round(self.wait_total_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                "waitMaxMs": round(self.wait_max_ms, 3),
+                "waitTotalMs": round(self.wait_total_ms, 3),
+                "waitBucketsMs": buckets,
+                "poolClears": self.pool_clears,
+            }
+
+pool_metrics = PoolMetricsListener()
@@ -0,0 +1,228 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional
+from urllib.parse import parse_qs
+from auth import is_admin_token
+from config import settings
+from db_stats import track_db_stats
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_QUERY_PARAM = "profile"
+PROFILE_ID_PATTERN = re.compile(r"^[\w.-]+$")
+
+class StackProfiler:
+    """Deterministic profiler that records time per full call stack
+
+    Output is in the collapsed ("folded") format read by flamegraph.pl and
+    speedscope: one "outer;inner;leaf <microseconds>" line per stack, where
+    the count is the time spent in the leaf itself.
+    """
+
+    def __init__(self):
+        self._stack = []  # [label, started, time in children]
+        self.folded = Counter()
+        self.cpu_seconds = 0.0
+        self.steps = 0
+        self._step_started = None
+
+    def _callback(self, frame, event, arg):
+        now = time.perf_counter()
+        if event == "call":
+            code = frame.f_code
+            self._stack.append([f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})", now, 0.0])
+        elif event == "c_call" and self._stack:
+            # At the bottom of the stack this is our own coroutine.send(), skip it
+            self._stack.append([f"{getattr(arg, '__qualname__', repr(arg))} (builtin)", now, 0.0])
+        elif self._stack:  # return, c_return, c_exception
+            label, started, children = self._stack.pop()
+            elapsed = now - started
+            path = ";".join([entry[0] for entry in self._stack] + [label])
+            self.folded[path] += elapsed - children
+            if self._stack:
+                self._stack[-1][2] += elapsed
+
+    def start_step(self):
+        self.steps += 1
+        self._step_started = time.perf_counter()
+        sys.setprofile(self._callback)
+
+    def stop_step(self):
+        sys.setprofile(None)
+        self.cpu_seconds += time.perf_counter() - self._step_started
+        self._step_started = None
+        # A step ends with the coroutine suspended; the frames on the stack
+        # get "call" events again when it resumes
+        self._stack.clear()
+
+    def cpu_ms(self) -> float:
+        """Time spent running so far, including the current step"""
+        running = time.perf_counter() - self._step_started if self._step_started is not None else 0.0
+        return (self.cpu_seconds + running) * 1000
+
+    def folded_lines(self) -> List[str]:
+        return [f"{path} {round(seconds * 1_000_000)}" for path, seconds in self.folded.most_common() if seconds > 0]
+
+class ProfiledCoroutine:
+    """Run a coroutine with the profiler active only while it is on the CPU
+
+    Time the coroutine spends suspended (awaiting MongoDB, the network, or
+    other requests running on the loop) is excluded from the stacks.
+    """
+
+    def __init__(self, coro, profiler: StackProfiler):
+        self.coro = coro
+        self.profiler = profiler
+
+    def __await__(self):
+        iterator = self.coro.__await__()
+        value, error = None, None
+        while True:
+            self.profiler.start_step()
+            try:
+                if error is not None:
+                    yielded = iterator.throw(error)
+                else:
+                    yielded = iterator.send(value)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self.profiler.stop_step()
+            try:
+                value, error = (yield yielded), None
+            except BaseException as e:
+                value, error = None, e
+
+def _wants_profile(scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            return value not in (b"", b"0", b"false")
+    query = scope.get("query_string", b"")
+    if PROFILE_QUERY_PARAM.encode() not in query:
+        return False
+    return parse_qs(query.decode("latin-1")).get(PROFILE_QUERY_PARAM, ["0"])[0] not in ("", "0", "false")
+
+def _bearer_token(scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            return token if scheme.lower() == "bearer" and token else None
+    return None
+
+def _profile_id(scope) -> str:
+    route = re.sub(r"[^\w]+", "_", scope["path"]).strip("_") or "root"
+    return f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{os.getpid()}-{scope['method']}-{route}"[:150]
+
+def _write_profile(profile_id: str, summary: dict, folded: List[str]):
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    base = os.path.join(settings.PROFILE_DIR, profile_id)
+    with open(base + ".folded", "w", encoding="utf-8") as f:
+        f.write("\n".join(folded) + "\n")
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+class ProfilingMiddleware:
+    """Profile single requests from admins who ask for it with X-Profile: 1 or ?profile=1
+
+    Other requests pass straight through. The response carries a
+    Server-Timing header and an X-Profile-Id naming the stored profile.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        if not await is_admin_token(_bearer_token(scope)):
+            await self.app(scope, receive, send)
+            return
+
+        with track_db_stats() as db_stats:
+            await self._profile(scope, receive, send, db_stats)
+
+    async def _profile(self, scope, receive, send, db_stats):
+        profile_id = _profile_id(scope)
+        profiler = StackProfiler()
+        started = time.perf_counter()
+        status_code = 500
+
+        def timings():
+            wall_ms = (time.perf_counter() - started) * 1000
+            cpu_ms = profiler.cpu_ms()
+            return {
+                "wallMs": round(wall_ms, 3),
+                "cpuMs": round(cpu_ms, 3),
+                "awaitMs": round(wall_ms - cpu_ms, 3),
+                "mongoMs": round(db_stats.duration_ms, 3),
+                "mongoCommands": db_stats.commands,
+            }
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                summary = timings()
+                server_timing = ", ".join(
+                    f"{name};dur={summary[key]}" for name, key in
+                    [("cpu", "cpuMs"), ("await", "awaitMs"), ("mongo", "mongoMs"), ("total", "wallMs")]
+                )
+                headers = list(message.get("headers", []))
+                headers += [(b"server-timing", server_timing.encode()), (b"x-profile-id", profile_id.encode())]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await ProfiledCoroutine(self.app(scope, receive, send_wrapper), profiler)
+        finally:
+            summary = {
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": getattr(scope.get("route"), "path", None),
+                "status": status_code,
+                "at": datetime.utcnow().isoformat(),
+                **timings(),
+                "steps": profiler.steps,
+                "mongo": db_stats.to_dict(),
+            }
+            try:
+                await asyncio.to_thread(_write_profile, profile_id, summary, profiler.folded_lines())
+            except OSError as e:
+                logger.warning(f"Could not store profile {profile_id}: {e}")
+            logger.info(f"Profiled {scope['method']} {scope['path']}: {summary['wallMs']}ms wall, "
+                        f"{summary['cpuMs']}ms cpu, {summary['mongoMs']}ms in {db_stats.commands} mongo command(s)")
+
+def list_profiles(limit: int = 50) -> List[dict]:
+    """Stored profile summaries, newest first"""
+    if not os.path.isdir(settings.PROFILE_DIR):
+        return []
+    names = sorted((name for name in os.listdir(settings.PROFILE_DIR) if name.endswith(".json")), reverse=True)
+    summaries = []
+    for name in names[:limit]:
+        try:
+            with open(os.path.join(settings.PROFILE_DIR, name), encoding="utf-8") as f:
+                summaries.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return summaries
+
+def read_folded_profile(profile_id: str) -> Optional[str]:
+    """Collapsed stacks of a stored profile, or None if there is no such profile"""
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    path = os.path.join(settings.PROFILE_DIR, profile_id + ".folded")
+    if not os.path.isfile(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return f.read()
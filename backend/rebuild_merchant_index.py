@@ -0,0 +1,40 @@
+"""
+Script to rebuild the learned merchant -> category index from existing expenses
+Run this script from the backend directory: python rebuild_merchant_index.py [user_id]
+"""
+
+import asyncio
+import sys
+from database import create_mongo_client
+from config import settings
+from merchant_index import rebuild_merchant_index
+
+async def main():
+    """Main function"""
+    user_id = sys.argv[1] if len(sys.argv) > 1 else None
+    
+    print("=" * 50)
+    print("Money Management System - Rebuild Merchant Index")
+    print("=" * 50)
+    
+    try:
+        # Connect to MongoDB
+        print("\nConnecting to MongoDB...")
+        client = create_mongo_client()
+        db = client[settings.DATABASE_NAME]
+        
+        # Test connection
+        await client.admin.command('ping')
+        print(f"Connected to MongoDB: {settings.DATABASE_NAME}")
+        
+        print(f"\nRebuilding index for {'user ' + user_id if user_id else 'all users'}...")
+        written = await rebuild_merchant_index(db, user_id)
+        print(f"✓ Wrote {written} merchant/category mappings")
+        
+        client.close()
+        
+    except Exception as e:
+        print(f"\nError: {str(e)}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
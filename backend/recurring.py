@@ -0,0 +1,289 @@
+import asyncio
+import calendar
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from budgets import category_updates
+from config import settings
+from currency import user_currency
+from duplicates import expense_fingerprint
+from merchant_index import record_merchant_categories
+from models import ExpenseSource
+from live_events import BULK_EVENT_EXPENSES, expense_summary, publish, totals_delta
+
+logger = logging.getLogger(__name__)
+
+RECURRING_COLLECTION = "recurring_expenses"
+
+INTERVAL_UNITS = ("day", "week", "month", "year")
+
+# minute, hour, day of month, month, day of week (0 or 7 = Sunday)
+CRON_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+# How far ahead a cron expression is searched before it counts as never running
+CRON_SEARCH_DAYS = 5 * 366
+
+DUPLICATE_KEY = 11000
+
+def _cron_field(field: str, low: int, high: int) -> set:
+    values = set()
+    for part in field.split(","):
+        span, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if span == "*":
+            start, stop = low, high
+        elif "-" in span:
+            start, stop = (int(value) for value in span.split("-"))
+        else:
+            start = int(span)
+            stop = high if step > 1 else start
+        if not low <= start <= stop <= high or step < 1:
+            raise ValueError(f"'{part}' is out of range {low}-{high}")
+        values.update(range(start, stop + 1, step))
+    return values
+
+def parse_cron(expression: str) -> tuple:
+    """Parse a five-field cron expression (minute hour day-of-month month day-of-week)
+
+    Supports *, lists, ranges and steps. As in cron, when both day fields
+    are restricted a day matching either one runs.
+    """
+    fields = expression.split()
+    if len(fields) != 5:
+        raise ValueError("A cron expression has five fields: minute hour day-of-month month day-of-week")
+    minutes, hours, days, months, weekdays = (
+        _cron_field(field, low, high) for field, (low, high) in zip(fields, CRON_RANGES)
+    )
+    if 7 in weekdays:
+        weekdays = (weekdays - {7}) | {0}
+    return minutes, hours, days, months, weekdays, fields[2] == "*", fields[4] == "*"
+
+def _cron_day_matches(cron: tuple, day: datetime) -> bool:
+    _, _, days, months, weekdays, any_day, any_weekday = cron
+    if day.month not in months:
+        return False
+    day_match = day.day in days
+    weekday_match = (day.weekday() + 1) % 7 in weekdays
+    if any_day or any_weekday:
+        return day_match and weekday_match
+    return day_match or weekday_match
+
+def _next_cron(cron: tuple, after: datetime) -> datetime:
+    minutes, hours = sorted(cron[0]), sorted(cron[1])
+    candidate = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    day = candidate.replace(hour=0, minute=0)
+    for _ in range(CRON_SEARCH_DAYS):
+        if _cron_day_matches(cron, day):
+            for hour in hours:
+                for minute in minutes:
+                    moment = day.replace(hour=hour, minute=minute)
+                    if moment >= candidate:
+                        return moment
+        day += timedelta(days=1)
+    raise ValueError("The cron expression never matches")
+
+def _add_months(day: datetime, months: int) -> datetime:
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+def next_occurrence(rule: dict, after: Optional[datetime] = None) -> Optional[datetime]:
+    """First occurrence of a rule strictly after `after` (or its first one); None once it has ended
+
+    Intervals are counted from start_date, so a rule starting on Jan 31
+    runs on Feb 28 and then Mar 31 instead of drifting.
+    """
+    start = rule["start_date"]
+    if after is None or after < start:
+        after = start - timedelta(microseconds=1)
+    if rule.get("cron"):
+        occurrence = _next_cron(parse_cron(rule["cron"]), after)
+    elif rule["unit"] in ("day", "week"):
+        step = timedelta(days=rule["every"] * (7 if rule["unit"] == "week" else 1))
+        occurrence = start + step * ((after - start) // step + 1)
+    else:
+        months = rule["every"] * (12 if rule["unit"] == "year" else 1)
+        count = max(0, ((after.year - start.year) * 12 + after.month - start.month) // months - 1)
+        occurrence = _add_months(start, count * months)
+        while occurrence <= after:
+            count += 1
+            occurrence = _add_months(start, count * months)
+    if rule.get("end_date") and occurrence > rule["end_date"]:
+        return None
+    return occurrence
+
+def due_occurrences(rule: dict, now: datetime) -> Tuple[List[datetime], Optional[datetime]]:
+    """Occurrences from next_run up to now (at most RECURRING_MAX_CATCH_UP), and the next_run after them"""
+    occurrences = []
+    occurrence = rule["next_run"]
+    while occurrence is not None and occurrence <= now and len(occurrences) < settings.RECURRING_MAX_CATCH_UP:
+        occurrences.append(occurrence)
+        occurrence = next_occurrence(rule, occurrence)
+    return occurrences, occurrence
+
+def occurrence_expense(rule: dict, date: datetime, now: datetime) -> dict:
+    return {
+        "user_id": rule["user_id"],
+        "merchant": rule["merchant"],
+        "amount": rule["amount"],
+        "category": rule["category"],
+        "date": date,
+        "description": rule.get("description"),
+        "currency": rule.get("currency"),
+        "source": ExpenseSource.RECURRING.value,
+        "recurring_id": str(rule["_id"]),
+        "fingerprint": expense_fingerprint(rule["amount"], date, rule["merchant"]),
+        "created_at": now,
+        "updated_at": None,
+    }
+
+async def _insert_occurrences(db, expenses: List[dict]) -> List[dict]:
+    """Insert occurrences, skipping any another worker already wrote; returns those inserted"""
+    if not expenses:
+        return []
+    try:
+        await db.expenses.insert_many(expenses, ordered=False)
+        return expenses
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error["code"] != DUPLICATE_KEY for error in errors):
+            raise
+        skipped = {error["index"] for error in errors}
+        return [expense for index, expense in enumerate(expenses) if index not in skipped]
+
+async def _user_currencies(db, user_ids: Iterable[str]) -> Dict[str, str]:
+    users = await db.users.find(
+        {"_id": {"$in": [ObjectId(user_id) for user_id in user_ids]}}, {"currency": 1}
+    ).to_list(length=None)
+    return {str(user["_id"]): user_currency(user) for user in users}
+
+def _publish_occurrences(by_user: Dict[str, List[dict]], currencies: Dict[str, str]):
+    for user_id, user_expenses in by_user.items():
+        if user_id not in currencies:
+            continue
+        newest = sorted(user_expenses, key=lambda expense: expense["date"], reverse=True)[:BULK_EVENT_EXPENSES]
+        publish(user_id, "expenses.created", expenses=[expense_summary(expense) for expense in newest],
+                totals=totals_delta(currencies[user_id], added=user_expenses))
+
+async def materialize_due(db, now: Optional[datetime] = None) -> int:
+    """Write the expenses of up to RECURRING_BATCH_SIZE due rules; returns the number of rules advanced
+
+    Safe to run from every worker at once. Each rule is claimed by moving
+    its next_run on from the value this worker read, and only the worker
+    whose update matched writes its occurrences. That holds even before the
+    unique (recurring_id, date) index exists, e.g. on the first start after
+    downtime while indexes are still building; the index is a second line
+    of defence. Rules are handed back if the insert fails.
+    """
+    now = now or datetime.utcnow()
+    rules_collection = db[RECURRING_COLLECTION]
+    rules = await rules_collection.find(
+        {"active": True, "next_run": {"$lte": now}}
+    ).sort("next_run", 1).limit(settings.RECURRING_BATCH_SIZE).to_list(length=settings.RECURRING_BATCH_SIZE)
+    if not rules:
+        return 0
+
+    plans = [(rule, *due_occurrences(rule, now)) for rule in rules]
+    claims = await asyncio.gather(*(
+        rules_collection.update_one(
+            {"_id": rule["_id"], "next_run": rule["next_run"]},
+            {
+                "$set": {"next_run": next_run, "active": next_run is not None, "last_run": now},
+                "$inc": {"occurrences": len(occurrences)},
+            }
+        )
+        for rule, occurrences, next_run in plans
+    ))
+    claimed = [plan for plan, claim in zip(plans, claims) if claim.modified_count == 1]
+    expenses = [occurrence_expense(rule, date, now) for rule, occurrences, _ in claimed for date in occurrences]
+
+    try:
+        inserted = await _insert_occurrences(db, expenses)
+    except Exception:
+        await asyncio.gather(*(
+            rules_collection.update_one(
+                {"_id": rule["_id"], "next_run": next_run, "last_run": now},
+                {
+                    "$set": {"next_run": rule["next_run"], "active": True, "last_run": rule.get("last_run")},
+                    "$inc": {"occurrences": -len(occurrences)},
+                }
+            )
+            for rule, occurrences, next_run in claimed
+        ))
+        raise
+    by_user = defaultdict(list)
+    for expense in inserted:
+        by_user[expense["user_id"]].append(expense)
+    currencies = await _user_currencies(db, by_user) if by_user else {}
+    operations = [
+        operation for user_id, user_expenses in by_user.items()
+        for operation in category_updates(user_id, currencies.get(user_id, settings.BASE_CURRENCY), added=user_expenses)
+    ]
+    if operations:
+        await db.categories.bulk_write(operations, ordered=False)
+    for user_id, user_expenses in by_user.items():
+        await record_merchant_categories(db, user_id, user_expenses)
+    _publish_occurrences(by_user, currencies)
+
+    if inserted:
+        logger.info(f"Recurring expenses: {len(inserted)} occurrence(s) from {len(rules)} rule(s)")
+    return len(rules)
+
+async def seconds_until_next_run(db) -> float:
+    """Seconds until the earliest active rule is due, capped at RECURRING_MAX_SLEEP_SECONDS"""
+    rule = await db[RECURRING_COLLECTION].find_one(
+        {"active": True}, {"next_run": 1}, sort=[("next_run", 1)]
+    )
+    if not rule:
+        return settings.RECURRING_MAX_SLEEP_SECONDS
+    wait = (rule["next_run"] - datetime.utcnow()).total_seconds()
+    return min(max(wait, 0.0), settings.RECURRING_MAX_SLEEP_SECONDS)
+
+class RecurringState:
+    """This worker's scheduler task, and the event that wakes it early"""
+
+    def __init__(self):
+        self.task: asyncio.Task = None
+        self.wake: asyncio.Event = None
+
+recurring_state = RecurringState()
+
+async def _recurring_loop(db):
+    while True:
+        wait = settings.RECURRING_MAX_SLEEP_SECONDS
+        try:
+            if await materialize_due(db) >= settings.RECURRING_BATCH_SIZE:
+                continue  # more rules are due
+            wait = await seconds_until_next_run(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Recurring expense run failed: {e}", exc_info=True)
+        try:
+            await asyncio.wait_for(recurring_state.wake.wait(), timeout=wait)
+        except asyncio.TimeoutError:
+            pass
+        recurring_state.wake.clear()
+
+def start_recurring_scheduler(db):
+    """Write recurring expenses as they fall due
+
+    The next_run index is the queue: each pass reads only its head and then
+    sleeps until that rule is due. Rule changes in this worker wake the loop
+    early; changes made through other workers are seen within
+    RECURRING_MAX_SLEEP_SECONDS.
+    """
+    recurring_state.wake = asyncio.Event()
+    recurring_state.task = asyncio.create_task(_recurring_loop(db))
+
+def stop_recurring_scheduler():
+    if recurring_state.task and not recurring_state.task.done():
+        recurring_state.task.cancel()
+
+def wake_recurring_scheduler():
+    """Re-read the queue now, after a rule was created or rescheduled"""
+    if recurring_state.wake is not None:
+        recurring_state.wake.set()
@@ -0,0 +1,77 @@
+import json
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
+from fastapi import HTTPException, Request, status
+from fastapi.responses import Response
+
+try:
+    import msgpack
+except ImportError:  # MessagePack is only offered when the package is installed
+    msgpack = None
+
+COLUMNAR_MEDIA_TYPE = "application/vnd.moneymanage.columnar+json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_MEDIA_TYPES = {MSGPACK_MEDIA_TYPE, "application/x-msgpack", "application/vnd.msgpack"}
+
+# Values accepted by ?format=
+FORMAT_PATTERN = "^(json|columnar|msgpack)$"
+
+FILE_EXTENSIONS = {"json": "json", "columnar": "json", "msgpack": "msgpack"}
+
+def negotiate_format(request: Request, requested: Optional[str] = None) -> str:
+    """Pick a list encoding from ?format= or the Accept header, defaulting to JSON rows
+
+    An explicit ?format= wins over Accept; in Accept the first supported
+    media type wins.
+    """
+    if requested:
+        if requested == "msgpack" and msgpack is None:
+            raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE, detail="MessagePack is not available")
+        return requested
+    for part in request.headers.get("accept", "").split(","):
+        media_type = part.split(";")[0].strip().lower()
+        if media_type == COLUMNAR_MEDIA_TYPE:
+            return "columnar"
+        if media_type in MSGPACK_MEDIA_TYPES and msgpack is not None:
+            return "msgpack"
+        if media_type in ("application/json", "*/*"):
+            return "json"
+    return "json"
+
+def to_columns(rows: List[dict], fields: Iterable[str]) -> dict:
+    """Turn a list of objects into {"count": n, "columns": {field: [values...]}}
+
+    Keys are written once per response instead of once per row.
+    """
+    return {"count": len(rows), "columns": {field: [row.get(field) for row in rows] for field in fields}}
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def _msgpack_default(value):
+    if isinstance(value, datetime):
+        # Stored datetimes are naive UTC; send them as the MessagePack timestamp extension
+        return msgpack.Timestamp.from_datetime(value.replace(tzinfo=timezone.utc))
+    return str(value)
+
+def encode(rows: List[dict], fields: List[str], response_format: str) -> tuple:
+    """Encode rows in the negotiated format, returning (body, media type)"""
+    if response_format == "msgpack":
+        return msgpack.packb(to_columns(rows, fields), default=_msgpack_default, datetime=True), MSGPACK_MEDIA_TYPE
+    if response_format == "columnar":
+        body = to_columns(rows, fields)
+        media_type = COLUMNAR_MEDIA_TYPE
+    else:
+        body = [{field: row.get(field) for field in fields} for row in rows]
+        media_type = "application/json"
+    return json.dumps(body, default=_json_default, separators=(",", ":")).encode(), media_type
+
+def rows_response(rows: List[dict], fields: List[str], response_format: str, filename: Optional[str] = None) -> Response:
+    """Response for a list in the negotiated format; compression is left to GZipMiddleware"""
+    body, media_type = encode(rows, fields, response_format)
+    headers = {"Vary": "Accept"}
+    if filename:
+        headers["Content-Disposition"] = f'attachment; filename="{filename}.{FILE_EXTENSIONS[response_format]}"'
+    return Response(content=body, media_type=media_type, headers=headers)
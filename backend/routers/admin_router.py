@@ -1,20 +1,61 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from typing import List
+from fastapi.responses import PlainTextResponse
+from typing import List, Optional
+from collections import defaultdict
 from datetime import datetime, timedelta
 from bson import ObjectId
 from models import (
     UserResponse, AdminUserStats, AdminDashboardStats, 
-    AdminUpdateUser, AdminCreateUser, UserStatus, UserRole
+    AdminUpdateUser, AdminCreateUser, UserStatus, UserRole, JobCreate, JobResponse, JobStatus
 )
 from auth import get_current_admin_user, serialize_user, get_password_hash
-from database import get_database
+from database import get_database, get_analytics_database
+from pool_metrics import pool_metrics
+from slow_queries import top_slow_queries
+from profiling import list_profiles, read_folded_profile
+from archive import archived_totals, find_expenses
+from jobs import JOBS_COLLECTION, MAINTENANCE_JOB_TYPES, enqueue_job, retry_job
+from routers.job_router import serialize_job
+from currency import convert_totals, sum_by_currency, user_currency
+from config import settings
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
+async def _expense_totals(db, users: List[dict]) -> dict:
+    """Expense count and total amount (in the user's currency) per user, archived expenses included
+    
+    The database sums amounts per user and currency; only those few sums
+    are converted.
+    """
+    user_ids = [str(user["_id"]) for user in users]
+    pipeline = [
+        {"$match": {"user_id": {"$in": user_ids}}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "currency": "$currency"},
+            "count": {"$sum": 1},
+            "total": {"$sum": "$amount"},
+        }},
+    ]
+    groups = await db.expenses.aggregate(pipeline).to_list(length=None)
+    groups += await archived_totals(db, user_ids)
+    
+    counts = defaultdict(int)
+    sums = defaultdict(lambda: defaultdict(float))
+    for group in groups:
+        user_id = group["_id"]["user_id"]
+        counts[user_id] += group["count"]
+        sums[user_id][group["_id"].get("currency")] += group["total"]
+    
+    currencies = {str(user["_id"]): user_currency(user) for user in users}
+    return {
+        user_id: {"count": counts[user_id], "total": convert_totals(sums[user_id], currencies[user_id])}
+        for user_id in counts
+    }
+
 @router.get("/dashboard", response_model=AdminDashboardStats)
 async def get_admin_dashboard(
     current_user: dict = Depends(get_current_admin_user),
-    db = Depends(get_database)
+    db = Depends(get_analytics_database)
 ):
     """Get admin dashboard statistics"""
     
@@ -32,7 +73,12 @@ async def get_admin_dashboard(
     # Get all expenses
     all_expenses = await db.expenses.find({}).to_list(length=None)
     total_expenses = len(all_expenses)
-    total_amount = sum(exp["amount"] for exp in all_expenses)
+    amount_by_currency = sum_by_currency(all_expenses)
+    for archived in await archived_totals(db):
+        total_expenses += archived["count"]
+        code = archived["_id"].get("currency") or settings.BASE_CURRENCY
+        amount_by_currency[code] += archived["total"]
+    total_amount = convert_totals(amount_by_currency, settings.BASE_CURRENCY)
     
     # Calculate growth (compare with previous period)
     sixty_days_ago = datetime.utcnow() - timedelta(days=60)
@@ -61,8 +107,8 @@ async def get_admin_dashboard(
         if exp["date"] >= thirty_days_ago
     ]
     
-    prev_amount = sum(exp["amount"] for exp in prev_expenses)
-    current_amount = sum(exp["amount"] for exp in current_expenses)
+    prev_amount = convert_totals(sum_by_currency(prev_expenses), settings.BASE_CURRENCY)
+    current_amount = convert_totals(sum_by_currency(current_expenses), settings.BASE_CURRENCY)
     
     expense_growth = 0.0
     if prev_amount > 0:
@@ -75,6 +121,7 @@ async def get_admin_dashboard(
         activeUsers=active_users,
         totalExpenses=total_expenses,
         totalAmount=round(total_amount, 2),
+        currency=settings.BASE_CURRENCY,
         userGrowth=round(user_growth, 2),
         expenseGrowth=round(expense_growth, 2)
     )
@@ -86,7 +133,7 @@ async def get_all_users(
     status_filter: str = Query("all", regex="^(all|active|inactive|suspended)$"),
     search: str = None,
     current_user: dict = Depends(get_current_admin_user),
-    db = Depends(get_database)
+    db = Depends(get_analytics_database)
 ):
     """Get all users with their statistics"""
     
@@ -107,17 +154,13 @@ async def get_all_users(
     cursor = db.users.find(query).sort("created_at", -1).skip(skip).limit(limit)
     users = await cursor.to_list(length=limit)
     
-    # Get expense stats for each user
+    # Get expense stats for the whole page at once
+    totals = await _expense_totals(db, users)
     user_stats = []
     for user in users:
         user_id = str(user["_id"])
-        
-        # Count expenses
-        expense_count = await db.expenses.count_documents({"user_id": user_id})
-        
-        # Sum total amount
-        expenses = await db.expenses.find({"user_id": user_id}).to_list(length=None)
-        total_amount = sum(exp["amount"] for exp in expenses)
+        expense_count = totals.get(user_id, {}).get("count", 0)
+        total_amount = totals.get(user_id, {}).get("total", 0)
         
         user_stats.append(AdminUserStats(
             id=user_id,
@@ -128,6 +171,7 @@ async def get_all_users(
             role=user.get("role", UserRole.USER),
             expenses=expense_count,
             totalAmount=round(total_amount, 2),
+            currency=user_currency(user),
             joinDate=user["created_at"],
             lastActive=user.get("last_active"),
             avatar=user.get("avatar")
@@ -204,9 +248,9 @@ async def get_user_details(
         raise HTTPException(status_code=404, detail="User not found")
     
     # Get expense stats
-    expense_count = await db.expenses.count_documents({"user_id": user_id})
-    expenses = await db.expenses.find({"user_id": user_id}).to_list(length=None)
-    total_amount = sum(exp["amount"] for exp in expenses)
+    totals = (await _expense_totals(db, [user])).get(user_id, {})
+    expense_count = totals.get("count", 0)
+    total_amount = totals.get("total", 0)
     
     return AdminUserStats(
         id=user_id,
@@ -217,6 +261,7 @@ async def get_user_details(
         role=user.get("role", UserRole.USER),
         expenses=expense_count,
         totalAmount=round(total_amount, 2),
+        currency=user_currency(user),
         joinDate=user["created_at"],
         lastActive=user.get("last_active"),
         avatar=user.get("avatar")
@@ -267,7 +312,7 @@ async def delete_user(
     current_user: dict = Depends(get_current_admin_user),
     db = Depends(get_database)
 ):
-    """Delete a user and all their data (admin only)"""
+    """Delete a user now and their data in the background (admin only)"""
     
     try:
         user = await db.users.find_one({"_id": ObjectId(user_id)})
@@ -284,13 +329,8 @@ async def delete_user(
             detail="Cannot delete your own account"
         )
     
-    # Delete user's expenses
-    await db.expenses.delete_many({"user_id": user_id})
-    
-    # Delete user's categories
-    await db.categories.delete_many({"user_id": user_id})
-    
-    # Delete user
+    # Queue the cleanup first, so a failure here leaves the account in place
+    await enqueue_job(db, "account.delete", {"user_id": user_id}, priority=5)
     await db.users.delete_one({"_id": ObjectId(user_id)})
     
     return None
@@ -313,8 +353,7 @@ async def get_user_expenses(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    cursor = db.expenses.find({"user_id": user_id}).sort("date", -1).skip(skip).limit(limit)
-    expenses = await cursor.to_list(length=limit)
+    expenses = await find_expenses(db, {"user_id": user_id}, skip=skip, limit=limit)
     
     # Serialize expenses
     for expense in expenses:
@@ -322,6 +361,89 @@ async def get_user_expenses(
     
     return expenses
 
+@router.get("/database/pool")
+async def get_database_pool_stats(
+    current_user: dict = Depends(get_current_admin_user)
+):
+    """Get MongoDB connection pool usage and checkout wait times (admin only)"""
+    return pool_metrics.snapshot()
+
+@router.get("/database/slow-queries")
+async def get_slow_queries(
+    hours: int = Query(24, ge=1, le=24 * 30),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(get_current_admin_user),
+    db = Depends(get_database)
+):
+    """Get the slowest query shapes with their explain summaries (admin only)"""
+    return await top_slow_queries(db, hours=hours, limit=limit)
+
+@router.get("/jobs", response_model=List[JobResponse])
+async def get_jobs(
+    status_filter: Optional[JobStatus] = Query(None, alias="status"),
+    type: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: dict = Depends(get_current_admin_user),
+    db = Depends(get_database)
+):
+    """List background jobs of every user, newest first (admin only)"""
+    query = {}
+    if status_filter:
+        query["status"] = status_filter.value
+    if type:
+        query["type"] = type
+    jobs = await db[JOBS_COLLECTION].find(query).sort("created_at", -1).limit(limit).to_list(length=limit)
+    return [serialize_job(job) for job in jobs]
+
+@router.post("/jobs", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_job(
+    job_data: JobCreate,
+    current_user: dict = Depends(get_current_admin_user),
+    db = Depends(get_database)
+):
+    """Queue a maintenance job such as an index rebuild or backfill (admin only)"""
+    if job_data.type not in MAINTENANCE_JOB_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Job type must be one of {', '.join(MAINTENANCE_JOB_TYPES)}"
+        )
+    job = await enqueue_job(db, job_data.type, job_data.payload, priority=job_data.priority, run_at=job_data.run_at)
+    return serialize_job(job)
+
+@router.post("/jobs/{job_id}/retry", response_model=JobResponse)
+async def retry_failed_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_admin_user),
+    db = Depends(get_database)
+):
+    """Queue a failed or cancelled job again (admin only)"""
+    try:
+        job = await retry_job(db, ObjectId(job_id))
+    except:
+        raise HTTPException(status_code=400, detail="Invalid job ID")
+    if not job:
+        raise HTTPException(status_code=404, detail="No failed or cancelled job with this ID")
+    return serialize_job(job)
+
+@router.get("/profiles")
+async def get_profiles(
+    limit: int = Query(50, ge=1, le=500),
+    current_user: dict = Depends(get_current_admin_user)
+):
+    """List stored request profiles, newest first (admin only)"""
+    return list_profiles(limit)
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(
+    profile_id: str,
+    current_user: dict = Depends(get_current_admin_user)
+):
+    """Get a request profile as collapsed stacks for flamegraph.pl or speedscope (admin only)"""
+    folded = read_folded_profile(profile_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return folded
+
 @router.get("/settings")
 async def get_admin_settings(
     current_user: dict = Depends(get_current_admin_user),
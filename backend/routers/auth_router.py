@@ -7,6 +7,18 @@ from bson import ObjectId
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
+# Categories every new account starts with
+DEFAULT_CATEGORIES = [
+    {"name": "Food & Dining", "color": "#0ea5e9", "icon": "🍔"},
+    {"name": "Transportation", "color": "#a855f7", "icon": "🚗"},
+    {"name": "Shopping", "color": "#f59e0b", "icon": "🛍️"},
+    {"name": "Entertainment", "color": "#10b981", "icon": "🎬"},
+    {"name": "Bills & Utilities", "color": "#ef4444", "icon": "📄"},
+    {"name": "Healthcare", "color": "#ec4899", "icon": "⚕️"},
+    {"name": "Education", "color": "#8b5cf6", "icon": "📚"},
+    {"name": "Travel", "color": "#06b6d4", "icon": "✈️"},
+]
+
 @router.post("/register", response_model=Token, status_code=status.HTTP_201_CREATED)
 async def register(user_data: UserCreate, db=Depends(get_database)):
     """Register a new user"""
@@ -35,18 +47,7 @@ async def register(user_data: UserCreate, db=Depends(get_database)):
     user_dict["_id"] = result.inserted_id
     
     # Create default categories for the user
-    default_categories = [
-        {"name": "Food & Dining", "color": "#0ea5e9", "icon": "🍔"},
-        {"name": "Transportation", "color": "#a855f7", "icon": "🚗"},
-        {"name": "Shopping", "color": "#f59e0b", "icon": "🛍️"},
-        {"name": "Entertainment", "color": "#10b981", "icon": "🎬"},
-        {"name": "Bills & Utilities", "color": "#ef4444", "icon": "📄"},
-        {"name": "Healthcare", "color": "#ec4899", "icon": "⚕️"},
-        {"name": "Education", "color": "#8b5cf6", "icon": "📚"},
-        {"name": "Travel", "color": "#06b6d4", "icon": "✈️"},
-    ]
-    
-    for category in default_categories:
+    for category in DEFAULT_CATEGORIES:
         await db.categories.insert_one({
             **category,
             "user_id": str(result.inserted_id),
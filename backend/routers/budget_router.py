@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, Query
+from typing import Optional
+from datetime import datetime
+from models import BudgetSummary
+from auth import get_current_active_user
+from database import get_database
+from budgets import SPEND_FIELD, budget_status, month_key
+
+router = APIRouter(prefix="/budgets", tags=["Budgets"])
+
+@router.get("/status", response_model=BudgetSummary)
+async def get_budget_status(
+    month: Optional[str] = Query(None, regex=r"^\d{4}-(0[1-9]|1[0-2])$"),
+    current_user: dict = Depends(get_current_active_user),
+    db = Depends(get_database)
+):
+    """Spend against budget for each budgeted category in a month (default: this month)
+    
+    Answered from the per-category spend counters kept up to date by every
+    expense write, so it never reads the expenses themselves.
+    """
+    month = month or month_key(datetime.utcnow())
+    categories = await db.categories.find(
+        {"user_id": str(current_user["_id"]), "budget": {"$gt": 0}},
+        {"name": 1, "color": 1, "icon": 1, "budget": 1, f"{SPEND_FIELD}.{month}": 1}
+    ).sort("name", 1).to_list(length=None)
+    
+    statuses = [budget_status(category, month) for category in categories]
+    return BudgetSummary(
+        month=month,
+        totalBudget=round(sum(status["budget"] for status in statuses), 2),
+        totalSpent=round(sum(status["spent"] for status in statuses), 2),
+        categories=statuses
+    )
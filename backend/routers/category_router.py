@@ -5,6 +5,11 @@ from datetime import datetime
 from models import CategoryCreate, CategoryUpdate, CategoryResponse
 from auth import get_current_active_user
 from database import get_database
+from parse_cache import invalidate_user_cache
+from merchant_index import rename_category, forget_category
+from archive import count_archived_expenses, rename_archived_category
+from recurring import RECURRING_COLLECTION
+from live_events import publish
 
 router = APIRouter(prefix="/categories", tags=["Categories"])
 
@@ -15,6 +20,10 @@ def serialize_category(category: dict) -> dict:
         return category
     return None
 
+def category_summary(category: dict) -> dict:
+    """The fields of a category the dashboard shows, for live events"""
+    return {key: str(category[key]) if key == "_id" else category.get(key) for key in ("_id", "name", "color", "icon", "budget")}
+
 @router.get("", response_model=List[CategoryResponse])
 async def get_categories(
     current_user: dict = Depends(get_current_active_user),
@@ -72,6 +81,10 @@ async def create_category(
     result = await db.categories.insert_one(category_dict)
     category_dict["_id"] = result.inserted_id
     
+    # Cached parse results may have picked a category from the old set
+    await invalidate_user_cache(db, str(current_user["_id"]))
+    
+    publish(str(current_user["_id"]), "category.created", category=category_summary(category_dict))
     return serialize_category(category_dict)
 
 @router.put("/{category_id}", response_model=CategoryResponse)
@@ -111,6 +124,12 @@ async def update_category(
     # If name is changed, update all expenses with this category
     if "name" in update_data and update_data["name"] != category["name"]:
         await db.expenses.update_many(
+            {"user_id": str(current_user["_id"]), "category": category["name"]},
+            {"$set": {"category": update_data["name"], "updated_at": datetime.utcnow()}}
+        )
+        await rename_archived_category(db, str(current_user["_id"]), category["name"], update_data["name"])
+        await rename_category(db, str(current_user["_id"]), category["name"], update_data["name"])
+        await db[RECURRING_COLLECTION].update_many(
             {"user_id": str(current_user["_id"]), "category": category["name"]},
             {"$set": {"category": update_data["name"]}}
         )
@@ -120,7 +139,12 @@ async def update_category(
         {"$set": update_data}
     )
     
+    if "name" in update_data:
+        await invalidate_user_cache(db, str(current_user["_id"]))
+    
     updated_category = await db.categories.find_one({"_id": ObjectId(category_id)})
+    publish(str(current_user["_id"]), "category.updated", category=category_summary(updated_category),
+            previous_name=category["name"])
     return serialize_category(updated_category)
 
 @router.delete("/{category_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -146,6 +170,8 @@ async def delete_category(
         "user_id": str(current_user["_id"]),
         "category": category["name"]
     })
+    if not expense_count:
+        expense_count = await count_archived_expenses(db, str(current_user["_id"]), category["name"])
     
     if expense_count > 0:
         raise HTTPException(
@@ -153,5 +179,18 @@ async def delete_category(
             detail=f"Cannot delete category. {expense_count} expense(s) are using this category."
         )
     
+    rule_count = await db[RECURRING_COLLECTION].count_documents({
+        "user_id": str(current_user["_id"]),
+        "category": category["name"]
+    })
+    if rule_count > 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Cannot delete category. {rule_count} recurring expense(s) are using this category."
+        )
+    
     await db.categories.delete_one({"_id": ObjectId(category_id)})
+    await forget_category(db, str(current_user["_id"]), category["name"])
+    await invalidate_user_cache(db, str(current_user["_id"]))
+    publish(str(current_user["_id"]), "category.deleted", category=category_summary(category))
     return None
@@ -1,10 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Query, Request, Response
 from typing import List, Optional
+from collections import defaultdict
 from datetime import datetime, timedelta
 from bson import ObjectId
-from models import ExpenseCreate, ExpenseUpdate, ExpenseResponse, DashboardStats, CategoryStat, SourceStat, TrendData, RecentTransaction
+from pymongo import ReturnDocument
+from models import (
+    ExpenseCreate, ExpenseUpdate, ExpenseResponse, ExpenseCreateResponse, ExpenseBulkResult, DuplicateExpense,
+    DashboardStats, CategoryStat, SourceStat, TrendData, RecentTransaction
+)
 from auth import get_current_active_user, serialize_user
-from database import get_database
+from database import get_database, get_analytics_database
+from merchant_index import record_merchant_category, record_merchant_categories, update_merchant_category
+from duplicates import expense_fingerprint, find_duplicate, find_duplicates_bulk
+from response_formats import FORMAT_PATTERN, negotiate_format, rows_response
+from archive import find_expenses, find_archived_expense, restore_archived_expense
+from budgets import SPEND_FIELD, budget_status, category_increments, category_updates, month_key
+from currency import convert_totals, expense_currency, resolve_currency, user_currency
+from live_events import BULK_EVENT_EXPENSES, expense_summary, publish, totals_delta
+from idempotency import idempotent
 from dateutil import parser
 import calendar
 
@@ -17,20 +30,21 @@ def serialize_expense(expense: dict) -> dict:
         return expense
     return None
 
-@router.get("", response_model=List[ExpenseResponse])
-async def get_expenses(
-    skip: int = 0,
-    limit: int = 100,
+# Fields of an expense in list responses, in ExpenseResponse order
+EXPENSE_FIELDS = [
+    field.alias or name for name, field in ExpenseResponse.model_fields.items() if name != "possible_duplicate_of"
+]
+
+def build_expense_query(
+    user_id: str,
     category: Optional[str] = None,
     source: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
-    search: Optional[str] = None,
-    current_user: dict = Depends(get_current_active_user),
-    db = Depends(get_database)
-):
-    """Get all expenses for current user"""
-    query = {"user_id": str(current_user["_id"])}
+    search: Optional[str] = None
+) -> dict:
+    """MongoDB filter for a user's expenses from the list filters"""
+    query = {"user_id": user_id}
     
     # Apply filters
     if category and category != "all":
@@ -54,16 +68,65 @@ async def get_expenses(
             {"description": {"$regex": search, "$options": "i"}}
         ]
     
-    cursor = db.expenses.find(query).sort("date", -1).skip(skip).limit(limit)
-    expenses = await cursor.to_list(length=limit)
+    return query
+
+@router.get("", response_model=List[ExpenseResponse])
+async def get_expenses(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    category: Optional[str] = None,
+    source: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    search: Optional[str] = None,
+    requested_format: Optional[str] = Query(None, alias="format", regex=FORMAT_PATTERN),
+    current_user: dict = Depends(get_current_active_user),
+    db = Depends(get_database)
+):
+    """Get all expenses for current user
+    
+    Returned as JSON objects by default; ?format=columnar or msgpack (or the
+    matching Accept header) sends the same fields column by column. Pages
+    reaching past the archive horizon include archived expenses.
+    """
+    response_format = negotiate_format(request, requested_format)
+    query = build_expense_query(str(current_user["_id"]), category, source, start_date, end_date, search)
+    
+    expenses = await find_expenses(db, query, skip=skip, limit=limit)
+    expenses = [serialize_expense(expense) for expense in expenses]
+    
+    if response_format != "json":
+        return rows_response(expenses, EXPENSE_FIELDS, response_format)
+    return expenses
+
+@router.get("/export")
+async def export_expenses(
+    request: Request,
+    category: Optional[str] = None,
+    source: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    search: Optional[str] = None,
+    requested_format: Optional[str] = Query(None, alias="format", regex=FORMAT_PATTERN),
+    current_user: dict = Depends(get_current_active_user),
+    db = Depends(get_database)
+):
+    """Download all matching expenses as a file (JSON rows, columnar JSON or MessagePack)"""
+    response_format = negotiate_format(request, requested_format)
+    query = build_expense_query(str(current_user["_id"]), category, source, start_date, end_date, search)
     
-    return [serialize_expense(expense) for expense in expenses]
+    expenses = await find_expenses(db, query, projection={"fingerprint": 0})
+    expenses = [serialize_expense(expense) for expense in expenses]
+    
+    filename = f"expenses-{datetime.utcnow():%Y-%m-%d}"
+    return rows_response(expenses, EXPENSE_FIELDS, response_format, filename=filename)
 
 @router.get("/stats", response_model=DashboardStats)
 async def get_expense_stats(
     time_range: str = Query("7days", regex="^(7days|30days|90days|year)$", alias="range"),
     current_user: dict = Depends(get_current_active_user),
-    db = Depends(get_database)
+    db = Depends(get_analytics_database)
 ):
     """Get expense statistics for dashboard"""
     user_id = str(current_user["_id"])
@@ -84,20 +147,36 @@ async def get_expense_stats(
         prev_start = start_date - timedelta(days=365)
     
     # Get current period expenses
-    current_expenses = await db.expenses.find({
+    current_expenses = await find_expenses(db, {
         "user_id": user_id,
         "date": {"$gte": start_date, "$lte": end_date}
-    }).to_list(length=None)
+    })
     
     # Get previous period expenses for comparison
-    prev_expenses = await db.expenses.find({
+    prev_expenses = await find_expenses(db, {
         "user_id": user_id,
         "date": {"$gte": prev_start, "$lt": start_date}
-    }).to_list(length=None)
+    })
+    
+    # Sum per currency in one pass, then convert each sum once
+    currency = user_currency(current_user)
+    current_by_currency = defaultdict(float)
+    prev_by_currency = defaultdict(float)
+    category_sums = defaultdict(lambda: defaultdict(float))
+    category_counts = defaultdict(int)
+    day_sums = defaultdict(lambda: defaultdict(float))
+    for exp in current_expenses:
+        code = expense_currency(exp)
+        current_by_currency[code] += exp["amount"]
+        category_sums[exp["category"]][code] += exp["amount"]
+        category_counts[exp["category"]] += 1
+        day_sums[exp["date"].date()][code] += exp["amount"]
+    for exp in prev_expenses:
+        prev_by_currency[expense_currency(exp)] += exp["amount"]
     
     # Calculate totals
-    total_current = sum(exp["amount"] for exp in current_expenses)
-    total_prev = sum(exp["amount"] for exp in prev_expenses)
+    total_current = convert_totals(current_by_currency, currency)
+    total_prev = convert_totals(prev_by_currency, currency)
     
     # Calculate change percentage
     if total_prev > 0:
@@ -106,12 +185,7 @@ async def get_expense_stats(
         monthly_change = 100 if total_current > 0 else 0
     
     # Category breakdown
-    category_totals = {}
-    category_counts = {}
-    for exp in current_expenses:
-        cat = exp["category"]
-        category_totals[cat] = category_totals.get(cat, 0) + exp["amount"]
-        category_counts[cat] = category_counts.get(cat, 0) + 1
+    category_totals = {cat: convert_totals(sums, currency) for cat, sums in category_sums.items()}
     
     # Get category colors from user's categories
     categories = await db.categories.find({"user_id": user_id}).to_list(length=None)
@@ -151,17 +225,9 @@ async def get_expense_stats(
     
     for i in range(days):
         day = end_date - timedelta(days=days-1-i)
-        day_start = day.replace(hour=0, minute=0, second=0, microsecond=0)
-        day_end = day_start + timedelta(days=1)
-        
-        day_expenses = [
-            exp["amount"] for exp in current_expenses 
-            if day_start <= exp["date"] < day_end
-        ]
-        
         trend_data.append(TrendData(
             date=day.strftime("%b %d"),
-            amount=round(sum(day_expenses), 2)
+            amount=round(convert_totals(day_sums.get(day.date(), {}), currency), 2)
         ))
     
     # Recent transactions
@@ -173,13 +239,15 @@ async def get_expense_stats(
             amount=exp["amount"],
             category=exp["category"],
             date=exp["date"],
-            source=exp["source"]
+            source=exp["source"],
+            currency=expense_currency(exp)
         )
         for exp in recent
     ]
     
     return DashboardStats(
         totalExpenses=round(total_current, 2),
+        currency=currency,
         monthlyChange=round(monthly_change, 2),
         transactionCount=len(current_expenses),
         categoryBreakdown=category_breakdown,
@@ -203,33 +271,135 @@ async def get_expense(
     except:
         raise HTTPException(status_code=400, detail="Invalid expense ID")
     
+    if not expense:
+        expense = await find_archived_expense(db, str(current_user["_id"]), ObjectId(expense_id))
+    
     if not expense:
         raise HTTPException(status_code=404, detail="Expense not found")
     
     return serialize_expense(expense)
 
-@router.post("", response_model=ExpenseResponse, status_code=status.HTTP_201_CREATED)
+@router.post("", response_model=ExpenseCreateResponse, status_code=status.HTTP_201_CREATED)
 async def create_expense(
     expense_data: ExpenseCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
     current_user: dict = Depends(get_current_active_user),
     db = Depends(get_database)
 ):
-    """Create a new expense"""
+    """Create a new expense
+
+    A retry sent with the same Idempotency-Key gets the first response
+    back (with Idempotent-Replayed: true) instead of a second expense.
+    """
+    return await idempotent(
+        db, str(current_user["_id"]), "POST /expenses", idempotency_key, expense_data, response,
+        lambda: insert_expense(expense_data, current_user, db)
+    )
+
+async def insert_expense(expense_data: ExpenseCreate, current_user: dict, db) -> dict:
+    user_id = str(current_user["_id"])
+    
+    # Flag, but still store, expenses that look like an existing purchase
+    duplicate = await find_duplicate(
+        db, user_id, expense_data.amount, expense_data.date, expense_data.merchant, expense_data.source
+    )
+    
     expense_dict = expense_data.dict()
-    expense_dict["user_id"] = str(current_user["_id"])
+    expense_dict["currency"] = resolve_currency(expense_data.currency, current_user)
+    expense_dict["user_id"] = user_id
+    expense_dict["fingerprint"] = expense_fingerprint(expense_data.amount, expense_data.date, expense_data.merchant)
     expense_dict["created_at"] = datetime.utcnow()
     expense_dict["updated_at"] = None
     
     result = await db.expenses.insert_one(expense_dict)
     expense_dict["_id"] = result.inserted_id
     
-    # Update category count
-    await db.categories.update_one(
-        {"user_id": str(current_user["_id"]), "name": expense_data.category},
-        {"$inc": {"count": 1}}
+    # Update category count and monthly spend, reading back where the budget stands
+    month = month_key(expense_data.date)
+    category = await db.categories.find_one_and_update(
+        {"user_id": user_id, "name": expense_data.category},
+        {"$inc": category_increments(user_currency(current_user), added=[expense_dict])[expense_data.category]},
+        projection={"name": 1, "color": 1, "icon": 1, "budget": 1, f"{SPEND_FIELD}.{month}": 1},
+        return_document=ReturnDocument.AFTER
     )
     
-    return serialize_expense(expense_dict)
+    # Learn the merchant's category for future parsing
+    await record_merchant_category(db, user_id, expense_data.merchant, expense_data.category)
+    
+    publish(user_id, "expense.created", expense=expense_summary(expense_dict),
+            totals=totals_delta(user_currency(current_user), added=[expense_dict]))
+    
+    response = serialize_expense(expense_dict)
+    if duplicate:
+        response["possible_duplicate_of"] = str(duplicate["_id"])
+    alert = budget_status(category, month) if category else None
+    if alert and alert["status"] != "ok":
+        response["budget_alert"] = alert
+    return response
+
+@router.post("/bulk", response_model=ExpenseBulkResult, status_code=status.HTTP_201_CREATED)
+async def create_expenses_bulk(
+    expenses_data: List[ExpenseCreate],
+    response: Response,
+    force: bool = False,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    current_user: dict = Depends(get_current_active_user),
+    db = Depends(get_database)
+):
+    """Create several expenses at once, skipping likely duplicates
+
+    Honors Idempotency-Key like creating a single expense.
+    """
+    return await idempotent(
+        db, str(current_user["_id"]), "POST /expenses/bulk", idempotency_key,
+        {"expenses": expenses_data, "force": force}, response,
+        lambda: insert_expenses_bulk(expenses_data, force, current_user, db)
+    )
+
+async def insert_expenses_bulk(expenses_data: List[ExpenseCreate], force: bool, current_user: dict, db) -> ExpenseBulkResult:
+    user_id = str(current_user["_id"])
+    now = datetime.utcnow()
+    
+    expense_dicts = [expense_data.dict() for expense_data in expenses_data]
+    for expense_dict in expense_dicts:
+        expense_dict["currency"] = resolve_currency(expense_dict["currency"], current_user)
+    matches = [None] * len(expense_dicts)
+    if not force:
+        matches = await find_duplicates_bulk(db, user_id, expense_dicts)
+    
+    to_insert = []
+    duplicates = []
+    for index, (expense_dict, match) in enumerate(zip(expense_dicts, matches)):
+        if isinstance(match, dict):
+            duplicates.append(DuplicateExpense(index=index, duplicate_of=ExpenseResponse(**serialize_expense(match))))
+        elif match is not None:
+            duplicates.append(DuplicateExpense(index=index, duplicate_of_index=match))
+        else:
+            expense_dict["user_id"] = user_id
+            expense_dict["fingerprint"] = expense_fingerprint(expense_dict["amount"], expense_dict["date"], expense_dict["merchant"])
+            expense_dict["created_at"] = now
+            expense_dict["updated_at"] = None
+            to_insert.append(expense_dict)
+    
+    if to_insert:
+        result = await db.expenses.insert_many(to_insert)
+        for expense_dict, inserted_id in zip(to_insert, result.inserted_ids):
+            expense_dict["_id"] = inserted_id
+        
+        # Update category counts and monthly spend once per category
+        await db.categories.bulk_write(category_updates(user_id, user_currency(current_user), added=to_insert), ordered=False)
+        
+        await record_merchant_categories(db, user_id, to_insert)
+        
+        newest = sorted(to_insert, key=lambda expense: expense["date"], reverse=True)[:BULK_EVENT_EXPENSES]
+        publish(user_id, "expenses.created", expenses=[expense_summary(expense) for expense in newest],
+                totals=totals_delta(user_currency(current_user), added=to_insert))
+    
+    return ExpenseBulkResult(
+        inserted=[serialize_expense(expense_dict) for expense_dict in to_insert],
+        duplicates=duplicates
+    )
 
 @router.put("/{expense_id}", response_model=ExpenseResponse)
 async def update_expense(
@@ -247,32 +417,54 @@ async def update_expense(
     except:
         raise HTTPException(status_code=400, detail="Invalid expense ID")
     
+    if not expense:
+        # Archived expenses are edited back in the hot collection
+        expense = await restore_archived_expense(db, str(current_user["_id"]), ObjectId(expense_id))
+    
     if not expense:
         raise HTTPException(status_code=404, detail="Expense not found")
     
     # Update only provided fields
     update_data = {k: v for k, v in expense_data.dict(exclude_unset=True).items()}
+    if "currency" in update_data:
+        update_data["currency"] = resolve_currency(update_data["currency"], current_user)
     update_data["updated_at"] = datetime.utcnow()
     
-    # Handle category change
-    if "category" in update_data and update_data["category"] != expense["category"]:
-        # Decrement old category
-        await db.categories.update_one(
-            {"user_id": str(current_user["_id"]), "name": expense["category"]},
-            {"$inc": {"count": -1}}
-        )
-        # Increment new category
-        await db.categories.update_one(
-            {"user_id": str(current_user["_id"]), "name": update_data["category"]},
-            {"$inc": {"count": 1}}
+    # Keep the duplicate-detection fingerprint in step with the edited fields
+    fingerprint_fields = {"amount", "date", "merchant"} & update_data.keys()
+    if fingerprint_fields:
+        update_data["fingerprint"] = expense_fingerprint(
+            update_data.get("amount") or expense["amount"],
+            update_data.get("date") or expense["date"],
+            update_data.get("merchant") or expense["merchant"]
         )
     
-    await db.expenses.update_one(
-        {"_id": ObjectId(expense_id)},
-        {"$set": update_data}
+    # The counters move by what this write actually replaced: a concurrent
+    # edit may have changed the expense since it was read above
+    expense = await db.expenses.find_one_and_update(
+        {"_id": expense["_id"], "user_id": str(current_user["_id"])},
+        {"$set": update_data},
+        return_document=ReturnDocument.BEFORE
     )
+    if not expense:
+        raise HTTPException(status_code=404, detail="Expense not found")
+    updated_expense = {**expense, **update_data}
+    if fingerprint_fields:
+        fingerprint = expense_fingerprint(updated_expense["amount"], updated_expense["date"], updated_expense["merchant"])
+        if fingerprint != updated_expense["fingerprint"]:
+            await db.expenses.update_one({"_id": expense["_id"]}, {"$set": {"fingerprint": fingerprint}})
+            updated_expense["fingerprint"] = fingerprint
+    
+    # Move count and spend between categories and months in one round trip
+    operations = category_updates(str(current_user["_id"]), user_currency(current_user), added=[updated_expense], removed=[expense])
+    if operations:
+        await db.categories.bulk_write(operations, ordered=False)
+    
+    await update_merchant_category(db, str(current_user["_id"]), expense, update_data)
+    
+    publish(str(current_user["_id"]), "expense.updated", expense=expense_summary(updated_expense),
+            totals=totals_delta(user_currency(current_user), added=[updated_expense], removed=[expense]))
     
-    updated_expense = await db.expenses.find_one({"_id": ObjectId(expense_id)})
     return serialize_expense(updated_expense)
 
 @router.delete("/{expense_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -283,21 +475,26 @@ async def delete_expense(
 ):
     """Delete an expense"""
     try:
-        expense = await db.expenses.find_one({
-            "_id": ObjectId(expense_id),
-            "user_id": str(current_user["_id"])
-        })
+        query = {"_id": ObjectId(expense_id), "user_id": str(current_user["_id"])}
     except:
         raise HTTPException(status_code=400, detail="Invalid expense ID")
     
+    # Only the request that actually deletes the expense takes it off the counters
+    expense = await db.expenses.find_one_and_delete(query)
+    if not expense and await restore_archived_expense(db, str(current_user["_id"]), query["_id"]):
+        expense = await db.expenses.find_one_and_delete(query)
+    
     if not expense:
         raise HTTPException(status_code=404, detail="Expense not found")
     
-    # Update category count
+    # Update category count and monthly spend
     await db.categories.update_one(
         {"user_id": str(current_user["_id"]), "name": expense["category"]},
-        {"$inc": {"count": -1}}
+        {"$inc": category_increments(user_currency(current_user), removed=[expense])[expense["category"]]}
     )
     
-    await db.expenses.delete_one({"_id": ObjectId(expense_id)})
+    await record_merchant_category(db, str(current_user["_id"]), expense["merchant"], expense["category"], delta=-1)
+    
+    publish(str(current_user["_id"]), "expense.deleted", id=expense_id,
+            totals=totals_delta(user_currency(current_user), removed=[expense]))
     return None
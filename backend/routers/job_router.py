@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List, Optional
+from bson import ObjectId
+from models import JobResponse, JobStatus, UserRole
+from auth import get_current_active_user
+from database import get_database
+from jobs import JOBS_COLLECTION, cancel_job
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+def serialize_job(job: dict) -> dict:
+    """Serialize job document"""
+    if job:
+        job["_id"] = str(job["_id"])
+        return job
+    return None
+
+async def find_job(db, job_id: str, user: dict) -> dict:
+    """A job of the user's (any job for admins)"""
+    try:
+        query = {"_id": ObjectId(job_id)}
+    except:
+        raise HTTPException(status_code=400, detail="Invalid job ID")
+    if user.get("role") != UserRole.ADMIN:
+        query["user_id"] = str(user["_id"])
+    job = await db[JOBS_COLLECTION].find_one(query)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("", response_model=List[JobResponse])
+async def get_jobs(
+    status: Optional[JobStatus] = None,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: dict = Depends(get_current_active_user),
+    db = Depends(get_database)
+):
+    """Get the current user's jobs, newest first"""
+    query = {"user_id": str(current_user["_id"])}
+    if status:
+        query["status"] = status.value
+    jobs = await db[JOBS_COLLECTION].find(query).sort("created_at", -1).limit(limit).to_list(length=limit)
+    return [serialize_job(job) for job in jobs]
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_active_user),
+    db = Depends(get_database)
+):
+    """Get a job's status, attempts and result"""
+    return serialize_job(await find_job(db, job_id, current_user))
+
+@router.post("/{job_id}/cancel", response_model=JobResponse)
+async def cancel(
+    job_id: str,
+    current_user: dict = Depends(get_current_active_user),
+    db = Depends(get_database)
+):
+    """Cancel a queued job, or ask the worker running one to stop (cancel_requested until it does)"""
+    job = await find_job(db, job_id, current_user)
+    return serialize_job(await cancel_job(db, job["_id"]))
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+from auth import get_current_active_user
+from live_events import event_stream, live_events
+
+router = APIRouter(prefix="/live", tags=["Live Updates"])
+
+@router.get("/events")
+async def stream_events(
+    request: Request,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Server-sent events with changes to the current user's expenses and categories
+    
+    Events carry the change itself (the expense, and what it adds to or
+    removes from the dashboard totals in the user's currency), so a client
+    applies them instead of re-fetching stats. A "resync" event means
+    events were dropped and the client should fetch the stats again.
+    """
+    user_id = str(current_user["_id"])
+    queue = live_events.subscribe(user_id)
+    return StreamingResponse(
+        event_stream(user_id, queue, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
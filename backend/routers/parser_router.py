@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
 from typing import Optional
-import re
 from datetime import datetime
 from models import SMSParseRequest, ParsedExpenseData
 from auth import get_current_active_user
 from database import get_database
+from uploads import spool_upload, get_max_upload_bytes
+from parse_cache import get_cached_parse, store_parse, sms_content_hash
+from merchant_index import lookup_merchant_category, CATEGORY_CONFIDENCE_WEIGHT
+from sms_parser import parse_sms_fields, match_keyword_category
 
 router = APIRouter(prefix="/parse", tags=["Parsers"])
 
@@ -16,118 +19,58 @@ async def parse_sms(
 ):
     """Parse expense information from SMS text"""
     text = request.text.strip()
-    
-    # Initialize parsed data
-    parsed = ParsedExpenseData(confidence=0.0)
-    
-    # Common patterns for SMS transaction notifications
-    # Pattern 1: "Spent Rs.500 at Starbucks on 12/12/2024"
-    # Pattern 2: "Rs 500 debited from your account for AMAZON on 12-Dec-2024"
-    # Pattern 3: "Transaction of $25.50 at UBER"
-    
-    # Extract amount (supports $, Rs, INR, USD formats)
-    amount_patterns = [
-        r'(?:Rs\.?|INR|₹)\s*([0-9,]+\.?[0-9]*)',
-        r'\$\s*([0-9,]+\.?[0-9]*)',
-        r'(?:USD|EUR|GBP)\s*([0-9,]+\.?[0-9]*)',
-        r'amount[:\s]+(?:Rs\.?|INR|₹|\$)?\s*([0-9,]+\.?[0-9]*)',
-    ]
-    
-    amount = None
-    for pattern in amount_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            amount_str = match.group(1).replace(',', '')
-            try:
-                amount = float(amount_str)
-                parsed.amount = amount
-                parsed.confidence += 0.3
-                break
-            except ValueError:
-                continue
-    
-    # Extract merchant name
-    merchant_keywords = ['at', 'to', 'for', 'from']
-    merchant_patterns = [
-        r'(?:at|to|for)\s+([A-Z][A-Za-z0-9\s&]+?)(?:\s+on|\s+dated|\s+dated|\.|$)',
-        r'(?:merchant|vendor)[:\s]+([A-Za-z0-9\s&]+)',
-    ]
-    
-    merchant = None
-    for pattern in merchant_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            merchant = match.group(1).strip()
-            # Clean up merchant name
-            merchant = re.sub(r'\s+', ' ', merchant)
-            if len(merchant) > 3:
-                parsed.merchant = merchant
-                parsed.confidence += 0.3
-                break
-    
-    # Extract date
-    date_patterns = [
-        r'(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})',
-        r'(\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{2,4})',
-        r'(?:on|dated)\s+(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})',
-    ]
-    
-    date = None
-    for pattern in date_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            date_str = match.group(1)
-            # Try to parse the date
-            for fmt in ['%d/%m/%Y', '%d-%m-%Y', '%d/%m/%y', '%d-%m-%y', '%d %b %Y', '%d %B %Y']:
-                try:
-                    date = datetime.strptime(date_str, fmt)
-                    parsed.date = date
-                    parsed.confidence += 0.2
-                    break
-                except ValueError:
-                    continue
-            if date:
-                break
+    user_id = str(current_user["_id"])
+    
+    # Identical messages reuse the earlier parse result
+    content_hash = sms_content_hash(text)
+    cached = await get_cached_parse(db, user_id, "sms", content_hash)
+    if cached:
+        # The user may have recategorized this merchant since it was cached
+        if cached.merchant:
+            learned_category, learned_confidence = await lookup_merchant_category(db, user_id, cached.merchant)
+            if learned_category and learned_category != cached.category and await db.categories.find_one(
+                {"user_id": user_id, "name": learned_category}, {"_id": 1}
+            ):
+                cached.confidence += learned_confidence - cached.category_confidence
+                cached.category = learned_category
+                cached.category_confidence = learned_confidence
+        return cached
+    
+    parsed = parse_sms_fields(text)
     
     # If no date found, use current date
-    if not parsed.date:
+    date_defaulted = not parsed.date
+    if date_defaulted:
         parsed.date = datetime.utcnow()
     
+    # Get user's categories once for inference and the fallback below
+    categories = await db.categories.find({"user_id": user_id}, {"name": 1}).to_list(length=None)
+    category_names = [cat["name"] for cat in categories]
+    
     # Category inference based on merchant name
     if parsed.merchant:
-        merchant_lower = parsed.merchant.lower()
-        
-        # Get user's categories
-        categories = await db.categories.find({"user_id": str(current_user["_id"])}).to_list(length=None)
-        category_names = [cat["name"] for cat in categories]
-        
-        # Default category mappings
-        category_keywords = {
-            "Food & Dining": ["restaurant", "cafe", "coffee", "starbucks", "mcdonald", "pizza", "food", "swiggy", "zomato", "dunkin"],
-            "Transportation": ["uber", "lyft", "taxi", "gas", "fuel", "petrol", "metro", "train", "bus"],
-            "Shopping": ["amazon", "flipkart", "walmart", "target", "mall", "store", "shop"],
-            "Entertainment": ["netflix", "spotify", "movie", "cinema", "theater", "game", "prime"],
-            "Bills & Utilities": ["electric", "water", "internet", "phone", "bill", "utility"],
-            "Healthcare": ["hospital", "pharmacy", "medical", "doctor", "clinic"],
-        }
+        # Prefer the category this user has filed the merchant under before
+        learned_category, learned_confidence = await lookup_merchant_category(db, user_id, parsed.merchant)
+        if learned_category in category_names:
+            parsed.category = learned_category
+            parsed.category_confidence = learned_confidence
+        else:
+            parsed.category = match_keyword_category(parsed.merchant, category_names)
+            if parsed.category:
+                parsed.category_confidence = CATEGORY_CONFIDENCE_WEIGHT
         
-        for category, keywords in category_keywords.items():
-            if category in category_names:
-                if any(keyword in merchant_lower for keyword in keywords):
-                    parsed.category = category
-                    parsed.confidence += 0.2
-                    break
+        parsed.confidence += parsed.category_confidence
     
     # Set default category if not found
-    if not parsed.category:
-        categories = await db.categories.find({"user_id": str(current_user["_id"])}).to_list(length=None)
-        if categories:
-            parsed.category = categories[0]["name"]
+    if not parsed.category and category_names:
+        parsed.category = category_names[0]
     
     # Add description
     if parsed.merchant:
         parsed.description = f"SMS transaction at {parsed.merchant}"
     
+    await store_parse(db, user_id, "sms", content_hash, parsed, date_defaulted=date_defaulted)
+    
     return parsed
 
 @router.post("/receipt", response_model=ParsedExpenseData)
@@ -138,13 +81,16 @@ async def parse_receipt(
 ):
     """Parse expense information from receipt image using OCR"""
     
-    # Validate file type
-    if not file.content_type.startswith('image/'):
-        raise HTTPException(status_code=400, detail="File must be an image")
+    # Stream the upload to a temp file, validating type and size as it arrives
+    upload = await spool_upload(file, "image", await get_max_upload_bytes(db))
+    user_id = str(current_user["_id"])
     
     try:
-        # Read image
-        contents = await file.read()
+        # Re-uploads of the same file reuse the earlier parse result, under the new file's name
+        cached = await get_cached_parse(db, user_id, "receipt", upload.sha256)
+        if cached:
+            cached.description = f"Receipt uploaded: {upload.filename}"
+            return cached
         
         # Initialize parsed data
         parsed = ParsedExpenseData(confidence=0.5)
@@ -154,12 +100,13 @@ async def parse_receipt(
         parsed.merchant = "Receipt Upload"
         parsed.amount = 0.0
         parsed.date = datetime.utcnow()
-        parsed.description = f"Receipt uploaded: {file.filename}"
         
         # Get default category
-        categories = await db.categories.find({"user_id": str(current_user["_id"])}).to_list(length=None)
-        if categories:
-            parsed.category = categories[0]["name"]
+        category = await db.categories.find_one({"user_id": user_id}, {"name": 1})
+        if category:
+            parsed.category = category["name"]
+        
+        await store_parse(db, user_id, "receipt", upload.sha256, parsed, date_defaulted=True)
         
         # TODO: Implement actual OCR processing
         # This would involve:
@@ -168,10 +115,13 @@ async def parse_receipt(
         # 3. Text parsing to extract merchant, amount, date, items
         # 4. Return structured data
         
+        parsed.description = f"Receipt uploaded: {upload.filename}"
         return parsed
         
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error processing image: {str(e)}")
+    finally:
+        upload.close()
 
 @router.post("/voice", response_model=ParsedExpenseData)
 async def parse_voice(
@@ -181,13 +131,16 @@ async def parse_voice(
 ):
     """Parse expense information from voice recording"""
     
-    # Validate file type
-    if not file.content_type.startswith('audio/'):
-        raise HTTPException(status_code=400, detail="File must be an audio file")
+    # Stream the upload to a temp file, validating type and size as it arrives
+    upload = await spool_upload(file, "audio", await get_max_upload_bytes(db))
+    user_id = str(current_user["_id"])
     
     try:
-        # Read audio file
-        contents = await file.read()
+        # Re-uploads of the same file reuse the earlier parse result, under the new file's name
+        cached = await get_cached_parse(db, user_id, "voice", upload.sha256)
+        if cached:
+            cached.description = f"Voice recording: {upload.filename}"
+            return cached
         
         # Initialize parsed data
         parsed = ParsedExpenseData(confidence=0.5)
@@ -197,12 +150,13 @@ async def parse_voice(
         parsed.merchant = "Voice Entry"
         parsed.amount = 0.0
         parsed.date = datetime.utcnow()
-        parsed.description = f"Voice recording: {file.filename}"
         
         # Get default category
-        categories = await db.categories.find({"user_id": str(current_user["_id"])}).to_list(length=None)
-        if categories:
-            parsed.category = categories[0]["name"]
+        category = await db.categories.find_one({"user_id": user_id}, {"name": 1})
+        if category:
+            parsed.category = category["name"]
+        
+        await store_parse(db, user_id, "voice", upload.sha256, parsed, date_defaulted=True)
         
         # TODO: Implement actual speech-to-text processing
         # This would involve:
@@ -211,7 +165,10 @@ async def parse_voice(
         # 3. Parse transcribed text to extract expense details
         # 4. Return structured data
         
+        parsed.description = f"Voice recording: {upload.filename}"
         return parsed
         
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error processing audio: {str(e)}")
+    finally:
+        upload.close()
@@ -0,0 +1,123 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List
+from bson import ObjectId
+from datetime import datetime
+from models import RecurringExpenseCreate, RecurringExpenseUpdate, RecurringExpenseResponse
+from auth import get_current_active_user
+from database import get_database
+from recurring import RECURRING_COLLECTION, next_occurrence, parse_cron, wake_recurring_scheduler
+from currency import resolve_currency
+
+router = APIRouter(prefix="/recurring", tags=["Recurring Expenses"])
+
+# Changing any of these moves the rule's next run
+SCHEDULE_FIELDS = {"every", "unit", "cron", "end_date", "active"}
+
+def serialize_rule(rule: dict) -> dict:
+    """Serialize recurring rule document"""
+    if rule:
+        rule["_id"] = str(rule["_id"])
+        return rule
+    return None
+
+def validate_schedule(rule: dict):
+    if rule.get("cron"):
+        try:
+            parse_cron(rule["cron"])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid cron expression: {e}")
+    if rule.get("end_date") and rule["end_date"] < rule["start_date"]:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+
+async def check_category(db, user_id: str, category: str):
+    if not await db.categories.find_one({"user_id": user_id, "name": category}, {"_id": 1}):
+        raise HTTPException(status_code=400, detail=f"Category '{category}' does not exist")
+
+async def find_rule(db, rule_id: str, user_id: str) -> dict:
+    try:
+        rule = await db[RECURRING_COLLECTION].find_one({"_id": ObjectId(rule_id), "user_id": user_id})
+    except:
+        raise HTTPException(status_code=400, detail="Invalid recurring expense ID")
+    if not rule:
+        raise HTTPException(status_code=404, detail="Recurring expense not found")
+    return rule
+
+@router.get("", response_model=List[RecurringExpenseResponse])
+async def get_recurring_expenses(
+    current_user: dict = Depends(get_current_active_user),
+    db = Depends(get_database)
+):
+    """Get all recurring expenses for current user, soonest first"""
+    cursor = db[RECURRING_COLLECTION].find({"user_id": str(current_user["_id"])}).sort("next_run", 1)
+    rules = await cursor.to_list(length=None)
+    return [serialize_rule(rule) for rule in rules]
+
+@router.post("", response_model=RecurringExpenseResponse, status_code=status.HTTP_201_CREATED)
+async def create_recurring_expense(
+    rule_data: RecurringExpenseCreate,
+    current_user: dict = Depends(get_current_active_user),
+    db = Depends(get_database)
+):
+    """Create a recurring expense
+
+    Occurrences from a start_date in the past are written on the next
+    scheduler pass, up to RECURRING_MAX_CATCH_UP per pass.
+    """
+    rule = rule_data.dict()
+    validate_schedule(rule)
+    await check_category(db, str(current_user["_id"]), rule["category"])
+
+    rule["currency"] = resolve_currency(rule["currency"], current_user)
+    rule["user_id"] = str(current_user["_id"])
+    rule["next_run"] = next_occurrence(rule)
+    rule["active"] = rule["next_run"] is not None
+    rule["last_run"] = None
+    rule["occurrences"] = 0
+    rule["created_at"] = datetime.utcnow()
+
+    result = await db[RECURRING_COLLECTION].insert_one(rule)
+    rule["_id"] = result.inserted_id
+    wake_recurring_scheduler()
+    return serialize_rule(rule)
+
+@router.put("/{rule_id}", response_model=RecurringExpenseResponse)
+async def update_recurring_expense(
+    rule_id: str,
+    rule_data: RecurringExpenseUpdate,
+    current_user: dict = Depends(get_current_active_user),
+    db = Depends(get_database)
+):
+    """Update a recurring expense; already written occurrences are left as they are"""
+    rule = await find_rule(db, rule_id, str(current_user["_id"]))
+    update_data = rule_data.dict(exclude_unset=True)
+    if "category" in update_data:
+        await check_category(db, str(current_user["_id"]), update_data["category"])
+    if "currency" in update_data:
+        update_data["currency"] = resolve_currency(update_data["currency"], current_user)
+
+    if SCHEDULE_FIELDS & update_data.keys():
+        updated = {**rule, **update_data}
+        validate_schedule(updated)
+        # A paused rule (next_run kept) skips what fell due while paused; one that
+        # ran out (no next_run) resumes after its last run when extended
+        paused = not rule["active"] and rule["next_run"] is not None
+        next_run = next_occurrence(updated, datetime.utcnow() if paused else rule["last_run"])
+        update_data["next_run"] = next_run
+        update_data["active"] = update_data.get("active", not paused) and next_run is not None
+
+    if update_data:
+        await db[RECURRING_COLLECTION].update_one({"_id": rule["_id"]}, {"$set": update_data})
+        rule.update(update_data)
+        wake_recurring_scheduler()
+    return serialize_rule(rule)
+
+@router.delete("/{rule_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_recurring_expense(
+    rule_id: str,
+    current_user: dict = Depends(get_current_active_user),
+    db = Depends(get_database)
+):
+    """Delete a recurring expense; the expenses it already wrote are kept"""
+    rule = await find_rule(db, rule_id, str(current_user["_id"]))
+    await db[RECURRING_COLLECTION].delete_one({"_id": rule["_id"]})
+    return None
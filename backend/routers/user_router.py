@@ -3,6 +3,8 @@ from bson import ObjectId
 from models import UserUpdate, UserChangePassword, UserResponse
 from auth import get_current_active_user, get_password_hash, verify_password, serialize_user
 from database import get_database
+from jobs import enqueue_job
+from currency import resolve_currency, user_currency
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
@@ -26,6 +28,8 @@ async def update_current_user_profile(
     
     # Update only provided fields
     update_fields = {k: v for k, v in update_data.dict(exclude_unset=True).items()}
+    if update_fields.get("currency"):
+        update_fields["currency"] = resolve_currency(update_fields["currency"], current_user)
     
     if update_fields:
         await db.users.update_one(
@@ -33,6 +37,10 @@ async def update_current_user_profile(
             {"$set": update_fields}
         )
     
+    # Category spend is kept in the user's currency, so re-express it
+    if update_fields.get("currency") and update_fields["currency"] != user_currency(current_user):
+        await enqueue_job(db, "category_totals.rebuild", {"user_id": str(current_user["_id"])}, priority=5)
+    
     updated_user = await db.users.find_one({"_id": current_user["_id"]})
     user_response = serialize_user(updated_user)
     del user_response["password"]
@@ -68,17 +76,10 @@ async def delete_current_user_account(
     current_user: dict = Depends(get_current_active_user),
     db = Depends(get_database)
 ):
-    """Delete current user account and all associated data"""
-    
-    user_id = str(current_user["_id"])
-    
-    # Delete user's expenses
-    await db.expenses.delete_many({"user_id": user_id})
-    
-    # Delete user's categories
-    await db.categories.delete_many({"user_id": user_id})
+    """Delete current user account now and its data in the background"""
     
-    # Delete user
+    # Queue the cleanup first, so a failure here leaves the account in place
+    await enqueue_job(db, "account.delete", {"user_id": str(current_user["_id"])}, priority=5)
     await db.users.delete_one({"_id": current_user["_id"]})
     
     return None
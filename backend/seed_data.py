@@ -0,0 +1,275 @@
+"""
+Script to generate realistic synthetic users, categories and expense histories
+Run this script from the backend directory:
+
+    python seed_data.py --users 10000 --years 3 --processes 4
+    python seed_data.py --drop
+
+Output is deterministic for a given --seed and --as-of date, whatever the
+number of processes. Seeded users are tagged "seeded": true and can all log
+in with the password below. Point MONGODB_URL at a local mongod: the script
+refuses remote servers unless given --allow-remote.
+"""
+
+import argparse
+import asyncio
+import math
+import multiprocessing
+import random
+import sys
+import time
+from bisect import bisect
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+from bson import ObjectId
+from database import create_mongo_client, is_local_mongodb
+from config import settings
+from auth import get_password_hash
+from budgets import SPEND_FIELD, category_totals
+from duplicates import expense_fingerprint
+from models import ExpenseSource, UserStatus
+from routers.auth_router import DEFAULT_CATEGORIES
+
+PASSWORD = "seed-password"
+
+# (merchant, category, lognormal mu, sigma), most popular first; popularity is Zipf-like
+MERCHANTS = [
+    ("Swiggy", "Food & Dining", 5.8, 0.5),
+    ("Uber", "Transportation", 5.5, 0.6),
+    ("Amazon", "Shopping", 7.0, 1.0),
+    ("Starbucks", "Food & Dining", 5.6, 0.3),
+    ("Zomato", "Food & Dining", 5.9, 0.5),
+    ("Flipkart", "Shopping", 7.2, 1.0),
+    ("Shell", "Transportation", 7.6, 0.4),
+    ("Airtel", "Bills & Utilities", 6.5, 0.3),
+    ("Netflix", "Entertainment", 6.3, 0.1),
+    ("BigBasket", "Shopping", 7.3, 0.6),
+    ("Ola", "Transportation", 5.4, 0.6),
+    ("Apollo Pharmacy", "Healthcare", 6.4, 0.8),
+    ("Spotify", "Entertainment", 4.8, 0.1),
+    ("Tata Power", "Bills & Utilities", 7.8, 0.4),
+    ("PVR Cinemas", "Entertainment", 6.6, 0.4),
+    ("Dominos Pizza", "Food & Dining", 6.2, 0.4),
+    ("IRCTC", "Travel", 7.4, 0.8),
+    ("Indigo Airlines", "Travel", 8.8, 0.5),
+    ("Coursera", "Education", 7.5, 0.5),
+    ("Practo Clinic", "Healthcare", 6.9, 0.5),
+    ("Jio Fiber", "Bills & Utilities", 6.9, 0.2),
+    ("Decathlon", "Shopping", 7.5, 0.8),
+    ("Cafe Coffee Day", "Food & Dining", 5.3, 0.3),
+    ("Metro Card Recharge", "Transportation", 5.9, 0.3),
+    ("Udemy", "Education", 6.2, 0.4),
+    ("Booking.com", "Travel", 8.5, 0.7),
+]
+MERCHANT_CUM_WEIGHTS = list(accumulate(1 / (rank + 1) ** 1.1 for rank in range(len(MERCHANTS))))
+
+SOURCES = [ExpenseSource.MANUAL.value, ExpenseSource.SMS.value, ExpenseSource.RECEIPT.value, ExpenseSource.VOICE.value]
+SOURCE_CUM_WEIGHTS = list(accumulate([40, 35, 15, 10]))  # manual, sms, receipt, voice
+
+STATUSES = [UserStatus.ACTIVE.value, UserStatus.INACTIVE.value, UserStatus.SUSPENDED.value]
+STATUS_CUM_WEIGHTS = list(accumulate([90, 7, 3]))
+
+FIRST_NAMES = ["Aarav", "Diya", "Ishaan", "Ananya", "Kabir", "Meera", "Rohan", "Saanvi", "Vikram", "Zara",
+               "Liam", "Olivia", "Noah", "Emma", "Arjun", "Priya", "Ethan", "Maya", "Dev", "Nisha"]
+LAST_NAMES = ["Sharma", "Patel", "Iyer", "Reddy", "Khan", "Gupta", "Nair", "Singh", "Das", "Mehta",
+              "Smith", "Brown", "Garcia", "Rao", "Joshi"]
+
+def user_object_id(seed: int, index: int, created_at: datetime) -> ObjectId:
+    """Deterministic ObjectId whose timestamp is the user's sign-up time (naive UTC)"""
+    timestamp = int(created_at.replace(tzinfo=timezone.utc).timestamp())
+    return ObjectId(f"{timestamp:08x}{seed & 0xffffffff:08x}{index:08x}")
+
+def generate_user(seed: int, index: int, as_of: datetime, years: float, monthly_rate: float, password_hash: str):
+    """One user with their categories and expense history"""
+    rng = random.Random(f"{seed}:{index}")
+    created_at = as_of - timedelta(days=rng.uniform(0, years * 365))
+    user_id = user_object_id(seed, index, created_at)
+    user_id_str = str(user_id)
+
+    status = STATUSES[bisect(STATUS_CUM_WEIGHTS, rng.random() * STATUS_CUM_WEIGHTS[-1])]
+    idle_days = rng.expovariate(1 / 3) if status == UserStatus.ACTIVE.value else rng.uniform(30, 365)
+    last_active = max(created_at, as_of - timedelta(days=idle_days))
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    user = {
+        "_id": user_id,
+        "name": name,
+        "email": f"seed-{seed}-{index}@seed.local",
+        "phone": None,
+        "role": "user",
+        "password": password_hash,
+        "status": status,
+        "created_at": created_at,
+        "last_active": last_active,
+        "avatar": None,
+        "seeded": True,
+    }
+
+    # Pareto-distributed activity: most users log a few expenses, some log hundreds a month
+    rate = min(monthly_rate * rng.paretovariate(1.6) / 2.7, monthly_rate * 40)
+    active_seconds = (last_active - created_at).total_seconds()
+    count = int(rate * active_seconds / (30 * 86400))
+
+    expenses = []
+    for _ in range(count):
+        merchant, category, mu, sigma = MERCHANTS[bisect(MERCHANT_CUM_WEIGHTS, rng.random() * MERCHANT_CUM_WEIGHTS[-1])]
+        amount = round(math.exp(rng.gauss(mu, sigma)), 2)
+        date = created_at + timedelta(seconds=rng.random() * active_seconds)
+        source = SOURCES[bisect(SOURCE_CUM_WEIGHTS, rng.random() * SOURCE_CUM_WEIGHTS[-1])]
+        expenses.append({
+            "user_id": user_id_str,
+            "merchant": merchant,
+            "amount": amount,
+            "category": category,
+            "date": date,
+            "description": None,
+            "source": source,
+            "fingerprint": expense_fingerprint(amount, date, merchant),
+            "created_at": date,
+            "updated_at": None,
+        })
+
+    totals = category_totals(expenses)
+    categories = [
+        {**category, "user_id": user_id_str, "created_at": created_at,
+         **totals.get(category["name"], {"count": 0, SPEND_FIELD: {}})}
+        for category in DEFAULT_CATEGORIES
+    ]
+    return user, categories, expenses
+
+async def seed_slice(args: dict, start: int, stop: int) -> dict:
+    """Generate and insert users [start, stop) with concurrent insert_many writers"""
+    client = create_mongo_client(maxPoolSize=args["concurrency"] + 2)
+    db = client[settings.DATABASE_NAME]
+    queue = asyncio.Queue(maxsize=args["concurrency"] * 2)
+    counts = {"users": 0, "categories": 0, "expenses": 0}
+
+    async def writer():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            collection, docs = item
+            await db[collection].insert_many(docs, ordered=False, bypass_document_validation=True)
+            counts[collection] += len(docs)
+
+    writers = [asyncio.create_task(writer()) for _ in range(args["concurrency"])]
+    buffers = {"users": [], "categories": [], "expenses": []}
+    try:
+        for index in range(start, stop):
+            user, categories, expenses = generate_user(
+                args["seed"], index, args["as_of"], args["years"], args["monthly_rate"], args["password_hash"]
+            )
+            buffers["users"].append(user)
+            buffers["categories"] += categories
+            buffers["expenses"] += expenses
+            for collection, docs in buffers.items():
+                if len(docs) >= args["batch_size"]:
+                    await queue.put((collection, docs))
+                    buffers[collection] = []
+            # Writers surface insert errors by finishing early
+            for task in writers:
+                if task.done():
+                    task.result()
+        for collection, docs in buffers.items():
+            if docs:
+                await queue.put((collection, docs))
+        for _ in writers:
+            await queue.put(None)
+        await asyncio.gather(*writers)
+    finally:
+        for task in writers:
+            task.cancel()
+        client.close()
+    return counts
+
+def run_slice(args: dict, start: int, stop: int) -> dict:
+    return asyncio.run(seed_slice(args, start, stop))
+
+async def drop_seeded(db) -> int:
+    """Delete every seeded user and their data"""
+    removed = 0
+    while True:
+        ids = [user["_id"] for user in await db.users.find({"seeded": True}, {"_id": 1}).limit(1000).to_list(length=1000)]
+        if not ids:
+            return removed
+        id_strings = [str(user_id) for user_id in ids]
+        await asyncio.gather(*[
+            db[collection].delete_many({"user_id": {"$in": id_strings}})
+            for collection in ("expenses", "categories", "merchant_categories", "parse_cache")
+        ])
+        await db.users.delete_many({"_id": {"$in": ids}})
+        removed += len(ids)
+
+async def drop():
+    client = create_mongo_client()
+    removed = await drop_seeded(client[settings.DATABASE_NAME])
+    client.close()
+    print(f"✓ Removed {removed} seeded user(s) and their data")
+
+def main():
+    """Main function"""
+    arg_parser = argparse.ArgumentParser(description="Seed synthetic users and expenses")
+    arg_parser.add_argument("--users", type=int, default=1000, help="number of users to generate")
+    arg_parser.add_argument("--years", type=float, default=3, help="length of the expense history")
+    arg_parser.add_argument("--monthly-rate", type=float, default=30, help="median-ish expenses per user per month")
+    arg_parser.add_argument("--seed", type=int, default=1, help="random seed")
+    arg_parser.add_argument("--as-of", default=None, help="history end date, YYYY-MM-DD (default: today)")
+    arg_parser.add_argument("--batch-size", type=int, default=10000, help="documents per insert_many")
+    arg_parser.add_argument("--concurrency", type=int, default=8, help="concurrent insert_many calls per process")
+    arg_parser.add_argument("--processes", type=int, default=1, help="generator processes")
+    arg_parser.add_argument("--drop", action="store_true", help="delete previously seeded data and exit")
+    arg_parser.add_argument("--allow-remote", action="store_true", help="write even if MONGODB_URL is not local")
+    args = arg_parser.parse_args()
+
+    print("=" * 50)
+    print("Money Management System - Seed Data")
+    print("=" * 50)
+
+    if not is_local_mongodb(settings.MONGODB_URL) and not args.allow_remote:
+        print("\nError: MONGODB_URL is not a local server; use --allow-remote if you really mean it")
+        sys.exit(2)
+
+    if args.drop:
+        asyncio.run(drop())
+        return
+
+    as_of = datetime.strptime(args.as_of, "%Y-%m-%d") if args.as_of else datetime.utcnow().replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    slice_args = {
+        "seed": args.seed,
+        "as_of": as_of,
+        "years": args.years,
+        "monthly_rate": args.monthly_rate,
+        "batch_size": args.batch_size,
+        "concurrency": args.concurrency,
+        # bcrypt is slow on purpose; every seeded user shares one hash
+        "password_hash": get_password_hash(PASSWORD),
+    }
+
+    processes = max(1, min(args.processes, args.users))
+    bounds = [args.users * i // processes for i in range(processes + 1)]
+    print(f"\nSeeding {args.users} users ({args.years:g} years of history) with {processes} process(es)...")
+    started = time.monotonic()
+    try:
+        if processes == 1:
+            results = [run_slice(slice_args, 0, args.users)]
+        else:
+            with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+                futures = [pool.submit(run_slice, slice_args, bounds[i], bounds[i + 1]) for i in range(processes)]
+                results = [future.result() for future in futures]
+    except Exception as e:
+        print(f"\nError: {str(e)}")
+        sys.exit(1)
+    elapsed = time.monotonic() - started
+
+    totals = {key: sum(result[key] for result in results) for key in results[0]}
+    documents = sum(totals.values())
+    print(f"✓ Inserted {totals['users']} users, {totals['categories']} categories, {totals['expenses']} expenses")
+    print(f"✓ {documents} documents in {elapsed:.1f}s ({documents / elapsed * 60:,.0f} documents/minute)")
+    print(f"\nSeeded users log in as seed-{args.seed}-<n>@seed.local with password '{PASSWORD}'")
+    print("Run python rebuild_merchant_index.py to learn merchant categories from the new expenses")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Multi-process launcher for the Money Management System API
+Run this script from the backend directory: python server.py [--workers N]
+
+The parent process binds the listening socket once and spawns N worker
+processes that share it. Every worker imports the app fresh, so each has
+its own Motor client and in-memory caches. The parent then supervises
+them:
+
+- a worker only counts as ready once its lifespan startup (database
+  connection and warm-up) has finished
+- workers exit after WORKER_MAX_REQUESTS requests (plus jitter) and are
+  replaced, which bounds memory growth
+- SIGHUP performs a rolling restart: each worker is replaced by a new,
+  ready one before it is stopped
+- SIGINT/SIGTERM stop all workers gracefully
+- missing indexes are built once by the parent, in the background, rather
+  than by every worker
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import sys
+import threading
+import time
+import uvicorn
+from config import settings
+from database import create_mongo_client
+from indexes import ensure_indexes
+
+logger = logging.getLogger("server")
+
+# Respawning a worker that keeps dying immediately is delayed by this much
+CRASH_BACKOFF_SECONDS = 1.0
+MAX_CRASH_BACKOFF_SECONDS = 30.0
+
+async def build_indexes():
+    """Build missing indexes with a short-lived client of our own"""
+    client = create_mongo_client(minPoolSize=0)
+    try:
+        await ensure_indexes(client[settings.DATABASE_NAME])
+    finally:
+        client.close()
+
+class ReadyServer(uvicorn.Server):
+    """uvicorn server that signals the parent once startup has completed
+
+    uvicorn only starts serving after the lifespan startup (database
+    connection and warm-up) succeeded; if it failed, should_exit is set and
+    the parent is never told the worker is ready.
+    """
+
+    def __init__(self, config, ready_conn):
+        super().__init__(config)
+        self.ready_conn = ready_conn
+
+    async def startup(self, sockets=None):
+        await super().startup(sockets=sockets)
+        if not self.should_exit:
+            self.ready_conn.send(True)
+        self.ready_conn.close()
+
+def run_worker(config, sockets, ready_conn):
+    """Entry point of a worker process"""
+    # Reloads are coordinated by the parent, a terminal hangup must not kill workers
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    config.configure_logging()
+    ReadyServer(config, ready_conn).run(sockets=sockets)
+
+class Worker:
+    def __init__(self, process, ready_conn):
+        self.process = process
+        self.ready_conn = ready_conn
+        self.ready = False
+        self.started_at = time.monotonic()
+
+    def poll_ready(self, timeout: float = 0) -> bool:
+        if not self.ready:
+            try:
+                if self.ready_conn.poll(timeout):
+                    self.ready = bool(self.ready_conn.recv())
+            except (EOFError, OSError):
+                pass
+        return self.ready
+
+class Supervisor:
+    """Spawns, recycles and restarts worker processes sharing one socket"""
+
+    def __init__(self, app: str, host: str, port: int, workers: int):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.num_workers = workers
+        self.context = multiprocessing.get_context("spawn")
+        self.sock = None
+        self.workers = []
+        self.should_exit = False
+        self.should_reload = False
+        self.crash_backoff = CRASH_BACKOFF_SECONDS
+        # When each slot of a worker that exited gets its replacement (monotonic time)
+        self.respawn_at = []
+
+    def make_config(self):
+        max_requests = None
+        if settings.WORKER_MAX_REQUESTS > 0:
+            # Jitter keeps workers from all recycling at the same moment
+            max_requests = settings.WORKER_MAX_REQUESTS + random.randint(0, settings.WORKER_MAX_REQUESTS_JITTER)
+        return uvicorn.Config(
+            self.app,
+            host=self.host,
+            port=self.port,
+            limit_max_requests=max_requests,
+            timeout_graceful_shutdown=settings.WORKER_GRACEFUL_TIMEOUT,
+        )
+
+    def bind(self):
+        self.sock = socket.socket(socket.AF_INET6 if ":" in self.host else socket.AF_INET)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen(2048)
+        self.sock.set_inheritable(True)
+
+    def start_index_build(self):
+        if not settings.MONGODB_AUTO_CREATE_INDEXES:
+            return
+        # Workers inherit the environment, so they skip their own build
+        os.environ["MONGODB_AUTO_CREATE_INDEXES"] = "false"
+        threading.Thread(target=asyncio.run, args=(build_indexes(),), name="index-build", daemon=True).start()
+
+    def spawn(self) -> Worker:
+        ready_conn, child_conn = self.context.Pipe(duplex=False)
+        process = self.context.Process(
+            target=run_worker,
+            kwargs={"config": self.make_config(), "sockets": [self.sock], "ready_conn": child_conn},
+            daemon=False,
+        )
+        process.start()
+        child_conn.close()
+        logger.info(f"Spawned worker [{process.pid}]")
+        return Worker(process, ready_conn)
+
+    def wait_ready(self, worker: Worker) -> bool:
+        deadline = time.monotonic() + settings.WORKER_READY_TIMEOUT
+        while time.monotonic() < deadline:
+            if worker.poll_ready(timeout=0.2):
+                return True
+            if not worker.process.is_alive() or self.should_exit:
+                return False
+        return False
+
+    def stop(self, worker: Worker):
+        if worker.process.is_alive():
+            worker.process.terminate()
+        worker.process.join(settings.WORKER_GRACEFUL_TIMEOUT + 5)
+        if worker.process.is_alive():
+            logger.warning(f"Worker [{worker.process.pid}] did not stop in time, killing it")
+            worker.process.kill()
+            worker.process.join()
+        worker.ready_conn.close()
+
+    def handle_exit(self, sig, frame):
+        self.should_exit = True
+
+    def handle_reload(self, sig, frame):
+        self.should_reload = True
+
+    def rolling_restart(self):
+        logger.info("Rolling restart of workers")
+        for old in list(self.workers):
+            if self.should_exit:
+                return
+            new = self.spawn()
+            if not self.wait_ready(new):
+                logger.error("Replacement worker failed to become ready, aborting rolling restart")
+                self.stop(new)
+                return
+            self.workers.append(new)
+            self.workers.remove(old)
+            self.stop(old)
+
+    def reap(self):
+        """Replace workers that exited (recycled after max requests, or crashed)
+
+        Never sleeps: a crashed worker's slot is refilled on a later tick once
+        its backoff has passed, so signals, reloads and other slots are
+        handled in the meantime.
+        """
+        crashed = False
+        for worker in list(self.workers):
+            if worker.process.is_alive():
+                continue
+            self.workers.remove(worker)
+            worker.process.join()
+            worker.poll_ready()
+            worker.ready_conn.close()
+            uptime = time.monotonic() - worker.started_at
+            if worker.ready and worker.process.exitcode == 0:
+                # Clean exit after serving WORKER_MAX_REQUESTS
+                logger.info(f"Worker [{worker.process.pid}] recycled after {uptime:.0f}s, replacing it")
+                self.crash_backoff = CRASH_BACKOFF_SECONDS
+                self.respawn_at.append(time.monotonic())
+            else:
+                logger.warning(
+                    f"Worker [{worker.process.pid}] exited early with code {worker.process.exitcode}, "
+                    f"retrying in {self.crash_backoff:.0f}s"
+                )
+                self.respawn_at.append(time.monotonic() + self.crash_backoff)
+                crashed = True
+        if crashed:
+            # Once per tick, so workers crashing together share one delay
+            self.crash_backoff = min(self.crash_backoff * 2, MAX_CRASH_BACKOFF_SECONDS)
+
+        now = time.monotonic()
+        due = [at for at in self.respawn_at if at <= now]
+        self.respawn_at = [at for at in self.respawn_at if at > now]
+        if not self.should_exit:
+            for _ in due:
+                self.workers.append(self.spawn())
+
+    def run(self):
+        self.bind()
+        self.start_index_build()
+        logger.info(f"Listening on http://{self.host}:{self.port} with {self.num_workers} workers [{os.getpid()}]")
+
+        signal.signal(signal.SIGINT, self.handle_exit)
+        signal.signal(signal.SIGTERM, self.handle_exit)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self.handle_reload)
+
+        for _ in range(self.num_workers):
+            self.workers.append(self.spawn())
+        ready = 0
+        for worker in self.workers:
+            if self.wait_ready(worker):
+                logger.info(f"Worker [{worker.process.pid}] ready")
+                ready += 1
+        if not ready and not self.should_exit:
+            logger.error(f"No worker became ready within {settings.WORKER_READY_TIMEOUT}s, giving up")
+            self.should_exit = True
+
+        while not self.should_exit:
+            if self.should_reload:
+                self.should_reload = False
+                self.rolling_restart()
+            self.reap()
+            time.sleep(0.5)
+
+        logger.info("Stopping workers...")
+        for worker in self.workers:
+            if worker.process.is_alive():
+                worker.process.terminate()
+        for worker in self.workers:
+            self.stop(worker)
+        self.sock.close()
+        logger.info("All workers stopped")
+        return 0 if ready else 1
+
+def default_worker_count() -> int:
+    """Configured worker count, or one worker per CPU"""
+    return settings.WORKERS if settings.WORKERS > 0 else (os.cpu_count() or 1)
+
+def run(workers: int = None) -> int:
+    """Start the supervisor; returns the exit status (1 when no worker ever became ready)"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    return Supervisor("main:app", settings.HOST, settings.PORT, workers or default_worker_count()).run()
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Run the API with multiple worker processes")
+    arg_parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: CPU count)")
+    args = arg_parser.parse_args()
+    sys.exit(run(args.workers))
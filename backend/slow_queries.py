@@ -0,0 +1,225 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+from pymongo import monitoring
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_COLLECTION = "slow_queries"
+
+# Commands worth recording, and the field holding their filter
+FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "delete": "deletes",
+    "update": "updates",
+    "findAndModify": "query",
+    "aggregate": "pipeline",
+}
+
+# Parts of a driver command that can't be sent back inside explain
+DRIVER_FIELDS = {"lsid", "txnNumber", "autocommit", "writeConcern", "readConcern"}
+
+# Pending records waiting for explain; beyond this they're dropped
+QUEUE_SIZE = 100
+
+def redact(value):
+    """Replace every literal in a filter with "?" while keeping its shape"""
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, list):
+        # Lists of literals ($in) collapse to one placeholder; pipelines and $or keep their structure
+        if value and all(isinstance(item, dict) for item in value):
+            return [redact(item) for item in value]
+        return ["?"] if value else []
+    return "?"
+
+def filter_shape(command_name: str, command: dict):
+    field = FILTER_FIELDS[command_name]
+    value = command.get(field, {})
+    if command_name in ("update", "delete"):
+        # One filter per statement; the first describes the shape well enough
+        value = value[0].get("q", {}) if value else {}
+    return redact(value)
+
+def summarize_plan(explain: dict) -> dict:
+    """The bits of an executionStats explain worth keeping"""
+    stats = explain.get("executionStats", {})
+    planner = explain.get("queryPlanner", {})
+    # aggregate explains nest the find-layer explain in the first stage
+    if not planner and explain.get("stages"):
+        cursor_stage = explain["stages"][0].get("$cursor", {})
+        planner = cursor_stage.get("queryPlanner", {})
+        stats = cursor_stage.get("executionStats", stats)
+
+    stages, indexes = [], []
+    plan = planner.get("winningPlan", {})
+    plan = plan.get("queryPlan", plan)  # slot-based engine wraps the plan
+    while plan:
+        stages.append(plan.get("stage"))
+        if plan.get("indexName"):
+            indexes.append(plan["indexName"])
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+
+    return {
+        "stages": stages,
+        "indexes": indexes,
+        "collectionScan": "COLLSCAN" in stages,
+        "keysExamined": stats.get("totalKeysExamined"),
+        "docsExamined": stats.get("totalDocsExamined"),
+        "docsReturned": stats.get("nReturned"),
+        "executionTimeMs": stats.get("executionTimeMillis"),
+    }
+
+async def explain_command(db, command: dict) -> dict:
+    """Run explain with executionStats on a command captured from the driver"""
+    explained = {key: value for key, value in command.items() if key not in DRIVER_FIELDS and not key.startswith("$")}
+    return await db.command("explain", explained, verbosity="executionStats")
+
+def _docs_returned(command_name: str, reply: dict) -> Optional[int]:
+    if "cursor" in reply:
+        return len(reply["cursor"].get("firstBatch", []))
+    if command_name in ("count", "delete", "update"):
+        return reply.get("n")
+    return None
+
+class SlowQueryLog(monitoring.CommandListener):
+    """Record commands slower than SLOW_QUERY_THRESHOLD_MS with an explain summary
+
+    The driver calls the listener synchronously on its own threads, so it
+    only captures the command and hands it to a background task on the
+    event loop. That task runs explain (at most once per filter shape per
+    SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS) and writes to a capped collection.
+    """
+
+    def __init__(self):
+        self._started = {}
+        self._loop: asyncio.AbstractEventLoop = None
+        self._queue: asyncio.Queue = None
+        self._task: asyncio.Task = None
+        self._explained_at = {}
+
+    def started(self, event):
+        if self._loop is None or event.command_name not in FILTER_FIELDS:
+            return
+        collection = event.command.get(event.command_name)
+        if collection == SLOW_QUERY_COLLECTION or not isinstance(collection, str):
+            return
+        self._started[(event.connection_id, event.request_id)] = (event.database_name, collection, event.command)
+
+    def succeeded(self, event):
+        started = self._started.pop((event.connection_id, event.request_id), None)
+        if started is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        if duration_ms < settings.SLOW_QUERY_THRESHOLD_MS:
+            return
+        database_name, collection, command = started
+        record = {
+            "collection": collection,
+            "command": event.command_name,
+            "shape": json.dumps(filter_shape(event.command_name, command), sort_keys=True),
+            "durationMs": round(duration_ms, 2),
+            "docsReturned": _docs_returned(event.command_name, event.reply),
+            "at": datetime.utcnow(),
+        }
+        try:
+            self._loop.call_soon_threadsafe(self._enqueue, database_name, command, record)
+        except RuntimeError:
+            pass  # loop already closed
+
+    def failed(self, event):
+        self._started.pop((event.connection_id, event.request_id), None)
+
+    def _enqueue(self, database_name, command, record):
+        try:
+            self._queue.put_nowait((database_name, command, record))
+        except asyncio.QueueFull:
+            logger.debug("Slow query queue full, dropping record")
+
+    def start(self, client):
+        """Start recording; call from the event loop once the client is connected"""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._task = asyncio.create_task(self._run(client))
+
+    def stop(self):
+        self._loop = None
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+    async def _ensure_collection(self, db):
+        if SLOW_QUERY_COLLECTION not in await db.list_collection_names(filter={"name": SLOW_QUERY_COLLECTION}):
+            await db.create_collection(
+                SLOW_QUERY_COLLECTION, capped=True, size=settings.SLOW_QUERY_LOG_SIZE_MB * 1024 * 1024
+            )
+
+    async def _explain(self, db, command: dict) -> Optional[dict]:
+        try:
+            return summarize_plan(await explain_command(db, command))
+        except Exception as e:
+            logger.debug(f"Explain of slow {next(iter(command))} failed: {e}")
+            return None
+
+    async def _run(self, client):
+        db = client[settings.DATABASE_NAME]
+        try:
+            await self._ensure_collection(db)
+        except Exception as e:
+            logger.warning(f"Could not create slow query log collection: {e}")
+        while True:
+            database_name, command, record = await self._queue.get()
+            try:
+                key = (record["collection"], record["command"], record["shape"])
+                now = time.monotonic()
+                if now - self._explained_at.get(key, float("-inf")) >= settings.SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS:
+                    self._explained_at[key] = now
+                    record["plan"] = await self._explain(client[database_name], command)
+                    if record["plan"]:
+                        record["docsExamined"] = record["plan"]["docsExamined"]
+                await db[SLOW_QUERY_COLLECTION].insert_one(record)
+            except Exception as e:
+                logger.warning(f"Could not record slow query: {e}")
+
+slow_query_log = SlowQueryLog()
+
+async def top_slow_queries(db, hours: int = 24, limit: int = 20) -> List[dict]:
+    """Slow operations grouped by filter shape, worst total time first"""
+    pipeline = [
+        {"$match": {"at": {"$gte": datetime.utcnow() - timedelta(hours=hours)}}},
+        {"$sort": {"at": -1}},
+        {"$group": {
+            "_id": {"collection": "$collection", "command": "$command", "shape": "$shape"},
+            "count": {"$sum": 1},
+            "totalMs": {"$sum": "$durationMs"},
+            "avgMs": {"$avg": "$durationMs"},
+            "maxMs": {"$max": "$durationMs"},
+            "maxDocsExamined": {"$max": "$docsExamined"},
+            "avgDocsReturned": {"$avg": "$docsReturned"},
+            "lastSeen": {"$first": "$at"},
+            "plans": {"$push": "$plan"},
+        }},
+        {"$sort": {"totalMs": -1}},
+        {"$limit": limit},
+    ]
+    groups = await db[SLOW_QUERY_COLLECTION].aggregate(pipeline).to_list(length=None)
+    return [
+        {
+            **group["_id"],
+            "count": group["count"],
+            "totalMs": round(group["totalMs"], 2),
+            "avgMs": round(group["avgMs"], 2),
+            "maxMs": group["maxMs"],
+            "maxDocsExamined": group["maxDocsExamined"],
+            "avgDocsReturned": group["avgDocsReturned"],
+            "lastSeen": group["lastSeen"],
+            # Most recent explain for this shape
+            "plan": next((plan for plan in group["plans"] if plan), None),
+        }
+        for group in groups
+    ]
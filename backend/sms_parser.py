@@ -0,0 +1,99 @@
+import re
+from datetime import datetime
+from typing import List, Optional
+from models import ParsedExpenseData
+
+# Common patterns for SMS transaction notifications
+# Pattern 1: "Spent Rs.500 at Starbucks on 12/12/2024"
+# Pattern 2: "Rs 500 debited from your account for AMAZON on 12-Dec-2024"
+# Pattern 3: "Transaction of $25.50 at UBER"
+
+# Amount (supports $, Rs, INR, USD formats), with the currency marker when there is one
+AMOUNT_PATTERNS = [
+    re.compile(r'(?P<currency>Rs\.?|INR|₹)\s*(?P<amount>[0-9,]+\.?[0-9]*)', re.IGNORECASE),
+    re.compile(r'(?P<currency>\$|€|£)\s*(?P<amount>[0-9,]+\.?[0-9]*)', re.IGNORECASE),
+    re.compile(r'(?P<currency>USD|EUR|GBP)\s*(?P<amount>[0-9,]+\.?[0-9]*)', re.IGNORECASE),
+    re.compile(r'amount[:\s]+(?P<currency>Rs\.?|INR|₹|\$)?\s*(?P<amount>[0-9,]+\.?[0-9]*)', re.IGNORECASE),
+]
+
+CURRENCY_MARKERS = {"rs": "INR", "rs.": "INR", "inr": "INR", "₹": "INR", "$": "USD", "usd": "USD",
+                    "€": "EUR", "eur": "EUR", "£": "GBP", "gbp": "GBP"}
+
+MERCHANT_PATTERNS = [
+    re.compile(r'(?:at|to|for)\s+([A-Z][A-Za-z0-9\s&]+?)(?:\s+on|\s+dated|\s+dated|\.|$)', re.IGNORECASE),
+    re.compile(r'(?:merchant|vendor)[:\s]+([A-Za-z0-9\s&]+)', re.IGNORECASE),
+]
+
+DATE_PATTERNS = [
+    re.compile(r'(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})', re.IGNORECASE),
+    re.compile(r'(\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{2,4})', re.IGNORECASE),
+    re.compile(r'(?:on|dated)\s+(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})', re.IGNORECASE),
+]
+
+DATE_FORMATS = ['%d/%m/%Y', '%d-%m-%Y', '%d/%m/%y', '%d-%m-%y', '%d %b %Y', '%d %B %Y']
+
+# Default category mappings
+CATEGORY_KEYWORDS = {
+    "Food & Dining": ["restaurant", "cafe", "coffee", "starbucks", "mcdonald", "pizza", "food", "swiggy", "zomato", "dunkin"],
+    "Transportation": ["uber", "lyft", "taxi", "gas", "fuel", "petrol", "metro", "train", "bus"],
+    "Shopping": ["amazon", "flipkart", "walmart", "target", "mall", "store", "shop"],
+    "Entertainment": ["netflix", "spotify", "movie", "cinema", "theater", "game", "prime"],
+    "Bills & Utilities": ["electric", "water", "internet", "phone", "bill", "utility"],
+    "Healthcare": ["hospital", "pharmacy", "medical", "doctor", "clinic"],
+}
+
+def parse_sms_fields(text: str) -> ParsedExpenseData:
+    """Extract amount, merchant and date from SMS text
+
+    Pure and synchronous so it can be benchmarked offline. The date is left
+    as None when the message doesn't contain one.
+    """
+    parsed = ParsedExpenseData(confidence=0.0)
+
+    for pattern in AMOUNT_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            amount_str = match.group("amount").replace(',', '')
+            try:
+                parsed.amount = float(amount_str)
+                parsed.confidence += 0.3
+                if match.group("currency"):
+                    parsed.currency = CURRENCY_MARKERS[match.group("currency").lower()]
+                break
+            except ValueError:
+                continue
+
+    for pattern in MERCHANT_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            # Clean up merchant name
+            merchant = re.sub(r'\s+', ' ', match.group(1).strip())
+            if len(merchant) > 3:
+                parsed.merchant = merchant
+                parsed.confidence += 0.3
+                break
+
+    for pattern in DATE_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            date_str = match.group(1)
+            for fmt in DATE_FORMATS:
+                try:
+                    parsed.date = datetime.strptime(date_str, fmt)
+                    parsed.confidence += 0.2
+                    break
+                except ValueError:
+                    continue
+            if parsed.date:
+                break
+
+    return parsed
+
+def match_keyword_category(merchant: str, category_names: List[str]) -> Optional[str]:
+    """Pick one of the user's categories from keywords in the merchant name"""
+    merchant_lower = merchant.lower()
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        if category in category_names:
+            if any(keyword in merchant_lower for keyword in keywords):
+                return category
+    return None
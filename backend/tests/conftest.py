@@ -0,0 +1,16 @@
+import os
+import sys
+import pytest
+
+# Tests run from the repository or backend directory without a .env file
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_mongo import FakeDB
+
+@pytest.fixture
+def db():
+    """An empty in-memory database; test modules override this to tweak it"""
+    return FakeDB()
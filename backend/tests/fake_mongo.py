@@ -0,0 +1,403 @@
+"""Minimal in-memory stand-in for the Motor collections used by the tests
+
+Only the query and update operators the backend actually uses are supported.
+Every call counts as one round trip in the current request's db_stats, the
+way the command listener counts commands against a real server.
+"""
+
+import copy
+import re
+from bson import ObjectId
+from pymongo import UpdateOne, InsertOne, DeleteMany, DeleteOne, ReplaceOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from db_stats import current_db_stats
+
+def _get(doc, path):
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+def _candidates(value, parts):
+    """Values a dotted path reaches, stepping into arrays the way MongoDB does"""
+    if not parts:
+        return [value]
+    if isinstance(value, list):
+        return [found for item in value for found in _candidates(item, parts)] or [None]
+    if not isinstance(value, dict) or parts[0] not in value:
+        return [None]
+    return _candidates(value[parts[0]], parts[1:])
+
+def _matches_value(value, condition):
+    if isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition):
+        for op, arg in condition.items():
+            if op == "$in" and value not in arg:
+                return False
+            if op == "$nin" and value in arg:
+                return False
+            if op == "$ne" and value == arg:
+                return False
+            if op == "$exists" and (value is not None) != arg:
+                return False
+            if op == "$regex":
+                flags = re.IGNORECASE if "i" in condition.get("$options", "") else 0
+                if not isinstance(value, str) or not re.search(arg, value, flags):
+                    return False
+            if op in ("$gt", "$gte", "$lt", "$lte"):
+                if value is None:
+                    return False
+                if op == "$gt" and not value > arg:
+                    return False
+                if op == "$gte" and not value >= arg:
+                    return False
+                if op == "$lt" and not value < arg:
+                    return False
+                if op == "$lte" and not value <= arg:
+                    return False
+        return True
+    return value == condition
+
+def matches(doc, query):
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, sub) for sub in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, sub) for sub in condition):
+                return False
+        elif not any(_matches_value(value, condition) for value in _candidates(doc, key.split("."))):
+            return False
+    return True
+
+def _set(doc, path, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+def _set_filtered(doc, path, value, array_filters):
+    """$set through one "$[name]" positional filter, e.g. expenses.$[e].category"""
+    head, _, rest = path.partition(".$[")
+    name, _, field = rest.partition("].")
+    conditions = next(f for f in array_filters if all(key.startswith(name + ".") for key in f))
+    conditions = {key[len(name) + 1:]: value for key, value in conditions.items()}
+    for element in _get(doc, head) or []:
+        if matches(element, conditions):
+            _set(element, field, value)
+
+def apply_update(doc, update, inserting=False, array_filters=None):
+    for path, value in update.get("$set", {}).items():
+        if ".$[" in path:
+            _set_filtered(doc, path, value, array_filters)
+        else:
+            _set(doc, path, value)
+    if inserting:
+        for path, value in update.get("$setOnInsert", {}).items():
+            _set(doc, path, value)
+    for path, value in update.get("$inc", {}).items():
+        _set(doc, path, (_get(doc, path) or 0) + value)
+    for path, value in update.get("$min", {}).items():
+        current = _get(doc, path)
+        if current is None or value < current:
+            _set(doc, path, value)
+    for path, value in update.get("$max", {}).items():
+        current = _get(doc, path)
+        if current is None or value > current:
+            _set(doc, path, value)
+    for path, value in update.get("$push", {}).items():
+        items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+        _set(doc, path, (_get(doc, path) or []) + copy.deepcopy(items))
+    for path, condition in update.get("$pull", {}).items():
+        _set(doc, path, [item for item in _get(doc, path) or [] if not (
+            matches(item, condition) if isinstance(condition, dict) and isinstance(item, dict) else item == condition
+        )])
+    for path in update.get("$unset", {}):
+        parts = path.split(".")
+        target = _get(doc, ".".join(parts[:-1])) if len(parts) > 1 else doc
+        if isinstance(target, dict):
+            target.pop(parts[-1], None)
+
+def _evaluate(doc, expression):
+    """The aggregation expressions the backend uses: "$path", $mergeObjects and literal objects"""
+    if isinstance(expression, str) and expression.startswith("$"):
+        return copy.deepcopy(_get(doc, expression[1:]))
+    if isinstance(expression, dict) and "$mergeObjects" in expression:
+        merged = {}
+        for part in expression["$mergeObjects"]:
+            merged.update(_evaluate(doc, part) or {})
+        return merged
+    if isinstance(expression, dict):
+        return {key: _evaluate(doc, value) for key, value in expression.items()}
+    return expression
+
+class Result:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction=1):
+        keys = key if isinstance(key, list) else [(key, direction)]
+        for field, order in reversed(keys):
+            self.docs.sort(key=lambda d: (_get(d, field) is not None, _get(d, field)), reverse=order < 0)
+        return self
+
+    def skip(self, n):
+        self.docs = self.docs[n:]
+        return self
+
+    def limit(self, n):
+        if n:
+            self.docs = self.docs[:n]
+        return self
+
+    def hint(self, index):
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    async def to_list(self, length=None):
+        return self.docs if length is None else self.docs[:length]
+
+    def __aiter__(self):
+        self._iter = iter(self.docs)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+class FakeCollection:
+    def __init__(self, docs=None, name=""):
+        self.name = name
+        self.docs = []
+        # Field tuples kept unique among documents that have all of them, like a partial unique index
+        self.unique = []
+        for doc in docs or []:
+            self._insert(doc)
+
+    def _record(self, command_name):
+        stats = current_db_stats.get()
+        if stats is not None:
+            stats.record(command_name, self.name, 0.0)
+
+    def _insert(self, doc):
+        doc = copy.deepcopy(doc)
+        doc.setdefault("_id", ObjectId())
+        if any(existing["_id"] == doc["_id"] for existing in self.docs):
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name}", 11000)
+        self._check_unique(doc)
+        self.docs.append(doc)
+        return doc["_id"]
+
+    def _check_unique(self, doc):
+        for fields in self.unique:
+            if all(field in doc for field in fields) and any(
+                existing["_id"] != doc["_id"] and all(existing.get(field) == doc[field] for field in fields)
+                for existing in self.docs
+            ):
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name}", 11000)
+
+    def _find(self, query):
+        return [copy.deepcopy(d) for d in self.docs if matches(d, query or {})]
+
+    def find(self, query=None, projection=None):
+        self._record("find")
+        return FakeCursor(self._find(query))
+
+    async def find_one(self, query=None, projection=None, sort=None):
+        self._record("find")
+        docs = self._find(query)
+        if sort:
+            docs = FakeCursor(docs).sort(sort).docs
+        return docs[0] if docs else None
+
+    async def count_documents(self, query):
+        self._record("aggregate")
+        return len(self._find(query))
+
+    def aggregate(self, pipeline, **kwargs):
+        """$match, $unwind, $replaceRoot, $group with $sum accumulators, $sort and $limit"""
+        self._record("aggregate")
+        docs = self._find({})
+        for stage in pipeline:
+            if "$match" in stage:
+                docs = [d for d in docs if matches(d, stage["$match"])]
+            elif "$unwind" in stage:
+                path = stage["$unwind"][1:]
+                docs = [{**doc, path: item} for doc in docs for item in _get(doc, path) or []]
+            elif "$replaceRoot" in stage:
+                docs = [_evaluate(doc, stage["$replaceRoot"]["newRoot"]) for doc in docs]
+            elif "$group" in stage:
+                spec = stage["$group"]
+                groups = {}
+                for doc in docs:
+                    key = _evaluate(doc, spec["_id"])
+                    if isinstance(key, dict):
+                        # Like the server, fields of a compound key that are missing are left out
+                        key = {name: value for name, value in key.items() if value is not None}
+                    group = groups.setdefault(repr(key), {"_id": key, **{field: 0 for field in spec if field != "_id"}})
+                    for field, accumulator in spec.items():
+                        if field != "_id":
+                            value = accumulator["$sum"]
+                            group[field] += (_get(doc, value[1:]) or 0) if isinstance(value, str) else value
+                docs = list(groups.values())
+            elif "$sort" in stage:
+                docs = FakeCursor(docs).sort(list(stage["$sort"].items())).docs
+            elif "$limit" in stage:
+                docs = docs[:stage["$limit"]]
+        return FakeCursor(docs)
+
+    async def insert_one(self, doc):
+        self._record("insert")
+        inserted_id = self._insert(doc)
+        doc.setdefault("_id", inserted_id)
+        return Result(inserted_id=inserted_id)
+
+    async def insert_many(self, docs, ordered=True, **kwargs):
+        self._record("insert")
+        ids, errors = [], []
+        for index, doc in enumerate(docs):
+            try:
+                ids.append(self._insert(doc))
+            except DuplicateKeyError as e:
+                errors.append({"index": index, "code": e.code, "errmsg": str(e)})
+                if ordered:
+                    break
+                continue
+            doc.setdefault("_id", ids[-1])
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(ids)})
+        return Result(inserted_ids=ids)
+
+    def _update(self, query, update, upsert=False, multi=False, array_filters=None):
+        matched = 0
+        for doc in self.docs:
+            if matches(doc, query):
+                if self.unique:
+                    preview = copy.deepcopy(doc)
+                    apply_update(preview, update, array_filters=array_filters)
+                    self._check_unique(preview)
+                apply_update(doc, update, array_filters=array_filters)
+                matched += 1
+                if not multi:
+                    break
+        upserted_id = None
+        if not matched and upsert:
+            doc = {k: v for k, v in query.items() if not k.startswith("$") and not isinstance(v, dict)}
+            apply_update(doc, update, inserting=True)
+            upserted_id = self._insert(doc)
+        return Result(matched_count=matched, modified_count=matched, upserted_id=upserted_id)
+
+    async def update_one(self, query, update, upsert=False):
+        self._record("update")
+        return self._update(query, update, upsert=upsert)
+
+    async def update_many(self, query, update, upsert=False, array_filters=None):
+        self._record("update")
+        return self._update(query, update, upsert=upsert, multi=True, array_filters=array_filters)
+
+    async def replace_one(self, query, replacement, upsert=False):
+        self._record("update")
+        return self._replace(query, replacement, upsert)
+
+    def _replace(self, query, replacement, upsert):
+        for index, doc in enumerate(self.docs):
+            if matches(doc, query):
+                self.docs[index] = {"_id": doc["_id"], **copy.deepcopy(replacement)}
+                return Result(matched_count=1, modified_count=1, upserted_id=None)
+        if upsert:
+            return Result(matched_count=0, modified_count=0, upserted_id=self._insert(replacement))
+        return Result(matched_count=0, modified_count=0, upserted_id=None)
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=False, sort=None, **kwargs):
+        self._record("findAndModify")
+        before = self._find(query)
+        if sort:
+            before = FakeCursor(before).sort(sort).docs
+        if before:
+            query = {"_id": before[0]["_id"]}
+        result = self._update(query, update, upsert=upsert)
+        if return_document:
+            updated_id = before[0]["_id"] if before else result.upserted_id
+            after = self._find({"_id": updated_id}) if updated_id is not None else []
+            return after[0] if after else None
+        return before[0] if before else None
+
+    def _delete(self, query, multi):
+        deleted = 0
+        remaining = []
+        for doc in self.docs:
+            if matches(doc, query) and (multi or not deleted):
+                deleted += 1
+            else:
+                remaining.append(doc)
+        self.docs = remaining
+        return Result(deleted_count=deleted)
+
+    async def delete_one(self, query):
+        self._record("delete")
+        return self._delete(query, multi=False)
+
+    async def find_one_and_delete(self, query, **kwargs):
+        self._record("findAndModify")
+        found = self._find(query)
+        if found:
+            self._delete({"_id": found[0]["_id"]}, multi=False)
+        return found[0] if found else None
+
+    async def delete_many(self, query):
+        self._record("delete")
+        return self._delete(query, multi=True)
+
+    async def bulk_write(self, operations, ordered=True):
+        # The driver sends one command per run of same-kind operations
+        kinds = []
+        counts = {"matched_count": 0, "upserted_count": 0, "inserted_count": 0, "deleted_count": 0}
+        for op in operations:
+            if isinstance(op, UpdateOne):
+                kind = "update"
+                result = self._update(op._filter, op._doc, upsert=bool(op._upsert))
+                counts["matched_count"] += result.matched_count
+                counts["upserted_count"] += result.upserted_id is not None
+            elif isinstance(op, ReplaceOne):
+                kind = "update"
+                result = self._replace(op._filter, op._doc, upsert=bool(op._upsert))
+                counts["matched_count"] += result.matched_count
+                counts["upserted_count"] += result.upserted_id is not None
+            elif isinstance(op, InsertOne):
+                kind = "insert"
+                self._insert(op._doc)
+                counts["inserted_count"] += 1
+            else:
+                kind = "delete"
+                counts["deleted_count"] += self._delete(op._filter, multi=isinstance(op, DeleteMany)).deleted_count
+            if ordered and (not kinds or kinds[-1] != kind) or not ordered and kind not in kinds:
+                kinds.append(kind)
+        for kind in kinds:
+            self._record(kind)
+        return Result(bulk_api_result={}, modified_count=counts["matched_count"], **counts)
+
+class FakeDB:
+    """Database whose collections spring into existence on first access"""
+
+    def __init__(self, **collections):
+        for name, docs in collections.items():
+            setattr(self, name, FakeCollection(docs, name))
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        collection = FakeCollection(name=name)
+        setattr(self, name, collection)
+        return collection
+
+    def __getitem__(self, name):
+        return getattr(self, name)
@@ -0,0 +1,81 @@
+"""Helpers for asserting how many MongoDB round trips an endpoint makes
+
+    client = api_client(db)
+    response = client.get("/api/admin/users", headers=auth_headers(admin))
+    assert_max_round_trips(response, 3)
+
+Requests go through DBStatsMiddleware, so the count includes the
+authentication lookup, just as the X-DB-Queries header does in development.
+"""
+
+import asyncio
+from datetime import datetime
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from archive import get_archive_horizon
+from auth import create_access_token
+from database import get_database, get_analytics_database
+from db_stats import DBStatsMiddleware
+from jobs import claim_job, job_types, run_job
+from routers import auth_router, expense_router, category_router, parser_router, admin_router, user_router, budget_router, recurring_router, live_router, job_router
+
+def api_client(db) -> TestClient:
+    """The API routers backed by a fake database, with round-trip headers"""
+    app = FastAPI()
+    app.add_middleware(DBStatsMiddleware)
+    for module in (auth_router, expense_router, category_router, parser_router, admin_router, user_router, budget_router, recurring_router, live_router, job_router):
+        app.include_router(module.router, prefix="/api")
+    app.dependency_overrides[get_database] = lambda: db
+    app.dependency_overrides[get_analytics_database] = lambda: db
+    # Workers read the archive horizon once a minute, not per request
+    asyncio.run(get_archive_horizon(db))
+    return TestClient(app)
+
+def auth_headers(user: dict) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': str(user['_id'])})}"}
+
+def round_trips(response) -> int:
+    return int(response.headers["x-db-queries"])
+
+def assert_max_round_trips(response, budget: int):
+    """Fail with the per-command breakdown when a request exceeds its budget"""
+    assert response.status_code < 400, f"{response.status_code}: {response.text}"
+    count = round_trips(response)
+    request = response.request
+    assert count <= budget, (
+        f"{request.method} {request.url.path} made {count} MongoDB round trips, budget is {budget}: "
+        f"{response.headers['x-db-operations']}"
+    )
+
+CATEGORIES = ["Food & Dining", "Transportation", "Shopping"]
+
+def make_user(db, role="user", **fields):
+    user = {
+        "_id": ObjectId(), "name": "Test", "email": f"{ObjectId()}@example.com", "role": role,
+        "status": "active", "password": "x", "created_at": datetime.utcnow(),
+        "last_active": datetime.utcnow(), **fields,
+    }
+    db.users.docs.append(user)
+    for name in CATEGORIES:
+        db.categories.docs.append({"_id": ObjectId(), "user_id": str(user["_id"]), "name": name, "count": 0})
+    return user
+
+def make_expense(db, user, **fields):
+    expense = {
+        "_id": ObjectId(), "user_id": str(user["_id"]), "merchant": "Starbucks", "amount": 4.5,
+        "category": "Food & Dining", "date": datetime(2024, 5, 1), "description": None,
+        "source": "manual", "created_at": datetime.utcnow(), "updated_at": None, **fields,
+    }
+    db.expenses.docs.append(expense)
+    return expense
+
+def run_jobs(db) -> int:
+    """Run every due job inline, as a job worker would; returns how many ran"""
+    async def drain():
+        ran = 0
+        while (job := await claim_job(db, "test-worker", list(job_types))) is not None:
+            await run_job(db, job)
+            ran += 1
+        return ran
+    return asyncio.run(drain())
@@ -0,0 +1,151 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from archive import ARCHIVE_COLLECTION, ARCHIVE_STATE_ID, archive_expenses, find_expenses, get_archive_horizon
+from config import settings
+from fake_mongo import FakeDB
+from merchant_index import rebuild_merchant_index
+from query_budget import api_client, auth_headers, make_expense, make_user, run_jobs
+
+@pytest.fixture
+def db(db, monkeypatch):
+    # The migrator would otherwise wait for workers to refresh their cached horizon
+    monkeypatch.setattr(settings, "ARCHIVE_HORIZON_CACHE_SECONDS", 0)
+    return db
+
+def days_ago(days: int) -> datetime:
+    return datetime.utcnow().replace(microsecond=0) - timedelta(days=days)
+
+def seed_history(db, user):
+    """Ten recent expenses and ten from two years ago, in two different months"""
+    recent = [make_expense(db, user, date=days_ago(day), amount=1.0) for day in range(1, 11)]
+    old = [make_expense(db, user, date=datetime(2024, 5 + day % 2, 1 + day), amount=2.0) for day in range(10)]
+    return recent, old
+
+def test_old_expenses_move_into_monthly_buckets(db):
+    user = make_user(db)
+    recent, old = seed_history(db, user)
+
+    moved = asyncio.run(archive_expenses(db, batch_size=3))
+
+    assert moved == len(old)
+    assert sorted(expense["_id"] for expense in db.expenses.docs) == sorted(expense["_id"] for expense in recent)
+    buckets = db[ARCHIVE_COLLECTION].docs
+    assert sorted(bucket["month"] for bucket in buckets) == [datetime(2024, 5, 1), datetime(2024, 6, 1)]
+    assert sum(len(bucket["expenses"]) for bucket in buckets) == len(old)
+    for bucket in buckets:
+        assert bucket["user_id"] == str(user["_id"])
+        assert bucket["start"] == min(expense["date"] for expense in bucket["expenses"])
+        assert all("user_id" not in expense for expense in bucket["expenses"])
+
+def test_rerunning_an_interrupted_batch_does_not_duplicate(db):
+    user = make_user(db)
+    _, old = seed_history(db, user)
+    asyncio.run(archive_expenses(db))
+    # As if the previous run died after writing the buckets but before deleting
+    db.expenses.docs.extend(old)
+
+    asyncio.run(archive_expenses(db))
+
+    archived = [expense["_id"] for bucket in db[ARCHIVE_COLLECTION].docs for expense in bucket["expenses"]]
+    assert sorted(archived) == sorted(expense["_id"] for expense in old)
+    assert len(db.expenses.docs) == 10
+
+def test_reads_span_both_tiers(db):
+    user = make_user(db)
+    recent, old = seed_history(db, user)
+    asyncio.run(archive_expenses(db))
+    everything = sorted(recent + old, key=lambda expense: expense["date"], reverse=True)
+
+    page = asyncio.run(find_expenses(db, {"user_id": str(user["_id"])}, skip=5, limit=10))
+    assert [expense["_id"] for expense in page] == [expense["_id"] for expense in everything[5:15]]
+    assert all(expense["user_id"] == str(user["_id"]) for expense in page)
+
+    client = api_client(db)
+    listed = client.get("/api/expenses?category=Food %26 Dining", headers=auth_headers(user)).json()
+    assert len(listed) == 20
+    exported = client.get("/api/expenses/export?start_date=2024-06-01", headers=auth_headers(user)).json()
+    assert len(exported) == 10 + 5
+
+def test_each_database_keeps_its_own_cached_horizon(monkeypatch):
+    monkeypatch.setattr(settings, "ARCHIVE_HORIZON_CACHE_SECONDS", 60)
+    horizon = datetime(2024, 7, 1)
+    main = FakeDB(settings=[{"_id": ARCHIVE_STATE_ID, "horizon": horizon}])
+    analytics = FakeDB()
+
+    async def read_both():
+        return await get_archive_horizon(main), await get_archive_horizon(analytics)
+
+    assert asyncio.run(read_both()) == (horizon, None)
+    main.settings.docs.clear()
+    analytics.settings.docs.append({"_id": ARCHIVE_STATE_ID, "horizon": horizon})
+    assert asyncio.run(read_both()) == (horizon, None)
+
+def test_recent_pages_do_not_read_the_archive(db):
+    user = make_user(db)
+    seed_history(db, user)
+    asyncio.run(archive_expenses(db))
+    db[ARCHIVE_COLLECTION].docs.clear()
+
+    response = api_client(db).get("/api/expenses?limit=5", headers=auth_headers(user))
+    assert len(response.json()) == 5
+
+def test_archived_expense_can_be_read_edited_and_deleted(db):
+    user = make_user(db)
+    _, old = seed_history(db, user)
+    asyncio.run(archive_expenses(db))
+    client = api_client(db)
+    headers = auth_headers(user)
+
+    fetched = client.get(f"/api/expenses/{old[0]['_id']}", headers=headers)
+    assert fetched.status_code == 200
+    assert fetched.json()["amount"] == 2.0
+
+    updated = client.put(f"/api/expenses/{old[0]['_id']}", json={"amount": 3.0}, headers=headers)
+    assert updated.json()["amount"] == 3.0
+    assert any(expense["_id"] == old[0]["_id"] for expense in db.expenses.docs)
+    assert not any(
+        expense["_id"] == old[0]["_id"] for bucket in db[ARCHIVE_COLLECTION].docs for expense in bucket["expenses"]
+    )
+
+    assert client.delete(f"/api/expenses/{old[1]['_id']}", headers=headers).status_code == 204
+    assert client.get(f"/api/expenses/{old[1]['_id']}", headers=headers).status_code == 404
+
+def test_categories_see_archived_expenses(db):
+    user = make_user(db)
+    seed_history(db, user)
+    db.expenses.docs = [expense for expense in db.expenses.docs if expense["date"] < days_ago(365)]
+    asyncio.run(archive_expenses(db))
+    client = api_client(db)
+    headers = auth_headers(user)
+    category = next(c for c in db.categories.docs if c["user_id"] == str(user["_id"]) and c["name"] == "Food & Dining")
+    category.update(color="#f97316", icon="🍔", created_at=datetime.utcnow())
+
+    blocked = client.delete(f"/api/categories/{category['_id']}", headers=headers)
+    assert blocked.status_code == 400
+    assert "10 expense(s)" in blocked.json()["detail"]
+
+    client.put(f"/api/categories/{category['_id']}", json={"name": "Eating Out"}, headers=headers)
+    categories = {expense["category"] for bucket in db[ARCHIVE_COLLECTION].docs for expense in bucket["expenses"]}
+    assert categories == {"Eating Out"}
+
+def test_totals_and_merchant_index_include_archived_expenses(db):
+    admin = make_user(db, role="admin")
+    user = make_user(db)
+    seed_history(db, user)
+    asyncio.run(archive_expenses(db))
+
+    details = api_client(db).get(f"/api/admin/users/{user['_id']}", headers=auth_headers(admin)).json()
+    assert (details["expenses"], details["totalAmount"]) == (20, 30.0)
+
+    asyncio.run(rebuild_merchant_index(db, str(user["_id"])))
+    assert [entry["count"] for entry in db.merchant_categories.docs] == [20]
+
+def test_deleting_a_user_removes_their_buckets(db):
+    user = make_user(db)
+    seed_history(db, user)
+    asyncio.run(archive_expenses(db))
+
+    assert api_client(db).delete("/api/users/me", headers=auth_headers(user)).status_code == 204
+    assert run_jobs(db) == 1
+    assert db[ARCHIVE_COLLECTION].docs == []
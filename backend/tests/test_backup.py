@@ -0,0 +1,85 @@
+import asyncio
+import gzip
+from datetime import datetime, timedelta
+import bson
+import pytest
+from bson import ObjectId
+from backup import BACKUP_STATE_ID, list_backups, restore_backup, run_backup, verify_backup
+from config import settings
+from fake_mongo import FakeDB
+from query_budget import make_expense, make_user
+
+@pytest.fixture
+def backup_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "BACKUP_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "BACKUP_PAUSE_MS", 0)
+    monkeypatch.setattr(settings, "BACKUP_BATCH_SIZE", 2)
+    return tmp_path
+
+def snapshot(db):
+    # Through BSON, which keeps datetimes to the millisecond
+    return {
+        name: sorted((bson.decode(bson.encode(doc)) for doc in getattr(db, name).docs), key=lambda doc: str(doc["_id"]))
+        for name in ("users", "categories", "expenses")
+    }
+
+def test_incremental_backups_restore_creates_updates_and_deletes(backup_dir):
+    db = FakeDB()
+    user = make_user(db)
+    untouched = make_expense(db, user, _id=ObjectId.from_datetime(datetime(2024, 5, 1)))
+    edited = make_expense(db, user)
+    deleted = make_expense(db, user)
+    db.settings.docs.append({"_id": "admin_settings", "databaseBackupInterval": 24})
+    full = asyncio.run(run_backup(db))
+
+    edited_doc = next(doc for doc in db.expenses.docs if doc["_id"] == edited["_id"])
+    edited_doc.update(amount=99.0, updated_at=datetime.utcnow())
+    db.expenses.docs = [doc for doc in db.expenses.docs if doc["_id"] != deleted["_id"]]
+    make_expense(db, user, merchant="Uber")
+    incremental = asyncio.run(run_backup(db))
+
+    assert (full["kind"], incremental["kind"], incremental["parent"]) == ("full", "incremental", full["name"])
+    changed = incremental["collections"]["expenses"]
+    assert changed["documents"] < len(db.expenses.docs)
+    assert incremental["collections"]["settings"]["documents"] == 1  # the backup state is left out
+
+    restored = FakeDB()
+    counts = asyncio.run(restore_backup(restored, incremental["name"]))
+    assert counts["expenses"] == 3
+    assert snapshot(restored) == snapshot(db)
+    assert untouched["_id"] in {doc["_id"] for doc in restored.expenses.docs}
+    assert restored.settings.docs == [{"_id": "admin_settings", "databaseBackupInterval": 24}]
+
+def test_restore_refuses_a_corrupted_backup(backup_dir):
+    db = FakeDB()
+    make_expense(db, make_user(db))
+    manifest = asyncio.run(run_backup(db))
+    with gzip.open(backup_dir / manifest["name"] / "expenses.bson.gz", "ab") as f:
+        f.write(b"\x00")
+
+    assert verify_backup(manifest["name"]) == [f"{manifest['name']}/expenses.bson.gz does not match its checksum"]
+    with pytest.raises(ValueError):
+        asyncio.run(restore_backup(FakeDB(), manifest["name"]))
+
+def test_only_one_backup_runs_and_only_when_due(backup_dir):
+    db = FakeDB()
+    make_user(db)
+    db.settings.docs.append({"_id": BACKUP_STATE_ID, "lease_until": datetime.utcnow() + timedelta(hours=1)})
+    assert asyncio.run(run_backup(db)) is None
+
+    db.settings.docs[0]["lease_until"] = None
+    assert asyncio.run(run_backup(db, interval=timedelta(hours=24))) is not None
+    assert asyncio.run(run_backup(db, interval=timedelta(hours=24))) is None
+    assert db.settings.docs[0]["lease_until"] is None
+
+def test_chains_restart_with_a_full_backup_and_old_chains_are_pruned(backup_dir, monkeypatch):
+    monkeypatch.setattr(settings, "BACKUP_FULL_EVERY", 1)
+    monkeypatch.setattr(settings, "BACKUP_KEEP_FULL", 1)
+    db = FakeDB()
+    make_user(db)
+    kinds = []
+    for _ in range(4):
+        kinds.append(asyncio.run(run_backup(db))["kind"])
+
+    assert kinds == ["full", "incremental", "full", "incremental"]
+    assert [manifest["kind"] for manifest in list_backups()] == ["full", "incremental"]
@@ -0,0 +1,106 @@
+import asyncio
+from datetime import datetime
+from budgets import rebuild_category_totals
+from query_budget import api_client, assert_max_round_trips, auth_headers, make_expense, make_user
+
+MONTH = datetime.utcnow().strftime("%Y-%m")
+
+def category(db, user, name):
+    return next(c for c in db.categories.docs if c["user_id"] == str(user["_id"]) and c["name"] == name)
+
+def post_expense(client, user, **fields):
+    body = {"merchant": "Starbucks", "amount": 40.0, "category": "Food & Dining",
+            "date": datetime.utcnow().isoformat(), **fields}
+    return client.post("/api/expenses", json=body, headers=auth_headers(user))
+
+def test_writes_keep_monthly_spend_in_step(db):
+    user = make_user(db)
+    client = api_client(db)
+    headers = auth_headers(user)
+
+    first = post_expense(client, user).json()
+    post_expense(client, user, amount=10.0, date="2024-05-03T00:00:00")
+    food = category(db, user, "Food & Dining")
+    assert food["count"] == 2
+    assert food["monthly_spend"] == {MONTH: 40.0, "2024-05": 10.0}
+
+    client.put(f"/api/expenses/{first['_id']}", json={"amount": 25.0, "category": "Shopping"}, headers=headers)
+    assert category(db, user, "Food & Dining")["monthly_spend"] == {MONTH: 0, "2024-05": 10.0}
+    assert category(db, user, "Shopping")["monthly_spend"] == {MONTH: 25.0}
+    assert category(db, user, "Shopping")["count"] == 1
+
+    client.delete(f"/api/expenses/{first['_id']}", headers=headers)
+    assert category(db, user, "Shopping")["monthly_spend"] == {MONTH: 0}
+    assert category(db, user, "Shopping")["count"] == 0
+
+def test_racing_writes_move_the_counters_by_what_they_replaced(db, monkeypatch):
+    user = make_user(db)
+    client = api_client(db)
+    headers = auth_headers(user)
+    expense = post_expense(client, user, amount=40.0).json()
+    stale = next(doc for doc in db.expenses.docs if str(doc["_id"]) == expense["_id"])
+    stale = dict(stale)
+
+    client.put(f"/api/expenses/{expense['_id']}", json={"amount": 30.0, "category": "Shopping"}, headers=headers)
+    # A second request that read the expense before the first one changed it
+    async def read_stale(*args, **kwargs):
+        return dict(stale)
+    monkeypatch.setattr(db.expenses, "find_one", read_stale)
+    client.put(f"/api/expenses/{expense['_id']}", json={"amount": 20.0}, headers=headers)
+    assert (category(db, user, "Food & Dining")["count"], category(db, user, "Food & Dining")["monthly_spend"][MONTH]) == (0, 0)
+    assert (category(db, user, "Shopping")["count"], category(db, user, "Shopping")["monthly_spend"][MONTH]) == (1, 20.0)
+
+    assert client.delete(f"/api/expenses/{expense['_id']}", headers=headers).status_code == 204
+    assert client.delete(f"/api/expenses/{expense['_id']}", headers=headers).status_code == 404
+    assert (category(db, user, "Shopping")["count"], category(db, user, "Shopping")["monthly_spend"][MONTH]) == (0, 0)
+
+def test_bulk_create_counts_each_category_once(db):
+    user = make_user(db)
+    response = api_client(db).post("/api/expenses/bulk", json=[
+        {"merchant": "Uber", "amount": 12.0, "category": "Transportation", "date": "2024-05-03T00:00:00"},
+        {"merchant": "Lyft", "amount": 8.0, "category": "Transportation", "date": "2024-06-03T00:00:00"},
+    ], headers=auth_headers(user))
+    assert response.status_code == 201
+    assert category(db, user, "Transportation")["monthly_spend"] == {"2024-05": 12.0, "2024-06": 8.0}
+
+def test_create_warns_when_a_budget_is_nearly_spent(db):
+    user = make_user(db)
+    category(db, user, "Food & Dining")["budget"] = 100.0
+    client = api_client(db)
+
+    assert post_expense(client, user, amount=50.0).json()["budget_alert"] is None
+    alert = post_expense(client, user, amount=35.0).json()["budget_alert"]
+    assert (alert["status"], alert["spent"], alert["remaining"]) == ("warning", 85.0, 15.0)
+    assert post_expense(client, user, amount=20.0).json()["budget_alert"]["status"] == "over"
+    # Not budgeted
+    assert post_expense(client, user, category="Shopping").json()["budget_alert"] is None
+
+def test_status_answers_from_the_category_documents(db):
+    user = make_user(db)
+    for name, budget in (("Food & Dining", 200.0), ("Shopping", 50.0)):
+        category(db, user, name).update(budget=budget, color="#f97316", icon="🛒")
+    category(db, user, "Food & Dining")["monthly_spend"] = {MONTH: 50.0, "2024-05": 500.0}
+    category(db, user, "Shopping")["monthly_spend"] = {MONTH: 75.0}
+
+    response = api_client(db).get("/api/budgets/status", headers=auth_headers(user))
+    assert_max_round_trips(response, 2)
+    body = response.json()
+    assert (body["month"], body["totalBudget"], body["totalSpent"]) == (MONTH, 250.0, 125.0)
+    assert [(row["category"], row["status"], row["percent"]) for row in body["categories"]] == [
+        ("Food & Dining", "ok", 25.0), ("Shopping", "over", 150.0),
+    ]
+
+    may = api_client(db).get("/api/budgets/status?month=2024-05", headers=auth_headers(user)).json()
+    assert [row["spent"] for row in may["categories"]] == [500.0, 0]
+
+def test_rebuild_recomputes_totals_from_expenses(db):
+    user = make_user(db)
+    make_expense(db, user, amount=4.5)
+    make_expense(db, user, amount=5.5)
+    make_expense(db, user, category="Shopping", amount=20.0, date=datetime(2024, 6, 1))
+
+    asyncio.run(rebuild_category_totals(db, str(user["_id"])))
+
+    assert category(db, user, "Food & Dining")["monthly_spend"] == {"2024-05": 10.0}
+    assert category(db, user, "Shopping")["count"] == 1
+    assert category(db, user, "Transportation")["monthly_spend"] == {}
@@ -0,0 +1,91 @@
+import json
+import os
+from datetime import datetime, timedelta
+import pytest
+from config import settings
+from currency import conversion_factors, convert_totals
+from fake_mongo import FakeDB
+from query_budget import api_client, auth_headers, make_expense, make_user, run_jobs
+from sms_parser import parse_sms_fields
+
+@pytest.fixture
+def rates_file(tmp_path, monkeypatch):
+    path = tmp_path / "fx_rates.json"
+    path.write_text(json.dumps({"base": "USD", "rates": {"USD": 1.0, "EUR": 0.5, "INR": 80.0}}))
+    monkeypatch.setattr(settings, "FX_RATES_FILE", str(path))
+    monkeypatch.setattr(settings, "BASE_CURRENCY", "USD")
+    return path
+
+def test_totals_are_converted_per_currency_and_the_file_is_reloaded(rates_file):
+    assert conversion_factors("EUR") == {"USD": 0.5, "EUR": 1.0, "INR": 0.5 / 80}
+    assert convert_totals({"USD": 10.0, "INR": 800.0, None: 2.0}, "EUR") == pytest.approx(11.0)
+
+    rates_file.write_text(json.dumps({"rates": {"USD": 1.0, "EUR": 0.25}}))
+    os.utime(rates_file, (0, 1))
+    assert conversion_factors("EUR")["USD"] == 0.25
+
+def test_expenses_default_to_the_users_currency(rates_file):
+    db = FakeDB()
+    user = make_user(db, currency="EUR")
+    client = api_client(db)
+    body = {"merchant": "Cafe", "amount": 4.0, "category": "Food & Dining", "date": "2024-05-02T00:00:00"}
+
+    assert client.post("/api/expenses", json=body, headers=auth_headers(user)).json()["currency"] == "EUR"
+    assert client.post("/api/expenses", json={**body, "currency": "INR"}, headers=auth_headers(user)).json()["currency"] == "INR"
+    response = client.post("/api/expenses", json={**body, "currency": "JPY"}, headers=auth_headers(user))
+    assert response.status_code == 400
+
+def test_stats_are_reported_in_the_users_currency(rates_file):
+    db = FakeDB()
+    user = make_user(db, currency="EUR")
+    for category in db.categories.docs:
+        category["color"] = "#0ea5e9"
+    today = datetime.utcnow()
+    make_expense(db, user, amount=10.0, currency="EUR", date=today)
+    make_expense(db, user, amount=8.0, currency="USD", date=today)
+    make_expense(db, user, amount=160.0, currency="INR", category="Shopping", date=today - timedelta(days=1))
+    make_expense(db, user, amount=2.0, date=today - timedelta(days=1))  # from before currencies: USD
+
+    stats = api_client(db).get("/api/expenses/stats", headers=auth_headers(user)).json()
+    assert (stats["currency"], stats["totalExpenses"]) == ("EUR", 16.0)
+    assert [(row["name"], row["value"]) for row in stats["categoryBreakdown"]] == [("Food & Dining", 15.0), ("Shopping", 1.0)]
+    assert [point["amount"] for point in stats["trendData"][-2:]] == [2.0, 14.0]
+
+def test_category_spend_is_kept_in_the_users_currency(rates_file):
+    db = FakeDB()
+    user = make_user(db, currency="EUR")
+    client = api_client(db)
+    headers = auth_headers(user)
+    body = {"merchant": "Cafe", "amount": 10.0, "category": "Food & Dining", "date": "2024-05-02T00:00:00"}
+
+    client.post("/api/expenses", json=body, headers=headers)
+    dollars = client.post("/api/expenses", json={**body, "amount": 8.0, "currency": "USD"}, headers=headers).json()
+    client.post("/api/expenses/bulk", json=[{**body, "amount": 160.0, "currency": "INR"}], headers=headers)
+    food = next(c for c in db.categories.docs if c["name"] == "Food & Dining")
+    assert food["monthly_spend"] == {"2024-05": pytest.approx(15.0)}
+
+    client.put(f"/api/expenses/{dollars['_id']}", json={"amount": 4.0}, headers=headers)
+    assert food["monthly_spend"] == {"2024-05": pytest.approx(13.0)}
+    client.delete(f"/api/expenses/{dollars['_id']}", headers=headers)
+    assert food["monthly_spend"] == {"2024-05": pytest.approx(11.0)}
+
+    client.put("/api/users/me", json={"currency": "USD"}, headers=headers)
+    assert run_jobs(db) == 1
+    assert food["monthly_spend"] == {"2024-05": 22.0}
+
+def test_admin_totals_convert_each_user_to_their_currency(rates_file):
+    db = FakeDB()
+    admin = make_user(db, role="admin")
+    user = make_user(db, currency="INR")
+    make_expense(db, user, amount=1.0, currency="USD")
+    make_expense(db, user, amount=40.0, currency="INR")
+
+    details = api_client(db).get(f"/api/admin/users/{user['_id']}", headers=auth_headers(admin)).json()
+    assert (details["expenses"], details["totalAmount"], details["currency"]) == (2, 120.0, "INR")
+    dashboard = api_client(db).get("/api/admin/dashboard", headers=auth_headers(admin)).json()
+    assert (dashboard["totalAmount"], dashboard["currency"]) == (1.5, "USD")
+
+def test_sms_currency_markers():
+    assert parse_sms_fields("Rs.250.00 debited at SWIGGY").currency == "INR"
+    assert parse_sms_fields("EUR 12.50 spent at IKEA").currency == "EUR"
+    assert parse_sms_fields("Amount: 300 paid").currency is None
@@ -0,0 +1,74 @@
+import asyncio
+from datetime import datetime
+from fake_mongo import FakeDB
+from duplicates import (
+    expense_fingerprint, candidate_fingerprints, find_duplicate, find_duplicates_bulk
+)
+
+def run(coro):
+    return asyncio.run(coro)
+
+def stored(amount, date, merchant, source):
+    return {
+        "user_id": "u1",
+        "amount": amount,
+        "date": date,
+        "merchant": merchant,
+        "source": source,
+        "fingerprint": expense_fingerprint(amount, date, merchant),
+    }
+
+def new(amount, date, merchant, source="manual"):
+    return {"amount": amount, "date": date, "merchant": merchant, "source": source}
+
+def test_fingerprint_uses_cents_and_normalized_merchant():
+    assert expense_fingerprint(3.6, datetime(2024, 1, 1, 9), "STARBUCKS #12") == \
+        expense_fingerprint(3.60, datetime(2024, 1, 1, 18), "Starbucks")
+    assert expense_fingerprint(3.60, datetime(2024, 1, 1), "Starbucks") != \
+        expense_fingerprint(4.20, datetime(2024, 1, 1), "Starbucks")
+    assert expense_fingerprint(3.60, datetime(2024, 1, 1), "Starbucks") != \
+        expense_fingerprint(3.61, datetime(2024, 1, 1), "Starbucks")
+
+def test_candidate_fingerprints_start_with_own_day():
+    candidates = candidate_fingerprints(10.0, datetime(2024, 3, 1), "Uber")
+    assert candidates[0] == expense_fingerprint(10.0, datetime(2024, 3, 1), "Uber")
+    assert set(candidates[1:]) == {
+        expense_fingerprint(10.0, datetime(2024, 2, 29), "Uber"),
+        expense_fingerprint(10.0, datetime(2024, 3, 2), "Uber"),
+    }
+
+def test_different_amounts_on_neighbouring_days_do_not_match():
+    db = FakeDB(expenses=[stored(3.60, datetime(2024, 1, 1), "Starbucks", "manual")])
+    assert run(find_duplicate(db, "u1", 4.20, datetime(2024, 1, 2), "STARBUCKS #12", "sms")) is None
+
+def test_neighbouring_day_only_matches_across_sources():
+    db = FakeDB(expenses=[stored(3.60, datetime(2024, 1, 1), "Starbucks", "sms")])
+    assert run(find_duplicate(db, "u1", 3.60, datetime(2024, 1, 2), "Starbucks", "sms")) is None
+    match = run(find_duplicate(db, "u1", 3.60, datetime(2024, 1, 2), "Starbucks", "receipt"))
+    assert match["source"] == "sms"
+    assert run(find_duplicate(db, "u1", 3.60, datetime(2024, 1, 1), "Starbucks", "sms")) is not None
+
+def test_bulk_matches_stored_and_earlier_batch_rows():
+    db = FakeDB(expenses=[stored(12.50, datetime(2024, 5, 3), "Uber", "sms")])
+    batch = [
+        new(12.50, datetime(2024, 5, 3), "UBER"),          # same day as the stored one
+        new(8.00, datetime(2024, 5, 3), "Zomato"),
+        new(8.00, datetime(2024, 5, 3), "Zomato Online"),  # same as row 1
+        new(8.00, datetime(2024, 5, 4), "Zomato"),         # next day, same source
+        new(8.00, datetime(2024, 5, 5), "Zomato", "sms"),  # day after row 3, other source
+        new(8.00, datetime(2024, 5, 2), "Zomato", "sms"),  # day before row 1, other source
+        new(99.99, datetime(2024, 5, 3), "Amazon"),
+    ]
+    matches = run(find_duplicates_bulk(db, "u1", batch))
+
+    assert matches[0]["merchant"] == "Uber"
+    assert matches[1] is None
+    assert matches[2] == 1
+    assert matches[3] is None
+    assert matches[4] == 3
+    assert matches[5] == 1
+    assert matches[6] is None
+
+def test_bulk_ignores_other_users():
+    db = FakeDB(expenses=[{**stored(5.0, datetime(2024, 1, 1), "Uber", "manual"), "user_id": "u2"}])
+    assert run(find_duplicates_bulk(db, "u1", [new(5.0, datetime(2024, 1, 1), "Uber")])) == [None]
@@ -0,0 +1,61 @@
+import asyncio
+import pytest
+import health
+from config import settings
+from database import db_instance
+
+class Admin:
+    def __init__(self, delay=0.0, error=None):
+        self.delay = delay
+        self.error = error
+        self.pings = 0
+
+    async def command(self, name):
+        self.pings += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return {"ok": 1}
+
+class Client:
+    def __init__(self, **kwargs):
+        self.admin = Admin(**kwargs)
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(health, "health_state", health.HealthState())
+    health.health_state.warmed_up = True
+    yield
+    monkeypatch.setattr(db_instance, "client", None)
+
+def test_ready_when_database_answers(monkeypatch):
+    monkeypatch.setattr(db_instance, "client", Client())
+    report = asyncio.run(health.readiness_report())
+    assert report["status"] == "ready"
+    assert report["database"]["status"] == "up"
+    assert report["cache"]["warmedUp"] is True
+
+def test_ping_timeout_makes_worker_unavailable(monkeypatch):
+    monkeypatch.setattr(settings, "HEALTH_PING_TIMEOUT_MS", 20)
+    monkeypatch.setattr(db_instance, "client", Client(delay=1))
+    report = asyncio.run(health.readiness_report())
+    assert report["status"] == "unavailable"
+    assert report["database"]["status"] == "timeout"
+
+def test_loop_lag_and_warm_up_are_reported(monkeypatch):
+    monkeypatch.setattr(db_instance, "client", Client())
+    health.health_state.warmed_up = False
+    health.health_state.loop_lag_ms = settings.HEALTH_MAX_LOOP_LAG_MS + 1
+    report = asyncio.run(health.readiness_report())
+    assert len(report["problems"]) == 2
+
+def test_rapid_polls_share_one_ping(monkeypatch):
+    client = Client(delay=0.01)
+    monkeypatch.setattr(db_instance, "client", client)
+
+    async def poll():
+        await asyncio.gather(*[health.readiness_report() for _ in range(5)])
+        await health.readiness_report()
+
+    asyncio.run(poll())
+    assert client.admin.pings == 1
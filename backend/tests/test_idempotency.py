@@ -0,0 +1,96 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from fastapi import HTTPException, Response
+from config import settings
+from idempotency import IDEMPOTENCY_COLLECTION, idempotency_state, idempotent, request_fingerprint
+from query_budget import api_client, auth_headers, make_user
+
+BODY = {"merchant": "Uber", "amount": 12.0, "category": "Transportation", "date": "2024-05-02T10:00:00"}
+
+@pytest.fixture
+def db(db):
+    idempotency_state.responses.clear()
+    return db
+
+def test_a_retried_create_returns_the_first_response_once_per_key(db):
+    user = make_user(db)
+    client = api_client(db)
+    headers = {**auth_headers(user), "Idempotency-Key": "retry-1"}
+
+    first = client.post("/api/expenses", headers=headers, json=BODY)
+    retry = client.post("/api/expenses", headers=headers, json=BODY)
+    idempotency_state.responses.clear()  # as another worker would see it
+    from_db = client.post("/api/expenses", headers=headers, json=BODY)
+
+    assert first.status_code == retry.status_code == from_db.status_code == 201
+    assert first.json() == retry.json() == from_db.json()
+    assert "idempotent-replayed" not in first.headers and retry.headers["idempotent-replayed"] == "true"
+    assert len(db.expenses.docs) == 1
+    assert {c["name"]: c["count"] for c in db.categories.docs}["Transportation"] == 1
+
+    other = client.post("/api/expenses", headers={**auth_headers(user), "Idempotency-Key": "retry-2"}, json=BODY)
+    assert other.json()["_id"] != first.json()["_id"]
+
+def test_a_key_is_bound_to_its_request_and_user(db):
+    user = make_user(db)
+    client = api_client(db)
+    headers = {**auth_headers(user), "Idempotency-Key": "k"}
+    client.post("/api/expenses", headers=headers, json=BODY)
+
+    assert client.post("/api/expenses", headers=headers, json={**BODY, "amount": 13.0}).status_code == 422
+    someone_else = client.post("/api/expenses", headers={**auth_headers(make_user(db)), "Idempotency-Key": "k"}, json=BODY)
+    assert someone_else.status_code == 201 and len(db.expenses.docs) == 2
+
+def test_a_failed_request_lets_go_of_its_key(db):
+    user = make_user(db)
+    client = api_client(db)
+    headers = {**auth_headers(user), "Idempotency-Key": "fix-and-retry"}
+
+    assert client.post("/api/expenses/bulk", headers=headers, json=[{**BODY, "currency": "XXX"}]).status_code == 400
+    assert db[IDEMPOTENCY_COLLECTION].docs == []
+    first = client.post("/api/expenses/bulk", headers=headers, json=[BODY])
+    retry = client.post("/api/expenses/bulk", headers=headers, json=[BODY])
+    assert len(first.json()["inserted"]) == 1 and retry.json() == first.json()
+    assert len(db.expenses.docs) == 1
+
+def test_concurrent_duplicates_run_the_write_once(db):
+    calls = []
+
+    async def insert():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"id": len(calls)}
+
+    async def run():
+        return await asyncio.gather(*(
+            idempotent(db, "user-1", "POST /expenses", "same", BODY, Response(), insert) for _ in range(5)
+        ))
+
+    assert asyncio.run(run()) == [{"id": 1}] * 5
+    assert len(calls) == 1 and [doc["status"] for doc in db[IDEMPOTENCY_COLLECTION].docs] == ["done"]
+
+def test_a_key_held_by_another_worker(db, monkeypatch):
+    monkeypatch.setattr(settings, "IDEMPOTENCY_WAIT_SECONDS", 0)
+    keys = db[IDEMPOTENCY_COLLECTION]
+    fingerprint = request_fingerprint(BODY)
+
+    async def insert():
+        return {"id": "mine"}
+
+    def call(key):
+        return asyncio.run(idempotent(db, "user-1", "POST /expenses", key, BODY, Response(), insert))
+
+    keys.docs.append({"_id": "user-1:POST /expenses:running", "user_id": "user-1", "fingerprint": fingerprint,
+                      "status": "pending", "response": None, "created_at": datetime.utcnow()})
+    with pytest.raises(HTTPException) as conflict:
+        call("running")
+    assert conflict.value.status_code == 409
+
+    keys.docs.append({"_id": "user-1:POST /expenses:abandoned", "user_id": "user-1", "fingerprint": fingerprint,
+                      "status": "pending", "response": None, "created_at": datetime.utcnow() - timedelta(hours=1)})
+    assert call("abandoned") == {"id": "mine"}
+
+    keys.docs.append({"_id": "user-1:POST /expenses:finished", "user_id": "user-1", "fingerprint": fingerprint,
+                      "status": "done", "response": {"id": "theirs"}, "created_at": datetime.utcnow()})
+    assert call("finished") == {"id": "theirs"}
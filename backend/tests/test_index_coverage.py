@@ -0,0 +1,268 @@
+"""Every query the API issues must be served by an index
+
+Seeds a throwaway database on a local mongod (MONGODB_TEST_URL, default
+mongodb://localhost:27017) with synthetic users, builds the indexes from
+indexes.py, then calls each route and explains every MongoDB command it
+issued. Skipped when no mongod is reachable.
+"""
+
+import asyncio
+import copy
+import json
+import os
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+import httpx
+import pytest
+from bson import ObjectId
+from fastapi import FastAPI
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from pymongo.errors import PyMongoError
+from auth import create_access_token
+from database import get_database, get_analytics_database
+from indexes import build_missing_indexes
+from merchant_index import rebuild_merchant_index
+from routers import auth_router, expense_router, category_router, parser_router, admin_router, user_router, budget_router, recurring_router, live_router, job_router
+from seed_data import generate_user
+from slow_queries import FILTER_FIELDS, explain_command, filter_shape, summarize_plan
+
+MONGODB_TEST_URL = os.environ.get("MONGODB_TEST_URL", "mongodb://localhost:27017")
+SEED = 41
+SEED_USERS = 200
+
+# A blocking in-memory SORT is only acceptable over this many index keys or documents
+MAX_IN_MEMORY_SORT = 100
+# How far a user-scoped query may examine beyond that user's own documents
+# (index seeks, $or branches)
+EXAMINED_SLACK = 10
+
+class Case(NamedTuple):
+    name: str
+    method: str
+    path: str
+    body: Optional[object] = None
+    status: int = 200
+    admin: bool = False
+    # collection -> why a full scan is tolerated there
+    allowed_scans: dict = {}
+
+# Run in this order; later cases see the writes of earlier ones
+CASES = [
+    Case("list_expenses", "GET", "/api/expenses"),
+    Case("list_expenses_page", "GET", "/api/expenses?skip=200&limit=50"),
+    Case("list_expenses_by_category", "GET", "/api/expenses?category=Shopping"),
+    Case("list_expenses_by_source", "GET", "/api/expenses?source=sms"),
+    Case("list_expenses_by_date", "GET", "/api/expenses?start_date={start}&end_date={end}"),
+    Case("list_expenses_by_category_and_date", "GET", "/api/expenses?category=Travel&start_date={start}"),
+    Case("search_expenses", "GET", "/api/expenses?search=uber"),
+    Case("expense_stats_30_days", "GET", "/api/expenses/stats?range=30days"),
+    Case("expense_stats_year", "GET", "/api/expenses/stats?range=year"),
+    Case("get_expense", "GET", "/api/expenses/{expense_id}"),
+    Case("create_expense", "POST", "/api/expenses", {
+        "merchant": "Uber", "amount": 23.5, "category": "Transportation", "date": "{end}",
+    }, status=201),
+    Case("bulk_create_expenses", "POST", "/api/expenses/bulk", [
+        {"merchant": "Amazon", "amount": 120.0, "category": "Shopping", "date": "{start}"},
+        {"merchant": "Netflix", "amount": 15.0, "category": "Entertainment", "date": "{end}"},
+    ], status=201),
+    Case("update_expense", "PUT", "/api/expenses/{expense_id}", {"category": "Travel", "amount": 99.5}),
+    Case("list_categories", "GET", "/api/categories"),
+    Case("get_category", "GET", "/api/categories/{category_id}"),
+    Case("rename_category", "PUT", "/api/categories/{category_id}", {"name": "Eating Out"}),
+    Case("delete_used_category", "DELETE", "/api/categories/{category_id}", status=400),
+    Case("parse_sms", "POST", "/api/parse/sms", {"text": "Rs.250.00 debited from A/c XX1234 at SWIGGY on 02-05-2024"}),
+    Case("delete_expense", "DELETE", "/api/expenses/{other_expense_id}", status=204),
+    Case("profile", "GET", "/api/users/me"),
+    Case("budget_status", "GET", "/api/budgets/status"),
+    Case("list_recurring", "GET", "/api/recurring"),
+    Case("list_jobs", "GET", "/api/jobs"),
+    Case("admin_users", "GET", "/api/admin/users", admin=True),
+    Case("admin_users_by_status", "GET", "/api/admin/users?status_filter=active", admin=True),
+    Case("admin_users_search", "GET", "/api/admin/users?search=seed-41-1", admin=True, allowed_scans={
+        "users": "case-insensitive substring search on name/email can't use an index",
+    }),
+    Case("admin_user_details", "GET", "/api/admin/users/{user_id}", admin=True),
+    Case("admin_user_expenses", "GET", "/api/admin/users/{user_id}/expenses", admin=True),
+    Case("admin_jobs", "GET", "/api/admin/jobs", admin=True),
+    Case("admin_failed_jobs", "GET", "/api/admin/jobs?status=failed", admin=True),
+    Case("admin_dashboard", "GET", "/api/admin/dashboard", admin=True, allowed_scans={
+        "users": "the dashboard loads every user",
+        "expenses": "the dashboard loads every expense",
+    }),
+]
+
+class CommandCapture(monitoring.CommandListener):
+    """Keep a copy of every filterable command sent to one database"""
+
+    def __init__(self):
+        self.database = None
+        self.commands = []
+
+    def started(self, event):
+        if event.database_name == self.database and event.command_name in FILTER_FIELDS:
+            self.commands.append((event.command_name, copy.deepcopy(event.command)))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+def raw_filter(command_name: str, command: dict) -> dict:
+    value = command.get(FILTER_FIELDS[command_name]) or {}
+    if command_name in ("update", "delete"):
+        value = value[0].get("q", {}) if value else {}
+    elif command_name == "aggregate":
+        value = next((stage["$match"] for stage in value if "$match" in stage), {})
+    return value
+
+async def scope_size(db, collection: str, query: dict) -> Optional[int]:
+    """Documents the query may legitimately touch: its user's, or the one it names"""
+    for field in ("_id", "user_id"):
+        if isinstance(query.get(field), (str, ObjectId)):
+            return await db[collection].count_documents({field: query[field]})
+    return None
+
+async def seed(db) -> dict:
+    as_of = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    users, categories, expenses = [], [], []
+    for index in range(SEED_USERS):
+        user, user_categories, user_expenses = generate_user(SEED, index, as_of, 2, 15, "not-a-real-hash")
+        users.append((len(user_expenses), user, user_expenses))
+        categories += user_categories
+        expenses += user_expenses
+
+    admin = {"_id": ObjectId(), "name": "Admin", "email": "admin@coverage.local", "role": "admin",
+             "status": "active", "password": "not-a-real-hash", "created_at": as_of, "last_active": as_of}
+    await db.users.insert_many([admin] + [user for _, user, _ in users])
+    await db.categories.insert_many(categories)
+    await db.expenses.insert_many(expenses, ordered=False)
+    await build_missing_indexes(db)
+
+    # A typical user, not one of the few very heavy ones
+    users.sort(key=lambda entry: entry[0])
+    _, user, user_expenses = users[len(users) // 2]
+    user_id = str(user["_id"])
+    await rebuild_merchant_index(db, user_id)
+    category = await db.categories.find_one({"user_id": user_id, "name": "Food & Dining"})
+    return {
+        "user": user,
+        "admin": admin,
+        "user_id": user_id,
+        "expense_id": str(user_expenses[0]["_id"]),
+        "other_expense_id": str(user_expenses[1]["_id"]),
+        "category_id": str(category["_id"]),
+        "start": (as_of - timedelta(days=60)).isoformat(),
+        "end": (as_of - timedelta(days=1)).isoformat(),
+    }
+
+def fill(value, context: dict):
+    """Substitute {placeholders} in a path or JSON body"""
+    if isinstance(value, str):
+        return value.format(**context)
+    if isinstance(value, list):
+        return [fill(item, context) for item in value]
+    if isinstance(value, dict):
+        return {key: fill(item, context) for key, item in value.items()}
+    return value
+
+async def run_cases() -> Optional[dict]:
+    capture = CommandCapture()
+    client = AsyncIOMotorClient(MONGODB_TEST_URL, serverSelectionTimeoutMS=1000, event_listeners=[capture])
+    try:
+        await client.admin.command("ping")
+    except PyMongoError:
+        client.close()
+        return None
+
+    database_name = f"index_coverage_{os.getpid()}"
+    db = client[database_name]
+    handlers = []
+
+    app = FastAPI()
+    for module in (auth_router, expense_router, category_router, parser_router, admin_router, user_router, budget_router, recurring_router, live_router, job_router):
+        app.include_router(module.router, prefix="/api")
+    app.dependency_overrides[get_database] = lambda: db
+    app.dependency_overrides[get_analytics_database] = lambda: db
+
+    async def recording_app(scope, receive, send):
+        await app(scope, receive, send)
+        # The router stores the matched endpoint in the request scope
+        if "endpoint" in scope:
+            handlers.append(scope["endpoint"].__name__)
+
+    try:
+        context = await seed(db)
+        capture.database = database_name
+        tokens = {
+            False: create_access_token({"sub": context["user_id"]}),
+            True: create_access_token({"sub": str(context["admin"]["_id"])}),
+        }
+        results = {}
+        transport = httpx.ASGITransport(app=recording_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            for case in CASES:
+                capture.commands.clear()
+                handlers.clear()
+                response = await http.request(
+                    case.method, fill(case.path, context), json=fill(case.body, context),
+                    headers={"Authorization": f"Bearer {tokens[case.admin]}"}
+                )
+                commands = list(capture.commands)
+                queries = []
+                for command_name, command in commands:
+                    collection = command[command_name]
+                    queries.append({
+                        "command": command_name,
+                        "collection": collection,
+                        "shape": json.dumps(filter_shape(command_name, command), sort_keys=True),
+                        "plan": summarize_plan(await explain_command(db, command)),
+                        "scope": await scope_size(db, collection, raw_filter(command_name, command)),
+                    })
+                results[case.name] = {
+                    "status": response.status_code,
+                    "body": response.text[:500],
+                    "handler": handlers[-1] if handlers else case.path,
+                    "queries": queries,
+                }
+        return results
+    finally:
+        await client.drop_database(database_name)
+        client.close()
+
+@pytest.fixture(scope="module")
+def explained():
+    results = asyncio.run(run_cases())
+    if results is None:
+        pytest.skip(f"no mongod reachable at {MONGODB_TEST_URL}")
+    return results
+
+def coverage_problems(handler: str, query: dict, allowed_scans: dict) -> list:
+    plan = query["plan"]
+    label = f"{handler}: {query['command']} on {query['collection']} with filter {query['shape']}"
+    if query["collection"] in allowed_scans:
+        return []
+    examined = max(plan["keysExamined"] or 0, plan["docsExamined"] or 0)
+    problems = []
+    if plan["collectionScan"]:
+        problems.append(f"{label} does a COLLSCAN (plan: {plan['stages']})")
+    if "SORT" in plan["stages"] and examined > MAX_IN_MEMORY_SORT:
+        problems.append(f"{label} sorts {examined} entries in memory (plan: {plan['stages']})")
+    if query["scope"] is not None and examined > query["scope"] + EXAMINED_SLACK:
+        problems.append(
+            f"{label} examines {examined} entries for a scope of {query['scope']} document(s) "
+            f"(index: {plan['indexes'] or 'none'})"
+        )
+    return problems
+
+@pytest.mark.parametrize("case", CASES, ids=lambda case: case.name)
+def test_route_queries_are_served_by_indexes(explained, case):
+    result = explained[case.name]
+    assert result["status"] == case.status, f"{case.method} {case.path}: {result['status']} {result['body']}"
+    assert result["queries"], f"{result['handler']} issued no queries; is the capture working?"
+
+    problems = []
+    for query in result["queries"]:
+        problems += coverage_problems(result["handler"], query, case.allowed_scans)
+    assert not problems, "\n".join(problems)
@@ -0,0 +1,35 @@
+import asyncio
+from pymongo import ASCENDING, IndexModel
+from indexes import diff_collection, index_spec
+
+class IndexedCollection:
+    def __init__(self, info):
+        self.info = info
+
+    async def index_information(self):
+        return dict(self.info)
+
+def test_spec_covers_query_shapes():
+    names = {name: {model.document["name"] for model in models} for name, models in index_spec().items()}
+    assert {"user_id_1_category_1_date_-1", "user_id_1_source_1_date_-1"} <= names["expenses"]
+    assert {"created_at_-1", "last_active_-1", "status_1_created_at_-1"} <= names["users"]
+
+def test_diff_reports_missing_changed_and_extra():
+    db = {"parse_cache": IndexedCollection({
+        "_id_": {"key": [("_id", 1)]},
+        "created_at_1": {"key": [("created_at", 1)], "expireAfterSeconds": 60},
+        "kind_1": {"key": [("kind", 1)]},
+    })}
+    wanted = [
+        IndexModel([("user_id", ASCENDING)]),
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=3600),
+    ]
+    diff = asyncio.run(diff_collection(db, "parse_cache", wanted))
+
+    assert [model.document["name"] for model in diff["missing"]] == ["user_id_1"]
+    assert diff["changed"] == [{
+        "name": "created_at_1",
+        "live": {"expireAfterSeconds": 60},
+        "wanted": {"expireAfterSeconds": 3600},
+    }]
+    assert diff["extra"] == ["kind_1"]
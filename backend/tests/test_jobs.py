@@ -0,0 +1,183 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from config import settings
+from fake_mongo import FakeCursor, FakeDB
+from jobs import (
+    JOBS_COLLECTION, cancel_job, claim_job, dispatch_jobs, enqueue_job, job_handler, job_types, jobs_state,
+    requeue_expired, run_job,
+)
+from query_budget import api_client, auth_headers, make_expense, make_user, run_jobs
+
+@pytest.fixture
+def handlers():
+    """Job types registered by a test are removed after it"""
+    registered = dict(job_types)
+    yield
+    job_types.clear()
+    job_types.update(registered)
+
+def job(db, job_id):
+    return next(doc for doc in db[JOBS_COLLECTION].docs if doc["_id"] == job_id)
+
+def test_claims_take_the_highest_priority_due_job_once(handlers):
+    db = FakeDB()
+
+    @job_handler("noop", concurrency=3)
+    async def noop(db, job):
+        return None
+
+    async def run():
+        low = await enqueue_job(db, "noop", {"n": 1})
+        high = await enqueue_job(db, "noop", {"n": 2}, priority=5)
+        await enqueue_job(db, "noop", {"n": 3}, priority=9, run_at=datetime.utcnow() + timedelta(hours=1))
+        claims = [await claim_job(db, worker, ["noop"]) for worker in ("a", "b", "c")]
+        assert [claim and claim["_id"] for claim in claims] == [high["_id"], low["_id"], None]
+        assert (claims[0]["status"], claims[0]["worker"], claims[0]["attempts"]) == ("running", "a", 1)
+        assert await claim_job(db, "d", ["other"]) is None
+
+    asyncio.run(run())
+    with pytest.raises(ValueError):
+        asyncio.run(enqueue_job(db, "unknown"))
+
+def test_failures_are_retried_with_backoff_until_attempts_run_out(handlers, monkeypatch):
+    monkeypatch.setattr(settings, "JOBS_RETRY_BASE_SECONDS", 10)
+    db = FakeDB()
+
+    @job_handler("flaky", max_attempts=3)
+    async def flaky(db, job):
+        raise RuntimeError("upstream down")
+
+    job_id = asyncio.run(enqueue_job(db, "flaky"))["_id"]
+    delays = []
+    for _ in range(3):
+        before = datetime.utcnow()
+        assert run_jobs(db) == 1
+        delays.append(round((job(db, job_id)["run_at"] - before).total_seconds()))
+        job(db, job_id)["run_at"] = before  # due again
+
+    failed = job(db, job_id)
+    assert delays[:2] == [10, 20]
+    assert (failed["status"], failed["attempts"], failed["error"]) == ("failed", 3, "RuntimeError: upstream down")
+    assert failed["finished_at"] is not None and run_jobs(db) == 0
+
+def test_jobs_of_a_dead_worker_are_requeued_and_count_as_an_attempt(handlers):
+    db = FakeDB()
+
+    @job_handler("once", max_attempts=1)
+    async def once(db, job):
+        return "done"
+
+    async def run():
+        queued = await enqueue_job(db, "once")
+        await claim_job(db, "dead-worker", ["once"])
+        job(db, queued["_id"])["lease_until"] = datetime.utcnow() - timedelta(seconds=1)
+        assert await requeue_expired(db) == 1
+        await run_job(db, await claim_job(db, "live-worker", ["once"]))
+        return queued["_id"]
+
+    lost = job(db, asyncio.run(run()))
+    assert (lost["status"], lost["attempts"], lost["error"]) == ("failed", 2, "Lease expired")
+
+def test_a_running_job_stops_when_cancelled(handlers):
+    db = FakeDB()
+    stopped = []
+
+    @job_handler("slow", lease_seconds=0.03)
+    async def slow(db, job):
+        try:
+            await asyncio.sleep(60)
+        finally:
+            stopped.append(job["_id"])
+
+    async def run():
+        queued = await enqueue_job(db, "slow")
+        waiting = await enqueue_job(db, "slow")
+        running = asyncio.create_task(run_job(db, await claim_job(db, "a", ["slow"])))
+        await asyncio.sleep(0)
+        assert (await cancel_job(db, queued["_id"]))["cancel_requested"]
+        assert (await cancel_job(db, waiting["_id"]))["status"] == "cancelled"
+        await asyncio.wait_for(running, timeout=1)
+        return queued["_id"]
+
+    job_id = asyncio.run(run())
+    assert job(db, job_id)["status"] == "cancelled" and stopped == [job_id]
+
+def test_dispatch_respects_per_type_concurrency(handlers, monkeypatch):
+    monkeypatch.setattr(settings, "JOBS_MAX_CONCURRENT", 3)
+    db = FakeDB()
+
+    async def run():
+        release = asyncio.Event()
+
+        @job_handler("export", concurrency=1)
+        async def export(db, job):
+            await release.wait()
+
+        @job_handler("ocr", concurrency=2)
+        async def ocr(db, job):
+            await release.wait()
+
+        for job_type in ("export", "export", "ocr", "ocr", "ocr"):
+            await enqueue_job(db, job_type)
+        jobs_state.worker_id = "worker-a"
+        assert await dispatch_jobs(db) == 3
+        running = sorted((doc["type"], doc["slot"]) for doc in db[JOBS_COLLECTION].docs if doc["status"] == "running")
+        assert running == [("export", 0), ("ocr", 0), ("ocr", 1)]
+        # Another worker gets nothing: the limits hold across workers
+        assert await claim_job(db, "worker-b", ["export", "ocr"]) is None
+        release.set()
+        await asyncio.gather(*jobs_state.running.values())
+        assert jobs_state.running == {} and await dispatch_jobs(db) == 2
+        await asyncio.gather(*jobs_state.running.values())
+
+    asyncio.run(run())
+    assert sorted(doc["status"] for doc in db[JOBS_COLLECTION].docs) == ["succeeded"] * 5
+
+def test_a_slot_taken_by_a_racing_worker_hands_the_job_back(handlers, monkeypatch):
+    db = FakeDB()
+    db[JOBS_COLLECTION].unique = [("type", "slot")]
+
+    @job_handler("export")
+    async def export(db, job):
+        return None
+
+    async def run():
+        first = await enqueue_job(db, "export")
+        second = await enqueue_job(db, "export")
+        assert (await claim_job(db, "a", ["export"]))["slot"] == 0
+        # Worker b read the slots before a's claim landed
+        monkeypatch.setattr(db[JOBS_COLLECTION], "find", lambda *args, **kwargs: FakeCursor([]))
+        assert await claim_job(db, "b", ["export"]) is None
+        return first["_id"], second["_id"]
+
+    first, second = asyncio.run(run())
+    assert job(db, first)["status"] == "running"
+    assert (job(db, second)["status"], job(db, second)["attempts"], job(db, second)["worker"]) == ("queued", 0, None)
+
+    monkeypatch.undo()
+    asyncio.run(run_job(db, job(db, first)))
+    assert "slot" not in job(db, first)
+    assert asyncio.run(claim_job(db, "b", ["export"]))["_id"] == second
+
+def test_account_data_is_deleted_by_a_job_admins_can_follow():
+    db = FakeDB()
+    admin = make_user(db, role="admin")
+    user = make_user(db)
+    make_expense(db, user)
+    client = api_client(db)
+
+    assert client.delete(f"/api/admin/users/{user['_id']}", headers=auth_headers(admin)).status_code == 204
+    assert db.users.docs == [admin] and len(db.expenses.docs) == 1
+    assert run_jobs(db) == 1
+    assert db.expenses.docs == [] and {doc["user_id"] for doc in db.categories.docs} == {str(admin["_id"])}
+
+    [listed] = client.get("/api/admin/jobs?status=succeeded", headers=auth_headers(admin)).json()
+    assert (listed["type"], listed["result"]["deleted"]["expenses"]) == ("account.delete", 1)
+    assert client.get(f"/api/jobs/{listed['_id']}", headers=auth_headers(admin)).json()["status"] == "succeeded"
+
+    other = make_user(db)
+    assert client.get(f"/api/jobs/{listed['_id']}", headers=auth_headers(other)).status_code == 404
+    rebuild = client.post("/api/admin/jobs", json={"type": "merchant_index.rebuild"}, headers=auth_headers(admin))
+    assert (rebuild.status_code, rebuild.json()["status"]) == (202, "queued")
+    assert client.post("/api/admin/jobs", json={"type": "account.delete"}, headers=auth_headers(admin)).status_code == 400
@@ -0,0 +1,92 @@
+import asyncio
+from datetime import datetime
+import pytest
+from config import settings
+from fake_mongo import FakeDB
+from live_events import LIVE_EVENTS_COLLECTION, _flush_loop, event_stream, live_events, publish
+from query_budget import api_client, auth_headers, make_expense, make_user
+
+@pytest.fixture
+def subscription():
+    user_id = "user-1"
+    queue = live_events.subscribe(user_id)
+    yield user_id, queue
+    live_events.unsubscribe(user_id, queue)
+
+def drain(queue):
+    events = []
+    while not queue.empty():
+        events.append(queue.get_nowait())
+    return events
+
+def test_writes_publish_deltas_in_the_users_currency():
+    db = FakeDB()
+    user = make_user(db, currency="USD")
+    old = make_expense(db, user, amount=10.0, currency="USD", date=datetime(2024, 5, 1))
+    queue = live_events.subscribe(str(user["_id"]))
+    client = api_client(db)
+    headers = auth_headers(user)
+    try:
+        client.post("/api/expenses", json={"merchant": "Uber", "amount": 12.0, "category": "Transportation",
+                                           "date": "2024-05-02T09:00:00"}, headers=headers)
+        client.put(f"/api/expenses/{old['_id']}", json={"category": "Shopping"}, headers=headers)
+        client.delete(f"/api/expenses/{old['_id']}", headers=headers)
+    finally:
+        live_events.unsubscribe(str(user["_id"]), queue)
+
+    created, updated, deleted = drain(queue)
+    assert (created["type"], created["expense"]["merchant"], created["expense"]["currency"]) == ("expense.created", "Uber", "USD")
+    assert created["totals"] == {"currency": "USD", "count": 1, "amount": 12.0,
+                                 "categories": {"Transportation": {"count": 1, "amount": 12.0}}, "days": {"2024-05-02": 12.0}}
+    # Moving an expense between categories leaves the totals alone
+    assert (updated["totals"]["count"], updated["totals"]["amount"], updated["totals"]["days"]) == (0, 0.0, {})
+    assert updated["totals"]["categories"] == {"Shopping": {"count": 1, "amount": 10.0}, "Food & Dining": {"count": -1, "amount": -10.0}}
+    assert (deleted["type"], deleted["id"], deleted["totals"]["amount"]) == ("expense.deleted", str(old["_id"]), -10.0)
+    assert live_events.subscribers == {}
+
+def test_a_client_that_falls_behind_is_told_to_resync(subscription, monkeypatch):
+    user_id, queue = subscription
+    for n in range(settings.LIVE_EVENTS_QUEUE_SIZE + 1):
+        publish(user_id, "expense.deleted", id=str(n))
+    publish("someone-else", "expense.deleted", id="x")
+    assert drain(queue) == [{"type": "resync"}]
+
+def test_event_stream_formats_events_and_ends_on_disconnect(subscription, monkeypatch):
+    user_id, queue = subscription
+    monkeypatch.setattr(settings, "LIVE_EVENTS_HEARTBEAT_SECONDS", 0.01)
+    publish(user_id, "category.deleted", category={"name": "Travel"})
+    disconnected = iter([False, True])
+
+    async def is_disconnected():
+        return next(disconnected)
+
+    async def collect():
+        return [chunk async for chunk in event_stream(user_id, queue, is_disconnected)]
+
+    chunks = asyncio.run(collect())
+    assert chunks == [
+        "retry: 3000\n\n",
+        'event: category.deleted\ndata: {"type": "category.deleted", "category": {"name": "Travel"}}\n\n',
+        ": keep-alive\n\n",
+    ]
+    assert user_id not in live_events.subscribers
+
+def test_events_are_written_for_other_workers_in_batches():
+    db = FakeDB()
+
+    async def run():
+        live_events.worker_id = "worker-a"
+        live_events.outbox = asyncio.Queue()
+        try:
+            publish("user-1", "expense.deleted", id="1")
+            publish("user-2", "expense.deleted", id="2")
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(_flush_loop(db), timeout=0.05)
+        finally:
+            live_events.outbox = None
+
+    asyncio.run(run())
+    records = db[LIVE_EVENTS_COLLECTION].docs
+    assert [(record["user_id"], record["worker"], record["event"]["id"]) for record in records] == [
+        ("user-1", "worker-a", "1"), ("user-2", "worker-a", "2"),
+    ]
@@ -0,0 +1,55 @@
+import asyncio
+from fake_mongo import FakeDB
+from merchant_index import (
+    normalize_merchant, record_merchant_category, rename_category,
+    forget_category, lookup_merchant_category, rebuild_merchant_index
+)
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_normalize_merchant_strips_store_numbers_and_suffixes():
+    assert normalize_merchant("STARBUCKS #1234") == "starbucks"
+    assert normalize_merchant("Starbucks Store") == "starbucks"
+    assert normalize_merchant("  ") is None
+
+def test_decrement_to_zero_removes_pair():
+    db = FakeDB()
+    run(record_merchant_category(db, "u1", "Uber", "Transportation"))
+    run(record_merchant_category(db, "u1", "Uber", "Transportation", delta=-1))
+    assert db.merchant_categories.docs == []
+
+def test_rename_merges_into_existing_pair():
+    db = FakeDB()
+    run(record_merchant_category(db, "u1", "Uber", "Taxi"))
+    run(record_merchant_category(db, "u1", "Uber", "Taxi"))
+    run(record_merchant_category(db, "u1", "Uber", "Transport"))
+    run(rename_category(db, "u1", "Taxi", "Transport"))
+
+    rows = db.merchant_categories.docs
+    assert [(r["category"], r["count"]) for r in rows] == [("Transport", 3)]
+    assert run(lookup_merchant_category(db, "u1", "UBER")) == ("Transport", 0.2)
+
+def test_forget_category_only_touches_that_user():
+    db = FakeDB()
+    run(record_merchant_category(db, "u1", "Netflix", "Fun"))
+    run(record_merchant_category(db, "u2", "Netflix", "Fun"))
+    run(forget_category(db, "u1", "Fun"))
+    assert [r["user_id"] for r in db.merchant_categories.docs] == ["u2"]
+
+def test_rebuild_replaces_stale_rows_without_emptying_index():
+    db = FakeDB(expenses=[
+        {"user_id": "u1", "merchant": "Uber", "category": "Transportation"},
+        {"user_id": "u1", "merchant": "UBER #12", "category": "Transportation"},
+        {"user_id": "u2", "merchant": "Uber", "category": "Travel"},
+    ])
+    run(record_merchant_category(db, "u1", "Uber", "Transportation"))
+    run(record_merchant_category(db, "u1", "Zomato", "Shopping"))
+    run(record_merchant_category(db, "u2", "Zomato", "Shopping"))
+    for row in db.merchant_categories.docs:
+        row["updated_at"] = row["updated_at"].replace(year=2000)
+
+    assert run(rebuild_merchant_index(db, "u1")) == 1
+
+    rows = sorted((r["user_id"], r["merchant_key"], r["category"], r["count"]) for r in db.merchant_categories.docs)
+    assert rows == [("u1", "uber", "Transportation", 2), ("u2", "zomato", "Shopping", 1)]
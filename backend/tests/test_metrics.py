@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from metrics import MetricsMiddleware, CommandMetricsListener, Histogram, render_metrics
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("demo_seconds", "Demo", ("route",), buckets=[0.1, 1])
+    histogram.observe(("/a",), 0.05)
+    histogram.observe(("/a",), 0.5)
+    histogram.observe(("/a",), 5)
+    lines = histogram.render()
+    assert 'demo_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{route="/a",le="1"} 2' in lines
+    assert 'demo_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'demo_seconds_count{route="/a"} 3' in lines
+
+def test_middleware_labels_by_route_template():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        if item_id == 0:
+            raise HTTPException(status_code=404)
+        return {"id": item_id}
+
+    client = TestClient(app)
+    client.get("/items/1")
+    client.get("/items/2")
+    client.get("/items/0")
+    client.get("/nowhere/42")
+
+    output = render_metrics()
+    assert 'http_requests_total{method="GET",route="/items/{item_id}",status="200"} 2' in output
+    assert 'http_requests_total{method="GET",route="/items/{item_id}",status="404"} 1' in output
+    assert 'route="unmatched",status="404"' in output
+    assert "/items/1" not in output
+
+def test_command_listener_times_by_collection():
+    listener = CommandMetricsListener()
+    started = SimpleNamespace(command_name="find", command={"find": "expenses_metrics_test"}, connection_id=("h", 1), request_id=7)
+    listener.started(started)
+    listener.succeeded(SimpleNamespace(command_name="find", connection_id=("h", 1), request_id=7, duration_micros=1500))
+    assert 'mongodb_command_duration_seconds_count{collection="expenses_metrics_test",command="find"} 1' in render_metrics()
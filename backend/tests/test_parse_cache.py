@@ -0,0 +1,60 @@
+import asyncio
+from datetime import datetime
+import parse_cache
+from parse_cache import (
+    ParseResultLRU, sms_content_hash, get_cached_parse, store_parse, invalidate_user_cache
+)
+from models import ParsedExpenseData
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = {}
+
+    async def find_one(self, query, projection=None):
+        return self.docs.get(query["_id"])
+
+    async def update_one(self, query, update, upsert=False):
+        self.docs[query["_id"]] = dict(update["$set"])
+
+    async def delete_many(self, query):
+        self.docs = {k: v for k, v in self.docs.items() if v["user_id"] != query["user_id"]}
+
+class FakeDB:
+    def __init__(self):
+        self.parse_cache = FakeCollection()
+
+def test_sms_hash_ignores_whitespace():
+    assert sms_content_hash("Spent  Rs.500\nat Starbucks ") == sms_content_hash("Spent Rs.500 at Starbucks")
+
+def test_lru_evicts_oldest_and_expires():
+    lru = ParseResultLRU(max_size=2, ttl_seconds=60)
+    lru.set(("u", "sms", "a"), 1)
+    lru.set(("u", "sms", "b"), 2)
+    lru.get(("u", "sms", "a"))
+    lru.set(("u", "sms", "c"), 3)
+    assert lru.get(("u", "sms", "b")) is None
+    assert lru.get(("u", "sms", "a")) == 1
+
+    expired = ParseResultLRU(max_size=2, ttl_seconds=-1)
+    expired.set(("u", "sms", "a"), 1)
+    assert expired.get(("u", "sms", "a")) is None
+
+def test_defaulted_date_is_refreshed_and_invalidation_clears_store():
+    db = FakeDB()
+    parse_cache.memory_cache.clear()
+
+    async def scenario():
+        parsed = ParsedExpenseData(merchant="Uber", amount=12.0, date=datetime(2020, 1, 1))
+        await store_parse(db, "u1", "sms", "h", parsed, date_defaulted=True)
+        parse_cache.memory_cache.clear()
+        hit = await get_cached_parse(db, "u1", "sms", "h")
+        await invalidate_user_cache(db, "u1")
+        return hit, await get_cached_parse(db, "u1", "sms", "h")
+
+    hit, after = asyncio.run(scenario())
+    assert hit.merchant == "Uber"
+    assert hit.date.year == datetime.utcnow().year
+    assert after is None
+
+def test_memory_ttl_is_short():
+    assert parse_cache.memory_cache.ttl_seconds <= 60
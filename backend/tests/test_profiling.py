@@ -0,0 +1,56 @@
+import asyncio
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import profiling
+from config import settings
+from profiling import ProfilingMiddleware, list_profiles, read_folded_profile
+
+def busy_work():
+    return sum(i * i for i in range(20000))
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "PROFILE_DIR", str(tmp_path))
+
+    async def is_admin(token):
+        return token == "admin-token"
+
+    monkeypatch.setattr(profiling, "is_admin_token", is_admin)
+
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware)
+
+    @app.get("/stats")
+    async def stats():
+        await asyncio.sleep(0.02)
+        return {"total": busy_work()}
+
+    return TestClient(app)
+
+def test_unflagged_requests_are_not_profiled(client):
+    response = client.get("/stats", headers={"Authorization": "Bearer admin-token"})
+    assert "x-profile-id" not in response.headers
+    assert list_profiles() == []
+
+def test_non_admin_flag_is_ignored(client):
+    response = client.get("/stats?profile=1", headers={"Authorization": "Bearer user-token"})
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
+
+def test_admin_request_is_profiled(client):
+    response = client.get("/stats", headers={"Authorization": "Bearer admin-token", "X-Profile": "1"})
+    assert response.json()["total"] == busy_work()
+
+    profile_id = response.headers["x-profile-id"]
+    assert "cpu;dur=" in response.headers["server-timing"]
+
+    [summary] = list_profiles()
+    assert summary["id"] == profile_id
+    assert summary["route"] == "/stats"
+    assert summary["awaitMs"] >= 15  # the sleep is awaited, not spent on the CPU
+    assert summary["cpuMs"] < summary["wallMs"]
+
+    folded = read_folded_profile(profile_id)
+    assert any("stats (test_profiling.py" in line and "busy_work" in line for line in folded.splitlines())
+    assert read_folded_profile("../etc/passwd") is None
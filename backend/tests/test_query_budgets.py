@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+from query_budget import CATEGORIES, api_client, auth_headers, assert_max_round_trips, make_expense, make_user, round_trips
+
+# Maximum MongoDB round trips per request, including authentication.
+# Raising one of these should be a deliberate decision, not a side effect.
+BUDGETS = {
+    "list_expenses": 2,
+    "create_expense": 5,
+    "bulk_create_expenses": 5,
+    "create_expense_with_idempotency_key": 7,
+    "replayed_create_expense": 1,
+    "update_expense": 7,
+    "parse_sms": 5,
+    "admin_users": 3,
+    "admin_user_details": 3,
+}
+
+def test_admin_users_round_trips_do_not_grow_with_page_size(db):
+    admin = make_user(db, role="admin")
+    client = api_client(db)
+
+    user = make_user(db)
+    make_expense(db, user)
+    one_user = client.get("/api/admin/users", headers=auth_headers(admin))
+    assert_max_round_trips(one_user, BUDGETS["admin_users"])
+
+    for _ in range(5):
+        make_expense(db, make_user(db), amount=10)
+    many_users = client.get("/api/admin/users", headers=auth_headers(admin))
+    assert_max_round_trips(many_users, BUDGETS["admin_users"])
+    assert round_trips(many_users) == round_trips(one_user)
+
+    stats = {row["email"]: row for row in many_users.json()}
+    assert stats[user["email"]]["expenses"] == 1
+    assert stats[user["email"]]["totalAmount"] == 4.5
+    assert stats[admin["email"]]["expenses"] == 0
+
+def test_admin_user_details(db):
+    admin = make_user(db, role="admin")
+    user = make_user(db)
+    make_expense(db, user)
+    make_expense(db, user, amount=5.5)
+    response = api_client(db).get(f"/api/admin/users/{user['_id']}", headers=auth_headers(admin))
+    assert_max_round_trips(response, BUDGETS["admin_user_details"])
+    assert (response.json()["expenses"], response.json()["totalAmount"]) == (2, 10.0)
+
+def test_list_expenses(db):
+    user = make_user(db)
+    for _ in range(20):
+        make_expense(db, user)
+    response = api_client(db).get("/api/expenses", headers=auth_headers(user))
+    assert_max_round_trips(response, BUDGETS["list_expenses"])
+    assert len(response.json()) == 20
+
+def test_create_expense(db):
+    user = make_user(db)
+    response = api_client(db).post("/api/expenses", headers=auth_headers(user), json={
+        "merchant": "Uber", "amount": 12.0, "category": "Transportation", "date": "2024-05-02T10:00:00",
+    })
+    assert_max_round_trips(response, BUDGETS["create_expense"])
+
+def test_idempotency_key_costs_two_round_trips_and_a_retry_only_authentication(db):
+    user = make_user(db)
+    client = api_client(db)
+    headers = {**auth_headers(user), "Idempotency-Key": "budget-1"}
+    body = {"merchant": "Uber", "amount": 12.0, "category": "Transportation", "date": "2024-05-02T10:00:00"}
+    assert_max_round_trips(client.post("/api/expenses", headers=headers, json=body), BUDGETS["create_expense_with_idempotency_key"])
+    assert_max_round_trips(client.post("/api/expenses", headers=headers, json=body), BUDGETS["replayed_create_expense"])
+
+def test_bulk_create_round_trips_do_not_grow_with_batch_size(db):
+    user = make_user(db)
+    batch = [
+        {"merchant": merchant, "amount": 10.0 + i, "category": CATEGORIES[i % 3], "date": f"2024-05-{i + 1:02d}T10:00:00"}
+        for i, merchant in enumerate(["Uber", "Lyft", "Amazon", "Starbucks", "Target", "Shell"])
+    ]
+    response = api_client(db).post("/api/expenses/bulk", headers=auth_headers(user), json=batch)
+    assert_max_round_trips(response, BUDGETS["bulk_create_expenses"])
+    assert len(response.json()["inserted"]) == 6
+    assert sorted(c["count"] for c in db.categories.docs) == [2, 2, 2]
+    assert len(db.merchant_categories.docs) == 6
+
+def test_update_expense(db):
+    user = make_user(db)
+    expense = make_expense(db, user)
+    db.categories.docs[0]["count"] = 1
+    response = api_client(db).put(f"/api/expenses/{expense['_id']}", headers=auth_headers(user), json={
+        "category": "Shopping", "amount": 6.0,
+    })
+    assert_max_round_trips(response, BUDGETS["update_expense"])
+    assert (response.json()["category"], response.json()["amount"]) == ("Shopping", 6.0)
+    assert {c["name"]: c["count"] for c in db.categories.docs} == {"Food & Dining": 0, "Transportation": 0, "Shopping": 1}
+
+def test_parse_sms(db):
+    user = make_user(db)
+    response = api_client(db).post("/api/parse/sms", headers=auth_headers(user), json={
+        "text": "Rs.250.00 debited from A/c XX1234 at SWIGGY on 02-05-2024",
+    })
+    assert_max_round_trips(response, BUDGETS["parse_sms"])
+
+def test_last_active_is_written_at_most_once_per_interval(db):
+    user = make_user(db, last_active=datetime.utcnow() - timedelta(days=1))
+    client = api_client(db)
+
+    first = client.get("/api/expenses", headers=auth_headers(user))
+    assert "update users" in first.headers["x-db-operations"]
+    assert db.users.docs[0]["last_active"] > datetime.utcnow() - timedelta(minutes=1)
+
+    second = client.get("/api/expenses", headers=auth_headers(user))
+    assert "update users" not in second.headers["x-db-operations"]
@@ -0,0 +1,111 @@
+import asyncio
+from datetime import datetime
+import pytest
+from fake_mongo import FakeCursor, FakeDB
+from query_budget import api_client, auth_headers, make_user
+from recurring import RECURRING_COLLECTION, materialize_due, next_occurrence, parse_cron
+
+@pytest.fixture
+def db(db):
+    db.expenses.unique = [("recurring_id", "date")]
+    return db
+
+def cron_after(expression, after):
+    return next_occurrence({"cron": expression, "start_date": datetime(2024, 1, 1)}, after)
+
+def test_cron_expressions():
+    monday = datetime(2024, 5, 6, 9, 0)
+    assert cron_after("0 9 * * 1", monday) == datetime(2024, 5, 13, 9, 0)
+    assert cron_after("0 9 * * 1-5", monday) == datetime(2024, 5, 7, 9, 0)
+    assert cron_after("*/15 * * * *", datetime(2024, 5, 6, 9, 7, 30)) == datetime(2024, 5, 6, 9, 15)
+    assert cron_after("30 8 1,15 * *", datetime(2024, 5, 2)) == datetime(2024, 5, 15, 8, 30)
+    assert cron_after("0 0 * * 7", monday) == datetime(2024, 5, 12)
+    # Both day fields restricted: the 13th or any Friday
+    assert cron_after("0 0 13 * 5", datetime(2024, 5, 6)) == datetime(2024, 5, 10)
+    assert cron_after("0 0 29 2 *", datetime(2024, 3, 1)) == datetime(2028, 2, 29)
+    for expression in ("0 9 * *", "60 * * * *", "0 0 31-1 * *", "* * * * */0"):
+        with pytest.raises(ValueError):
+            parse_cron(expression)
+
+def test_intervals_are_counted_from_the_start_date():
+    monthly = {"every": 1, "unit": "month", "start_date": datetime(2024, 1, 31, 12, 0)}
+    runs = [next_occurrence(monthly)]
+    for _ in range(3):
+        runs.append(next_occurrence(monthly, runs[-1]))
+    assert [run.date().isoformat() for run in runs] == ["2024-01-31", "2024-02-29", "2024-03-31", "2024-04-30"]
+
+    fortnightly = {"every": 2, "unit": "week", "start_date": datetime(2024, 5, 1), "end_date": datetime(2024, 6, 1)}
+    assert next_occurrence(fortnightly, datetime(2024, 5, 20)) == datetime(2024, 5, 29)
+    assert next_occurrence(fortnightly, datetime(2024, 5, 29)) is None
+
+def create_rule(client, user, **fields):
+    body = {"merchant": "Netflix", "amount": 15.0, "category": "Shopping",
+            "start_date": "2024-01-15T08:00:00", **fields}
+    return client.post("/api/recurring", json=body, headers=auth_headers(user))
+
+def test_missed_occurrences_are_caught_up_once(db):
+    user = make_user(db)
+    rule = create_rule(api_client(db), user).json()
+    assert rule["next_run"] == "2024-01-15T08:00:00"
+
+    assert asyncio.run(materialize_due(db, now=datetime(2024, 5, 20))) == 1
+    assert sorted(e["date"].month for e in db.expenses.docs) == [1, 2, 3, 4, 5]
+    assert {e["source"] for e in db.expenses.docs} == {"recurring"}
+    stored = db[RECURRING_COLLECTION].docs[0]
+    assert (stored["next_run"], stored["occurrences"]) == (datetime(2024, 6, 15, 8, 0), 5)
+    shopping = next(c for c in db.categories.docs if c["name"] == "Shopping")
+    assert shopping["count"] == 5
+    assert shopping["monthly_spend"]["2024-03"] == 15.0
+
+    # Nothing is due until the next occurrence
+    assert asyncio.run(materialize_due(db, now=datetime(2024, 6, 1))) == 0
+    assert len(db.expenses.docs) == 5
+
+def test_occurrences_written_by_another_worker_are_not_counted_twice(db):
+    user = make_user(db)
+    create_rule(api_client(db), user)
+    rule = dict(db[RECURRING_COLLECTION].docs[0])
+    asyncio.run(materialize_due(db, now=datetime(2024, 3, 1)))
+
+    # A second worker that read the rule before the first advanced it
+    db[RECURRING_COLLECTION].docs[0].update(next_run=rule["next_run"], occurrences=0)
+    asyncio.run(materialize_due(db, now=datetime(2024, 3, 20)))
+
+    assert sorted(e["date"].month for e in db.expenses.docs) == [1, 2, 3]
+    assert next(c for c in db.categories.docs if c["name"] == "Shopping")["count"] == 3
+
+def test_a_rule_is_written_by_one_worker_before_the_unique_index_exists(monkeypatch):
+    db = FakeDB()  # no unique (recurring_id, date): indexes are still building
+    user = make_user(db)
+    create_rule(api_client(db), user)
+    stale = [dict(rule) for rule in db[RECURRING_COLLECTION].docs]
+    asyncio.run(materialize_due(db, now=datetime(2024, 3, 1)))
+
+    # A second worker that read the rule before the first advanced it
+    monkeypatch.setattr(db[RECURRING_COLLECTION], "find", lambda *args, **kwargs: FakeCursor([dict(rule) for rule in stale]))
+    assert asyncio.run(materialize_due(db, now=datetime(2024, 3, 1))) == 1
+
+    assert sorted(e["date"].month for e in db.expenses.docs) == [1, 2]
+    assert next(c for c in db.categories.docs if c["name"] == "Shopping")["count"] == 2
+    assert db[RECURRING_COLLECTION].docs[0]["occurrences"] == 2
+
+def test_rules_are_validated_and_ended_rules_deactivated(db):
+    user = make_user(db)
+    client = api_client(db)
+    assert create_rule(client, user, cron="0 9 * *").status_code == 400
+    assert create_rule(client, user, category="Yachts").status_code == 400
+
+    rule = create_rule(client, user, every=1, unit="week", end_date="2024-01-29T08:00:00").json()
+    asyncio.run(materialize_due(db, now=datetime(2024, 3, 1)))
+    assert len(db.expenses.docs) == 3
+    listed = client.get("/api/recurring", headers=auth_headers(user)).json()
+    assert [(r["_id"], r["active"], r["next_run"]) for r in listed] == [(rule["_id"], False, None)]
+
+    response = client.put(f"/api/recurring/{rule['_id']}", json={"end_date": None}, headers=auth_headers(user))
+    assert (response.json()["active"], response.json()["next_run"]) == (True, "2024-03-04T08:00:00")
+
+    # Paused rules keep their place but skip what fell due while paused
+    client.put(f"/api/recurring/{rule['_id']}", json={"active": False}, headers=auth_headers(user))
+    assert asyncio.run(materialize_due(db, now=datetime(2024, 3, 20))) == 0
+    resumed = client.put(f"/api/recurring/{rule['_id']}", json={"active": True}, headers=auth_headers(user)).json()
+    assert resumed["next_run"] > datetime.utcnow().isoformat()
@@ -0,0 +1,53 @@
+from datetime import datetime, timezone
+import pytest
+from fake_mongo import FakeDB
+from query_budget import api_client, auth_headers, make_expense, make_user
+from response_formats import COLUMNAR_MEDIA_TYPE, to_columns
+
+@pytest.fixture
+def setup():
+    db = FakeDB()
+    user = make_user(db)
+    make_expense(db, user, merchant="Uber", date=datetime(2024, 5, 2))
+    make_expense(db, user, merchant="Starbucks", date=datetime(2024, 5, 1), fingerprint="v2|450|2024-05-01|starbucks")
+    return api_client(db), auth_headers(user)
+
+def test_to_columns_keeps_field_order():
+    rows = [{"a": 1, "b": "x"}, {"a": 2}]
+    assert to_columns(rows, ["b", "a"]) == {"count": 2, "columns": {"b": ["x", None], "a": [1, 2]}}
+
+def test_columnar_matches_json_rows(setup):
+    client, headers = setup
+    rows = client.get("/api/expenses", headers=headers).json()
+
+    response = client.get("/api/expenses", headers={**headers, "Accept": COLUMNAR_MEDIA_TYPE})
+    assert response.headers["content-type"] == COLUMNAR_MEDIA_TYPE
+    body = response.json()
+    assert body["count"] == 2
+    assert body["columns"]["merchant"] == ["Uber", "Starbucks"]
+
+    rebuilt = [{field: values[i] for field, values in body["columns"].items()} for i in range(body["count"])]
+    assert rebuilt == [{key: value for key, value in row.items() if key != "possible_duplicate_of"} for row in rows]
+
+def test_format_query_parameter_wins(setup):
+    client, headers = setup
+    response = client.get("/api/expenses?format=json", headers={**headers, "Accept": COLUMNAR_MEDIA_TYPE})
+    assert isinstance(response.json(), list)
+    assert client.get("/api/expenses?format=xml", headers=headers).status_code == 422
+
+def test_msgpack_round_trip(setup):
+    msgpack = pytest.importorskip("msgpack")
+    client, headers = setup
+    response = client.get("/api/expenses?format=msgpack", headers=headers)
+    assert response.headers["content-type"] == "application/msgpack"
+    body = msgpack.unpackb(response.content, timestamp=3)
+    assert body["columns"]["merchant"] == ["Uber", "Starbucks"]
+    assert body["columns"]["date"][0] == datetime(2024, 5, 2, tzinfo=timezone.utc)
+
+def test_export_is_an_attachment_without_internal_fields(setup):
+    client, headers = setup
+    response = client.get("/api/expenses/export", headers=headers)
+    assert response.headers["content-disposition"].startswith('attachment; filename="expenses-')
+    rows = response.json()
+    assert [row["merchant"] for row in rows] == ["Uber", "Starbucks"]
+    assert "fingerprint" not in rows[1]
@@ -0,0 +1,107 @@
+import pytest
+import server
+from config import settings
+
+class Process:
+    def __init__(self, pid, exitcode=None):
+        self.pid = pid
+        self.exitcode = exitcode
+
+    def is_alive(self):
+        return self.exitcode is None
+
+    def join(self, timeout=None):
+        pass
+
+    def terminate(self):
+        self.exitcode = -15
+
+class Conn:
+    def poll(self, timeout=0):
+        return False
+
+    def close(self):
+        pass
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(server.time, "monotonic", clock)
+
+    def no_sleep(seconds):
+        raise AssertionError("the supervisor must not block")
+    monkeypatch.setattr(server.time, "sleep", no_sleep)
+    return clock
+
+@pytest.fixture
+def supervisor(monkeypatch):
+    supervisor = server.Supervisor("main:app", "127.0.0.1", 0, workers=2)
+    pids = iter(range(100, 200))
+    monkeypatch.setattr(supervisor, "spawn", lambda: server.Worker(Process(next(pids)), Conn()))
+    return supervisor
+
+def test_crashed_worker_is_respawned_after_its_backoff_without_blocking(supervisor, clock):
+    supervisor.workers = [supervisor.spawn(), supervisor.spawn()]
+    supervisor.workers[0].process.exitcode = 1
+
+    supervisor.reap()
+    assert [w.process.pid for w in supervisor.workers] == [101]
+    assert supervisor.respawn_at == [clock.now + server.CRASH_BACKOFF_SECONDS]
+
+    clock.now += server.CRASH_BACKOFF_SECONDS / 2
+    supervisor.reap()
+    assert len(supervisor.workers) == 1
+
+    clock.now += server.CRASH_BACKOFF_SECONDS
+    supervisor.reap()
+    assert [w.process.pid for w in supervisor.workers] == [101, 102]
+    assert supervisor.respawn_at == []
+    assert supervisor.crash_backoff == server.CRASH_BACKOFF_SECONDS * 2
+
+def test_recycled_worker_is_replaced_on_the_same_tick(supervisor, clock):
+    worker = supervisor.spawn()
+    worker.ready = True
+    worker.process.exitcode = 0
+    supervisor.workers = [worker]
+    supervisor.crash_backoff = server.MAX_CRASH_BACKOFF_SECONDS
+
+    supervisor.reap()
+    assert [w.process.pid for w in supervisor.workers] == [101]
+    assert supervisor.crash_backoff == server.CRASH_BACKOFF_SECONDS
+
+def test_no_respawn_while_shutting_down(supervisor, clock):
+    supervisor.workers = [supervisor.spawn()]
+    supervisor.workers[0].process.exitcode = 1
+    supervisor.should_exit = True
+
+    supervisor.reap()
+    clock.now += server.MAX_CRASH_BACKOFF_SECONDS
+    supervisor.reap()
+    assert supervisor.workers == []
+
+def test_run_gives_up_when_no_worker_becomes_ready(supervisor, monkeypatch):
+    class Socket:
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    def bind():
+        supervisor.sock = Socket()
+    monkeypatch.setattr(supervisor, "bind", bind)
+    monkeypatch.setattr(supervisor, "start_index_build", lambda: None)
+    monkeypatch.setattr(supervisor, "wait_ready", lambda worker: False)
+    monkeypatch.setattr(supervisor, "stop", lambda worker: None)
+    monkeypatch.setattr(server.signal, "signal", lambda *args: None)
+    monkeypatch.setattr(settings, "WORKER_READY_TIMEOUT", 0)
+
+    assert supervisor.run() == 1
+    assert supervisor.sock.closed
+    assert all(not w.process.is_alive() for w in supervisor.workers)
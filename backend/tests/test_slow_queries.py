@@ -0,0 +1,59 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from config import settings
+from slow_queries import redact, filter_shape, summarize_plan, SlowQueryLog
+
+def test_redact_keeps_operators_and_drops_values():
+    query = {"user_id": "abc", "$or": [{"merchant": {"$regex": "star", "$options": "i"}}], "date": {"$gte": 1}}
+    assert redact(query) == {
+        "user_id": "?",
+        "$or": [{"merchant": {"$regex": "?", "$options": "?"}}],
+        "date": {"$gte": "?"},
+    }
+    assert redact({"category": {"$in": ["a", "b", "c"]}}) == {"category": {"$in": ["?"]}}
+
+def test_filter_shape_of_update_uses_statement_filter():
+    command = {"update": "expenses", "updates": [{"q": {"_id": 1}, "u": {"$set": {"amount": 2}}}]}
+    assert filter_shape("update", command) == {"_id": "?"}
+
+def test_summarize_plan_walks_winning_plan():
+    explain = {
+        "queryPlanner": {"winningPlan": {
+            "stage": "FETCH",
+            "inputStage": {"stage": "IXSCAN", "indexName": "user_id_1_date_-1"},
+        }},
+        "executionStats": {"totalKeysExamined": 10, "totalDocsExamined": 10, "nReturned": 3, "executionTimeMillis": 4},
+    }
+    summary = summarize_plan(explain)
+    assert summary["stages"] == ["FETCH", "IXSCAN"]
+    assert summary["indexes"] == ["user_id_1_date_-1"]
+    assert summary["collectionScan"] is False
+    assert (summary["docsExamined"], summary["docsReturned"]) == (10, 3)
+
+def event(command_name, command=None, duration_ms=0, reply=None):
+    return SimpleNamespace(
+        command_name=command_name, command=command, database_name="db", connection_id=("h", 1),
+        request_id=1, duration_micros=int(duration_ms * 1000), reply=reply or {}
+    )
+
+def test_only_slow_commands_are_queued(monkeypatch):
+    monkeypatch.setattr(settings, "SLOW_QUERY_THRESHOLD_MS", 50)
+    log = SlowQueryLog()
+
+    async def scenario():
+        log._loop = asyncio.get_running_loop()
+        log._queue = asyncio.Queue()
+        command = {"find": "expenses", "filter": {"user_id": "u1", "merchant": {"$regex": "x"}}}
+        log.started(event("find", command))
+        log.succeeded(event("find", duration_ms=10))
+        log.started(event("find", command))
+        log.succeeded(event("find", duration_ms=80, reply={"cursor": {"firstBatch": [{}, {}]}}))
+        log.started(event("insert", {"insert": "slow_queries"}))
+        await asyncio.sleep(0)
+        return [log._queue.get_nowait()[2] for _ in range(log._queue.qsize())]
+
+    records = asyncio.run(scenario())
+    assert len(records) == 1
+    assert records[0]["docsReturned"] == 2
+    assert json.loads(records[0]["shape"]) == {"merchant": {"$regex": "?"}, "user_id": "?"}
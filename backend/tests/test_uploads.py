@@ -0,0 +1,73 @@
+import asyncio
+import hashlib
+import io
+import pytest
+from fastapi import HTTPException
+from starlette.datastructures import Headers, UploadFile
+from starlette.formparsers import MultiPartParser
+import parse_cache
+from fake_mongo import FakeDB
+from query_budget import api_client, auth_headers, make_user
+from uploads import configure_multipart_spooling, sniff_content_type, spool_upload, SPOOL_MAX_SIZE, CHUNK_SIZE
+
+def make_upload(data: bytes, content_type: str) -> UploadFile:
+    return UploadFile(io.BytesIO(data), filename="upload", headers=Headers({"content-type": content_type}))
+
+@pytest.mark.parametrize("head, expected", [
+    (b"\xff\xd8\xff\xe0\x00\x10JFIF", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n\x00\x00", "image/png"),
+    (b"RIFF\x00\x00\x00\x00WEBPVP8 ", "image/webp"),
+    (b"\x00\x00\x00\x1cftypheic\x00\x00", "image/heic"),
+    (b"\x00\x00\x00\x1cftypavif\x00\x00", "image/avif"),
+    (b"\x1a\x45\xdf\xa3\x9f\x42\x86\x81", "audio/webm"),
+    (b"RIFF\x00\x00\x00\x00WAVEfmt ", "audio/wav"),
+    (b"\x00\x00\x00\x20ftypM4A \x00\x00", "audio/mp4"),
+    (b"\x00\x00\x00\x20ftypmp41\x00\x00", "audio/mp4"),
+    (b"\x00\x00\x00\x20ftypiso5\x00\x00", "audio/mp4"),
+    (b"\x00\x00\x00\x20ftypdash\x00\x00", "audio/mp4"),
+    (b"ID3\x04\x00\x00\x00\x00", "audio/mpeg"),
+    (b"hello, world", None),
+])
+def test_sniff_content_type(head, expected):
+    assert sniff_content_type(head) == expected
+
+def test_spool_upload_hashes_and_spools_to_disk():
+    data = b"\x89PNG\r\n\x1a\n" + b"x" * (3 * CHUNK_SIZE)
+    upload = asyncio.run(spool_upload(make_upload(data, "image/png"), "image", 10 * 1024 * 1024))
+    with upload:
+        assert upload.size == len(data)
+        assert upload.content_type == "image/png"
+        assert upload.sha256 == hashlib.sha256(data).hexdigest()
+        assert upload.file.read() == data
+    assert SPOOL_MAX_SIZE == CHUNK_SIZE
+
+def test_multipart_parts_spool_after_one_chunk(monkeypatch):
+    monkeypatch.setattr(MultiPartParser, "max_file_size", MultiPartParser.max_file_size)
+    configure_multipart_spooling()
+    assert MultiPartParser.max_file_size == SPOOL_MAX_SIZE
+
+def test_spool_upload_rejects_oversized_file():
+    data = b"\x89PNG\r\n\x1a\n" + b"x" * (2 * CHUNK_SIZE)
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(spool_upload(make_upload(data, "image/png"), "image", CHUNK_SIZE))
+    assert exc.value.status_code == 413
+
+def test_spool_upload_rejects_mismatched_content():
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(spool_upload(make_upload(b"not really an image", "image/png"), "image", 1024))
+    assert exc.value.status_code == 415
+
+def test_cached_receipt_is_described_by_the_new_upload():
+    parse_cache.memory_cache.clear()
+    db = FakeDB()
+    user = make_user(db)
+    client = api_client(db)
+    image = b"\x89PNG\r\n\x1a\n" + b"x" * 100
+
+    def upload(filename):
+        files = {"file": (filename, image, "image/png")}
+        return client.post("/api/parse/receipt", files=files, headers=auth_headers(user)).json()
+
+    assert upload("lunch.png")["description"] == "Receipt uploaded: lunch.png"
+    assert upload("copy.png")["description"] == "Receipt uploaded: copy.png"
+    assert db.parse_cache.docs[0]["result"]["description"] is None
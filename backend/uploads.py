@@ -0,0 +1,170 @@
+import hashlib
+import tempfile
+from typing import Optional
+from fastapi import HTTPException, UploadFile, status
+from starlette.formparsers import MultiPartParser
+from models import AdminSettings
+
+# Read uploads in fixed-size chunks so peak memory per request stays bounded
+CHUNK_SIZE = 64 * 1024
+
+# Spooled files roll over to disk once they grow past one chunk
+SPOOL_MAX_SIZE = CHUNK_SIZE
+
+# Number of leading bytes needed to recognise every signature below
+SNIFF_SIZE = 16
+
+IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+]
+
+AUDIO_SIGNATURES = [
+    (b"ID3", "audio/mpeg"),
+    (b"OggS", "audio/ogg"),
+    (b"fLaC", "audio/flac"),
+    (b"\x1a\x45\xdf\xa3", "audio/webm"),
+    (b"#!AMR", "audio/amr"),
+]
+
+# ISO-BMFF major brands (bytes 8-12, after "ftyp")
+IMAGE_BRANDS = {
+    b"heic": "image/heic",
+    b"heix": "image/heic",
+    b"hevc": "image/heic",
+    b"heim": "image/heic",
+    b"heis": "image/heic",
+    b"mif1": "image/heif",
+    b"msf1": "image/heif",
+    b"avif": "image/avif",
+    b"avis": "image/avif",
+}
+
+AUDIO_BRANDS = {
+    b"M4A ", b"M4B ", b"M4P ", b"F4A ", b"F4B ",
+    b"mp41", b"mp42", b"isom", b"iso2", b"iso4", b"iso5", b"iso6",
+    b"dash", b"3gp4", b"3gp5", b"3gp6", b"3g2a", b"qt  ",
+}
+
+class SpooledUpload:
+    """An upload copied to a spooled temp file, with its size and content hash"""
+
+    def __init__(self, file, filename: Optional[str], content_type: str, size: int, sha256: str):
+        self.file = file
+        self.filename = filename
+        self.content_type = content_type
+        self.size = size
+        self.sha256 = sha256
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def configure_multipart_spooling():
+    """Make Starlette spool multipart file parts to disk after one chunk
+
+    Starlette keeps each part in memory up to MultiPartParser.max_file_size
+    (1 MiB) and builds the parser inside Request.form(), so the limit can
+    only be set on the class, once per process.
+    """
+    MultiPartParser.max_file_size = SPOOL_MAX_SIZE
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    """Detect the real media type of a file from its leading bytes"""
+    for signature, content_type in IMAGE_SIGNATURES + AUDIO_SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+
+    # RIFF and ISO-BMFF containers carry their brand after a length field
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "audio/wav"
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand in IMAGE_BRANDS:
+            return IMAGE_BRANDS[brand]
+        if brand in AUDIO_BRANDS:
+            return "audio/mp4"
+
+    # Bare MPEG audio frames start with an 11-bit sync word
+    if len(head) >= 2 and head[0] == 0xFF and (head[1] & 0xE0) == 0xE0:
+        return "audio/mpeg"
+
+    return None
+
+async def get_max_upload_bytes(db) -> int:
+    """Get the upload size limit from the admin maxFileSize setting"""
+    admin_settings = await db.settings.find_one({"_id": "admin_settings"}, {"maxFileSize": 1})
+    max_file_size = (admin_settings or {}).get("maxFileSize") or AdminSettings().maxFileSize
+    return int(max_file_size) * 1024 * 1024
+
+async def spool_upload(file: UploadFile, expected_kind: str, max_bytes: int) -> SpooledUpload:
+    """Stream an upload into a spooled temp file, enforcing size and media type
+
+    The content is read in CHUNK_SIZE pieces, hashed incrementally and rejected
+    as soon as it passes max_bytes or its magic bytes don't match expected_kind
+    ("image" or "audio").
+    """
+    if not (file.content_type or "").startswith(f"{expected_kind}/"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File must be an image" if expected_kind == "image" else "File must be an audio file"
+        )
+
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    digest = hashlib.sha256()
+    size = 0
+    sniffed_type = None
+
+    try:
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+
+            if size == 0:
+                sniffed_type = sniff_content_type(chunk[:SNIFF_SIZE])
+                if not sniffed_type or not sniffed_type.startswith(f"{expected_kind}/"):
+                    raise HTTPException(
+                        status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                        detail=f"File content is not a supported {expected_kind} format"
+                    )
+
+            size += len(chunk)
+            if size > max_bytes:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"File exceeds the maximum size of {max_bytes // (1024 * 1024)} MB"
+                )
+
+            digest.update(chunk)
+            spooled.write(chunk)
+
+        if size == 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="File is empty")
+
+        spooled.seek(0)
+    except BaseException:
+        spooled.close()
+        raise
+    finally:
+        await file.close()
+
+    return SpooledUpload(
+        file=spooled,
+        filename=file.filename,
+        content_type=sniffed_type,
+        size=size,
+        sha256=digest.hexdigest()
+    )
@@ -58,7 +58,11 @@ const AddManual = () => {
         source: 'manual',
       });
       addExpense(newExpense); // Add to store to trigger dashboard refresh
-      toast.success('Expense added successfully!');
+      if (newExpense.possible_duplicate_of) {
+        toast('Expense added, but it looks like a duplicate of one you already have', { icon: '⚠️' });
+      } else {
+        toast.success('Expense added successfully!');
+      }
       navigate('/expenses');
     } catch (error) {
       console.error('Error creating expense:', error);
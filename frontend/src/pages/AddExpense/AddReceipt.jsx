@@ -143,7 +143,11 @@ const AddReceipt = () => {
     try {
       const newExpense = await expenseService.create(parsedData);
       addExpense(newExpense);
-      toast.success('Expense added successfully!');
+      if (newExpense.possible_duplicate_of) {
+        toast('Expense added, but it looks like a duplicate of one you already have', { icon: '⚠️' });
+      } else {
+        toast.success('Expense added successfully!');
+      }
       navigate('/expenses');
     } catch (error) {
       toast.error('Failed to add expense: ' + (error.response?.data?.detail || error.message));
@@ -28,10 +28,12 @@ import {
   ResponsiveContainer,
 } from 'recharts';
 import { useExpenseStore, useCategoryStore } from '../../store';
-import { expenseService, categoryService } from '../../services';
+import { expenseService, categoryService, liveService } from '../../services';
 import toast from 'react-hot-toast';
 import { format, subDays, parseISO } from 'date-fns';
 
+const RANGE_DAYS = { '7days': 7, '30days': 30, '90days': 90, year: 365 };
+
 const Dashboard = () => {
   const [stats, setStats] = useState(null);
   const [loading, setLoading] = useState(true);
@@ -42,9 +44,70 @@ const Dashboard = () => {
     fetchDashboardData();
   }, [timeRange, expenses.length]); // Re-fetch when expenses change
 
-  const fetchDashboardData = async () => {
+  useEffect(() => {
+    // Apply expense deltas as they happen; anything else is a refetch
+    return liveService.subscribe((event) => {
+      if (event.totals && inRange(event.totals)) {
+        setStats((current) => (current ? applyLiveEvent(current, event) : current));
+      } else {
+        fetchDashboardData({ quiet: true });
+      }
+    });
+  }, [timeRange]);
+
+  // Deltas for expenses dated outside the stats window can't be applied to its totals
+  const inRange = (totals) => {
+    const start = subDays(new Date(), RANGE_DAYS[timeRange]);
+    return Object.keys(totals.days).every((day) => parseISO(day) >= start);
+  };
+
+  const applyLiveEvent = (current, event) => {
+    const { totals } = event;
+    if (totals.currency !== current.currency) return current;
+
+    const categoryBreakdown = current.categoryBreakdown
+      .map((category) => {
+        const change = totals.categories[category.name];
+        return change
+          ? { ...category, value: category.value + change.amount, count: (category.count || 0) + change.count }
+          : category;
+      })
+      .filter((category) => category.count > 0);
+    Object.entries(totals.categories).forEach(([name, change]) => {
+      if (change.count > 0 && !current.categoryBreakdown.some((category) => category.name === name)) {
+        categoryBreakdown.push({ name, value: change.amount, count: change.count, color: '#6b7280' });
+      }
+    });
+    categoryBreakdown.sort((a, b) => b.value - a.value);
+
+    const trendData = current.trendData.map((point) => {
+      const day = Object.keys(totals.days).find((key) => format(parseISO(key), 'MMM dd') === point.date);
+      return day ? { ...point, amount: point.amount + totals.days[day] } : point;
+    });
+
+    let recentTransactions = current.recentTransactions;
+    if (event.type === 'expense.deleted' || event.type === 'expense.updated') {
+      const id = event.id || event.expense.id;
+      recentTransactions = recentTransactions.filter((transaction) => transaction.id !== id);
+    }
+    const added = event.expenses || (event.type === 'expense.deleted' ? [] : [event.expense]);
+    recentTransactions = [...added.map((exp) => ({ ...exp, _id: exp.id })), ...recentTransactions]
+      .sort((a, b) => new Date(b.date) - new Date(a.date))
+      .slice(0, current.recentTransactions.length || 5);
+
+    return {
+      ...current,
+      totalExpenses: current.totalExpenses + totals.amount,
+      transactionCount: current.transactionCount + totals.count,
+      categoryBreakdown,
+      trendData,
+      recentTransactions,
+    };
+  };
+
+  const fetchDashboardData = async ({ quiet = false } = {}) => {
     try {
-      setLoading(true);
+      if (!quiet) setLoading(true);
       const expenseStats = await expenseService.getStats({ range: timeRange });
       
       // Backend already returns the correct structure with camelCase
@@ -122,6 +122,28 @@ const Expenses = () => {
     }
   };
 
+  const handleExport = async () => {
+    try {
+      const blob = await expenseService.export({
+        category: filterCategory,
+        source: filterSource,
+        start_date: dateRange.start || undefined,
+        end_date: dateRange.end || undefined,
+        search: searchTerm || undefined,
+      });
+      const url = window.URL.createObjectURL(blob);
+      const a = document.createElement('a');
+      a.href = url;
+      a.download = `expenses-${new Date().toISOString().split('T')[0]}.json`;
+      a.click();
+      window.URL.revokeObjectURL(url);
+      toast.success('Expenses exported successfully!');
+    } catch (error) {
+      console.error('Error exporting expenses:', error);
+      toast.error('Failed to export expenses: ' + (error.response?.data?.detail || error.message));
+    }
+  };
+
   const getSourceIcon = (source) => {
     switch (source) {
       case 'sms':
@@ -209,7 +231,7 @@ const Expenses = () => {
             <Filter className="w-5 h-5" />
             Filters
           </button>
-          <button className="btn-secondary flex items-center gap-2">
+          <button onClick={handleExport} className="btn-secondary flex items-center gap-2">
             <Download className="w-5 h-5" />
             Export
           </button>
@@ -28,6 +28,18 @@ const DEMO_USERS = {
   },
 };
 
+// crypto.randomUUID only exists in secure contexts (HTTPS or localhost)
+const newIdempotencyKey = () => {
+  if (typeof crypto.randomUUID === 'function') {
+    return crypto.randomUUID();
+  }
+  const bytes = crypto.getRandomValues(new Uint8Array(16));
+  bytes[6] = (bytes[6] & 0x0f) | 0x40; // version 4
+  bytes[8] = (bytes[8] & 0x3f) | 0x80; // RFC 4122 variant
+  const hex = Array.from(bytes, (b) => b.toString(16).padStart(2, '0')).join('');
+  return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`;
+};
+
 export const authService = {
   login: async (email, password) => {
     try {
@@ -98,9 +110,17 @@ export const expenseService = {
     return response.data;
   },
 
-  create: async (expenseData) => {
-    const response = await api.post('/expenses', expenseData);
-    return response.data;
+  create: async (expenseData, idempotencyKey = newIdempotencyKey()) => {
+    const config = { headers: { 'Idempotency-Key': idempotencyKey } };
+    try {
+      const response = await api.post('/expenses', expenseData, config);
+      return response.data;
+    } catch (error) {
+      if (error.response) throw error;
+      // No response: the expense may have been saved, and the same key makes the retry return it instead
+      const response = await api.post('/expenses', expenseData, config);
+      return response.data;
+    }
   },
 
   update: async (id, expenseData) => {
@@ -117,6 +137,11 @@ export const expenseService = {
     const response = await api.get('/expenses/stats', { params });
     return response.data;
   },
+
+  export: async (params = {}) => {
+    const response = await api.get('/expenses/export', { params, responseType: 'blob' });
+    return response.data;
+  },
 };
 
 export const categoryService = {
@@ -141,6 +166,88 @@ export const categoryService = {
   },
 };
 
+export const budgetService = {
+  getStatus: async (month) => {
+    const response = await api.get('/budgets/status', { params: month ? { month } : {} });
+    return response.data;
+  },
+};
+
+export const recurringService = {
+  getAll: async () => {
+    const response = await api.get('/recurring');
+    return response.data;
+  },
+
+  create: async (ruleData) => {
+    const response = await api.post('/recurring', ruleData);
+    return response.data;
+  },
+
+  update: async (id, ruleData) => {
+    const response = await api.put(`/recurring/${id}`, ruleData);
+    return response.data;
+  },
+
+  delete: async (id) => {
+    const response = await api.delete(`/recurring/${id}`);
+    return response.data;
+  },
+};
+
+// Server-sent events are read with fetch, since EventSource can't send the Authorization header
+export const liveService = {
+  subscribe: (onEvent) => {
+    const controller = new AbortController();
+
+    const read = async () => {
+      const response = await fetch(`${api.defaults.baseURL}/live/events`, {
+        headers: {
+          Accept: 'text/event-stream',
+          Authorization: `Bearer ${localStorage.getItem('token')}`,
+        },
+        signal: controller.signal,
+      });
+      if (!response.ok) throw new Error(`Live events failed with ${response.status}`);
+
+      const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+      let buffer = '';
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += value;
+        const messages = buffer.split('\n\n');
+        buffer = messages.pop();
+        messages.forEach((message) => {
+          const data = message
+            .split('\n')
+            .filter((line) => line.startsWith('data: '))
+            .map((line) => line.slice(6))
+            .join('\n');
+          if (data) onEvent(JSON.parse(data));
+        });
+      }
+    };
+
+    const connect = () => {
+      read()
+        .catch((error) => {
+          if (controller.signal.aborted) return;
+          console.error('Live events disconnected:', error);
+        })
+        .finally(() => {
+          // Anything missed while disconnected is picked up by refetching
+          if (controller.signal.aborted) return;
+          onEvent({ type: 'resync' });
+          setTimeout(() => !controller.signal.aborted && connect(), 3000);
+        });
+    };
+
+    connect();
+    return () => controller.abort();
+  },
+};
+
 export const parserService = {
   parseSMS: async (smsText) => {
     const response = await api.post('/parse/sms', { text: smsText });
@@ -198,6 +305,23 @@ export const userService = {
   },
 };
 
+export const jobService = {
+  getAll: async (params = {}) => {
+    const response = await api.get('/jobs', { params });
+    return response.data;
+  },
+
+  getById: async (id) => {
+    const response = await api.get(`/jobs/${id}`);
+    return response.data;
+  },
+
+  cancel: async (id) => {
+    const response = await api.post(`/jobs/${id}/cancel`);
+    return response.data;
+  },
+};
+
 export const adminService = {
   getDashboard: async () => {
     const response = await api.get('/admin/dashboard');
@@ -248,4 +372,19 @@ export const adminService = {
     const response = await api.post('/admin/settings/reset');
     return response.data;
   },
+
+  getJobs: async (params = {}) => {
+    const response = await api.get('/admin/jobs', { params });
+    return response.data;
+  },
+
+  createJob: async (jobData) => {
+    const response = await api.post('/admin/jobs', jobData);
+    return response.data;
+  },
+
+  retryJob: async (jobId) => {
+    const response = await api.post(`/admin/jobs/${jobId}/retry`);
+    return response.data;
+  },
 };